@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import os
 
 import nuget_package_scanner.app as app
 
@@ -11,10 +12,17 @@ org = input("Enter a github org to search: ")
 token = input("Enter a github token (or enter to use GITHUB_TOKEN environment variable: ")
 #asyncio.run(app.show_github_search_rate_limit_info(token),debug=True)
 output = input("Enter a file location if you want to output to a csv: ")
+cache_dir = input("Enter a directory if you want to cache nuget responses between runs: ")
+state_file = input("Enter a file location if you want to only rescan what changed since the last run: ")
+journal_file = input("Enter a file location if you want to be able to resume the scan if it is interrupted: ")
+resume = bool(journal_file) and os.path.exists(journal_file) and \
+    input("An interrupted scan was found there. Resume it? (y/n): ").strip().lower().startswith('y')
+include_dates = not input("Look up publish dates? This takes a lot more requests. (y/n): ").strip().lower().startswith('n')
 
 loop = asyncio.get_event_loop()
 loop.set_debug(True)
-loop.run_until_complete(app.run(org, token, output))  
+loop.run_until_complete(app.run(org, token, output, cache_dir, state_file=state_file, journal_file=journal_file,
+                                    resume=resume, include_dates=include_dates))  
 
 # Wait for the underlying SSL connections to close
 # https://docs.aiohttp.org/en/stable/client_advanced.html#graceful-shutdown
@@ -1,16 +1,18 @@
 import asyncio
-import csv
+import contextlib
 import logging
 import os
-import sys
-import time
 from operator import attrgetter
-from typing import List
+from typing import Dict, List, Optional, Union
 
 from nuget_package_scanner.smart_client import SmartClient
-from nuget_package_scanner.async_utils import wait_or_raise
-from nuget_package_scanner.github_search import GithubClient, GithubSearchResult
-from nuget_package_scanner.nuget import NetCoreProject, Nuget, Package, PackageConfig, PackageContainer
+from nuget_package_scanner.failures import RetryPolicy
+from nuget_package_scanner.github_search import GithubClient
+from nuget_package_scanner.metrics import Metrics
+from nuget_package_scanner.nuget import CatalogMirror, NugetServer, PackageContainer
+from nuget_package_scanner.pipeline import ScanSource, scan_org, scan_orgs
+from nuget_package_scanner.report_sinks import CsvSink, ReportSink, sink_for_path, sort_csv
+from nuget_package_scanner.tracing import Tracer
 
 NAME = 'nuget-package-scanner'
 VERSION = '0.0.6'
@@ -30,113 +32,151 @@ async def show_github_search_rate_limit_info(github_token):
         g = GithubClient(token, client)
         await g.get_search_rate_limit_info()
 
-def write_to_csv(package_containers: List[PackageContainer], csv_location: str):
-    # just assume that we want this to be easy and create any missing directories in the path    
-    os.makedirs(os.path.dirname(csv_location), exist_ok=True) 
-    with open(csv_location, 'w', newline='') as csvfile:
-        # write over any existing file
-        w = csv.writer(csvfile)
-        columns = [
-            "Repo Name", "Container Path",  "Name", "Referenced Version", "Date", 
-            "Latest Release", "Latest Release Date", "Latest Package", 
-            "Latest Package Date", "Major Release Behind", "Minor Release Behind",
-            "Patch Release Behind", "Available Version Count", "Link", "Source"
-        ]
-        w.writerow(columns)
+def write_to_csv(package_containers: List[PackageContainer], csv_location: str, sort_output: bool = True):
+    """
+    Writes :param package_containers to a csv report, sorted by repo and path like the reports of :func run unless
+    :param sort_output is False (then rows are written in the order of :param package_containers).
+    """
+    if sort_output:
+        package_containers = sorted(package_containers, key=attrgetter('repo', 'path'))
+    # the sink creates any missing directories in the path and writes over any existing file
+    with CsvSink(csv_location) as sink:
         for container in package_containers:
-            for package in container.packages:
-                package_columns = [
-                    container.repo, container.path,  package.name, package.version, package.version_date,
-                    package.latest_release, package.latest_release_date, package.latest_version,
-                    package.latest_version_date, package.major_releases_behind,
-                    package.minor_releases_behind, package.patch_releases_behind,
-                    package.available_version_count, package.details_url, package.source
-                ]
-                w.writerow(package_columns)  
-
-async def __fetch_net_core_project(search_result: GithubSearchResult,  package_containers: List[PackageContainer], g: GithubClient, failures: List[GithubSearchResult]) -> None:
-    try:
-        core_project_source = await g.get_request_as_text(search_result.url)
-        core_project = NetCoreProject(core_project_source, search_result.name, search_result.repo, search_result.path)
-        package_containers.append(core_project)
-    except:
-        failures.append(search_result)
+            sink.write(container)
+
+def read_orgs_file(path: str) -> List[str]:
+    """ Reads one org per line from :param path. Blank lines and lines starting with # are ignored. """
+    with open(path, 'r') as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
+async def sync_catalog_mirror(catalog_file: str, index_urls: List[str] = [NugetServer.DEFAULT_SERVICE_INDEX_URL],
+                              fetch_leaves: bool = False) -> int:
+    """
+    Mirrors the catalog of every server in :param index_urls into :param catalog_file (or brings it up to date).
+    The first sync of a feed reads its whole catalog, which can take a long time for large feeds like nuget.org.
+    Pass the same file as :param catalog_file to :func run to look packages up from the mirror.
+    Returns the number of catalog items applied.
+    """
+    async with SmartClient() as client:
+        mirror = CatalogMirror(catalog_file, client, fetch_leaves)
+        try:
+            servers = [await NugetServer.create(client, url) for url in index_urls]
+            return sum(await asyncio.gather(*[mirror.sync(s) for s in servers]))
+        finally:
+            mirror.close()
+
+async def build_org_report(org:str, token: str, cache_dir: str = None, cache_max_bytes: int = None,
+                           **scanner_options) -> List[PackageContainer]:
+    """
+    Builds the full report for :param org in memory. See :func scan_org to process containers as they complete.
+    """
+    return [container async for container in scan_org(org, token, cache_dir, cache_max_bytes, **scanner_options)]
+
+async def build_batch_report(orgs: List[str], token: str, cache_dir: str = None, cache_max_bytes: int = None,
+                             **scanner_options) -> Dict[str, List[PackageContainer]]:
+    """
+    Builds the full report for every org in :param orgs in memory, keyed by org. See :func scan_orgs.
+    """
+    reports = {org: [] for org in orgs}
+    async for org, container in scan_orgs(orgs, token, cache_dir, cache_max_bytes, **scanner_options):
+        reports[org].append(container)
+    return reports
+
+async def run_batch(github_orgs: Union[List[str], str], github_token: str = None, output_dir: str = None,
+                    cache_dir: str = None, cache_max_bytes: int = None, source: ScanSource = ScanSource.SEARCH,
+                    feed_rules: Dict[str, str] = None, catalog_file: str = None, report_format: str = 'csv',
+                    sort_output: bool = True, keep_results: bool = True, metrics_file: str = None,
+                    trace_file: str = None, journal_file: str = None, resume: bool = False,
+                    retry: Optional[RetryPolicy] = RetryPolicy(),
+                    include_dates: bool = True) -> Optional[Dict[str, List[PackageContainer]]]:
+    """
+    Builds the report for several orgs in one batch (see :func scan_orgs). This is much faster than calling :func run
+    for each org since caches, nuget servers and package lookups are shared by every org.
+    :param github_orgs A list of orgs or the path of a file with one org per line.
+    If :param output_dir is provided, each org's report is written there as {org}.{report_format} as containers
+    complete, along with a combined report of every org as all_orgs.{report_format} (csv, jsonl or db).
+    See :func run for the other parameters.
+    """
+    orgs = read_orgs_file(github_orgs) if isinstance(github_orgs, str) else list(github_orgs)
+    assert orgs and all(isinstance(o, str) and o for o in orgs), ':param github_orgs must contain at least one non-empty org.'
+    logging.info(f'Building Nuget dependency reports for {len(orgs)} Github org(s).')
 
-async def __fetch_net_framework_project(search_result: GithubSearchResult,  package_containers: List[PackageContainer], g: GithubClient, failures: List[GithubSearchResult]) -> None:
-    try:
-        package_config_source = await g.get_request_as_text(search_result.url)
-        package_config = PackageConfig(package_config_source, search_result.name, search_result.repo, search_result.path)
-        package_containers.append(package_config)
-    except:
-        failures.append(search_result)
+    token = github_token if isinstance(github_token,str) and github_token else os.getenv('GITHUB_TOKEN')
+    assert isinstance(token,str) and token, 'You must either pass this method a non-empty param: github_token or set the GITHUB_TOKEN environment varaible to a non-empty string.'
 
-async def __fetch_package_details(package: Package, n: Nuget, failures: List[Package]) -> None:
+    reports = {org: [] for org in orgs} if keep_results else None
+    metrics = Metrics()
+    tracer = Tracer() if trace_file else None
+    sinks: Dict[str, ReportSink] = {}
+    if output_dir:
+        logging.info(f'Writing Reports to {output_dir}.')
+        sinks = {org: sink_for_path(os.path.join(output_dir, f'{org}.{report_format}')) for org in orgs}
+        combined = sink_for_path(os.path.join(output_dir, f'all_orgs.{report_format}'), include_org=True)
     try:
-        await n.get_fetch_package_details(package)
-    except:
-        failures.append(package)
-
-
-async def build_org_report(org:str, token: str) -> List[PackageContainer]:
-    start = time.perf_counter()
-    async with SmartClient() as client:
-        # Find any additional nuget servers that exist for this org
-        g = GithubClient(token, client)
-        configs = await g.get_unique_nuget_configs(org)
-
-        logging.info(f'Found {len(configs)} Nuget Server(s) to query.')
-        for c in configs:
-            logging.info(f'{configs[c]} Index: {c}')                
-
-        # Create Nuget client from discovered configs
-        async with Nuget(client, configs) as n:              
-            # Find all projects with nuget packages.
-            # Note: These were originally concurrent calls, but the Github API forbids this
-            core_projects: List[GithubSearchResult] = await g.search_netcore_csproj(org)
-            logging.info(f'Found {len(core_projects)} .Net Core projects to process.')
-            package_configs: List[GithubSearchResult] = await g.search_package_configs(org)                                 
-            logging.info(f'Found {len(package_configs)} legacy .Net Framework projects to process.')
-
-            # Fetch all project contents            
-            package_containers: List[PackageContainer] = []
-            failed_projects: List[GithubSearchResult] = []
-            fetch_project_tasks = []
-            for core_project in core_projects:
-                fetch_project_tasks.append(asyncio.create_task(__fetch_net_core_project(core_project, package_containers, g, failed_projects),name=core_project.url))
-            for package_config in package_configs:
-                fetch_project_tasks.append(asyncio.create_task(__fetch_net_framework_project(package_config, package_containers, g, failed_projects),name=package_config.url))
-
-            await asyncio.wait(fetch_project_tasks)
-            
-            # For now, just report if there were any projects that we failed to fetch
-            for f in failed_projects:
-                logging.warn(f'Failed to get package containter {f.name} from {f.url}')
-
-            # Fetch all package details
-            failed_packages: List[Package] = []  
-            fetch_package_tasks = []
-            for pc in package_containers:
-                for p in pc.packages:
-                    name = p.name + p.version if p.version else '' + p.target_framework if p.target_framework else ''
-                    fetch_package_tasks.append(asyncio.create_task(__fetch_package_details(p, n, failed_packages), name=name))
-
-            await asyncio.wait(fetch_package_tasks)
-
-            # For now, just report if there were any packages that we failed to fetch
-            for fp in failed_packages:
-                logging.warn(f'Failed to get package {fp.name} from discovered nuget server(s).')
-
-            stop = time.perf_counter()
-            logging.info(f'Processed {org} for Nuget packages in  {stop - start:0.4f} seconds')
-            logging.info(f'Cache Hit Info for client.get_as_json  {client.get_as_json.cache_info()}')
-            logging.info(f'Cache Hit Info for client.get_as_text  {client.get_as_text.cache_info()}')
-
-            # TODO: Add retry logic for failed tasks (Flush alru_cache and retry)
-            # client.get_as_json.invalidate('key')
-
-            return package_containers    
-
-async def run(github_org:str, github_token: str = None, output_file: str = None) -> List[PackageContainer]:    
+        with tracer.activate() if tracer else contextlib.nullcontext():
+            async for org, container in scan_orgs(orgs, token, cache_dir, cache_max_bytes, source=source,
+                                                  feed_rules=feed_rules, catalog_file=catalog_file, metrics=metrics,
+                                                  journal_file=journal_file, resume=resume, retry=retry,
+                                                  include_dates=include_dates):
+                if sinks:
+                    sinks[org].write(container)
+                    combined.write(container, org)
+                if reports is not None:
+                    reports[org].append(container)
+    finally:
+        if sinks:
+            for sink in [*sinks.values(), combined]:
+                sink.close()
+
+    if sinks and sort_output and report_format == 'csv':
+        with metrics.phase('sort_report'):
+            for sink in sinks.values():
+                sort_csv(sink.path)
+            sort_csv(combined.path, key_columns=3)
+    if metrics_file:
+        metrics.write(metrics_file)
+    if tracer:
+        tracer.write(trace_file)
+    return reports
+
+async def run(github_org:str, github_token: str = None, output_file: str = None, cache_dir: str = None,
+              cache_max_bytes: int = None, source: ScanSource = ScanSource.SEARCH, state_file: str = None,
+              feed_rules: Dict[str, str] = None, catalog_file: str = None, sort_output: bool = True,
+              keep_results: bool = True, metrics_file: str = None, trace_file: str = None, journal_file: str = None,
+              resume: bool = False, retry: Optional[RetryPolicy] = RetryPolicy(),
+              include_dates: bool = True) -> Optional[List[PackageContainer]]:    
+    """
+    Builds the report for :param github_org and optionally writes it to :param output_file.
+    The report is written as package containers complete. The extension of :param output_file picks the format
+    (.csv, .jsonl or .db/.sqlite for a SQLite database). See :mod report_sinks.
+    If :param sort_output is True, a csv report is sorted by repo and path once the scan is done (with an external
+    sort, so memory use stays flat). Other formats are left in the order containers completed.
+    If :param keep_results is False, nothing is held in memory and None is returned. Use it for very large orgs.
+    If :param cache_dir is provided, nuget responses are persisted there and revalidated on the next run.
+    If :param cache_max_bytes is provided, in-memory responses are evicted (LRU) to stay within that budget.
+    :param source Whether project files are found with code search or read from each repository's tarball.
+    If :param state_file is provided, the scan only downloads what changed since the last run that used the same file.
+    The changes are written next to :param output_file as {output_file}.delta.json.
+    :param feed_rules Package id globs mapped to the nuget server index url to try first, e.g. {'Contoso.*': url}.
+    :param catalog_file A catalog mirror created with :func sync_catalog_mirror. Packages on the mirrored feeds are
+    looked up locally.
+    :param metrics_file If provided, request counts, latencies and retries per host, cache hits, queue depths and phase
+    durations are written here once the scan is done: in the Prometheus text format if it ends with .prom, as a json
+    summary otherwise. See :class Metrics.
+    :param trace_file If provided, every search page, file fetch, parse, feed probe, registration fetch and http request
+    is traced and written here as a Chrome trace (open it in https://ui.perfetto.dev), or as OTLP json if the file ends
+    with .otlp.json. See :class Tracer.
+    :param journal_file If provided, the scan's progress is checkpointed here and the file is removed once the scan is
+    done. If a scan is interrupted (rate limits, network drops, crashes...), call this again with :param resume True
+    to replay the journal and only do the outstanding work. The whole report is still written. See :class ScanJournal.
+    :param retry How files and package lookups that failed are retried once the rest of the org is done, instead of
+    having to scan the whole org again (see :class RetryPolicy). None turns retries off. The Status column of the
+    report tells, for every row, whether its package was found (ok), found on a retry (retried), not found on any feed
+    (not_found) or why its lookup failed (see :class FailureKind).
+    :param include_dates If False, the publish dates of the referenced and latest versions are left out of the report.
+    On feeds with a flat container (like nuget.org), this takes one small request per package instead of fetching its
+    registration index and pages.
+    """
     logging.info(f'Building Nuget dependency report for the {github_org} Github org.')
     assert isinstance(github_org,str) and github_org, ':param github_org must be a non-empty string.'
     org = github_org
@@ -145,13 +185,33 @@ async def run(github_org:str, github_token: str = None, output_file: str = None)
     token = github_token if isinstance(github_token,str) and github_token else os.getenv('GITHUB_TOKEN')
     assert isinstance(token,str) and token, 'You must either pass this method a non-empty param: github_token or set the GITHUB_TOKEN environment varaible to a non-empty string.'
 
-    package_containers: List[PackageContainer] = await build_org_report(org, token)
-    
+    delta_file = f'{os.path.splitext(output_file)[0]}.delta.json' if output_file and state_file else None
+    package_containers: Optional[List[PackageContainer]] = [] if keep_results else None
+    metrics = Metrics()
+    tracer = Tracer() if trace_file else None
+    sink = None
     if output_file:
         logging.info(f'Writing Report to {output_file}.')
-        try:
-            write_to_csv(sorted(package_containers, key=attrgetter('repo', 'path')), output_file)
-        except Exception as e:
-            logging.exception(e)        
-    
+        sink = sink_for_path(output_file)
+    try:
+        with tracer.activate() if tracer else contextlib.nullcontext():
+            async for container in scan_org(org, token, cache_dir, cache_max_bytes, source=source, state_file=state_file,
+                                            delta_file=delta_file, feed_rules=feed_rules, catalog_file=catalog_file,
+                                            metrics=metrics, journal_file=journal_file, resume=resume, retry=retry,
+                                            include_dates=include_dates):
+                if sink:
+                    sink.write(container)
+                if package_containers is not None:
+                    package_containers.append(container)
+    finally:
+        if sink:
+            sink.close()
+
+    if sink and sort_output and isinstance(sink, CsvSink):
+        with metrics.phase('sort_report'):
+            sort_csv(sink.path)
+    if metrics_file:
+        metrics.write(metrics_file)
+    if tracer:
+        tracer.write(trace_file)
     return package_containers
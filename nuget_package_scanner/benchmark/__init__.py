@@ -0,0 +1,3 @@
+from .synthetic import SyntheticOrg
+from .standin import HostProfile, StandIn
+from .runner import compare, run_benchmark, write_results
@@ -0,0 +1,65 @@
+"""
+Offline benchmark of a full org scan against local stand-ins for Github and a Nuget feed.
+
+    python -m nuget_package_scanner.benchmark --repos 100 --latency 0.02 --output bench.json --baseline last.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+from ..pipeline import ScanSource
+from .runner import compare, run_benchmark, write_results
+from .standin import HostProfile, StandIn
+from .synthetic import SyntheticOrg
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='python -m nuget_package_scanner.benchmark', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repos', type=int, default=50)
+    parser.add_argument('--projects', type=int, default=4, help='project files per repository')
+    parser.add_argument('--packages', type=int, default=500, help='distinct package ids')
+    parser.add_argument('--references', type=int, default=15, help='package references per project')
+    parser.add_argument('--skew', type=float, default=1.1, help='package popularity skew (Zipf exponent)')
+    parser.add_argument('--max-versions', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0, help='injected latency per request, in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests that fail with a 503')
+    parser.add_argument('--source', choices=[s.value for s in ScanSource], default=ScanSource.SEARCH.value)
+    parser.add_argument('--contents-lookups', action='store_true', help='leave the ref out of search items')
+    parser.add_argument('--no-flat-container', action='store_true', help='only serve registrations')
+    parser.add_argument('--no-dates', action='store_true', help="don't look up publish dates")
+    parser.add_argument('--in-process', action='store_true', help='serve the stand-ins from the scanner process')
+    parser.add_argument('--output', help='where to write the results (json)')
+    parser.add_argument('--baseline', help='results of a previous run to compare with')
+    parser.add_argument('--trace', help='where to write a trace of the scan (Chrome trace json, or OTLP json if it ends with .otlp.json)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    org = SyntheticOrg(repos=args.repos, projects_per_repo=args.projects, packages=args.packages,
+                       references_per_project=args.references, popularity_skew=args.skew,
+                       max_versions=args.max_versions, seed=args.seed)
+    profile = HostProfile(args.latency, error_rate=args.error_rate)
+    standin = StandIn(org, profile, profile, profile, search_includes_ref=not args.contents_lookups,
+                      flat_container=not args.no_flat_container)
+    results = asyncio.run(run_benchmark(standin, ScanSource(args.source), args.in_process, args.trace,
+                                          include_dates=not args.no_dates))
+
+    rss = 'n/a' if results['peak_rss_mb'] is None else f"{results['peak_rss_mb']:0.1f}"
+    print(f"{results['containers']}/{results['expected_containers']} containers, {results['package_references']} "
+          f"references ({results['unique_packages']} unique) in {results['wall_time_s']:0.3f}s, "
+          f"peak RSS {rss} MiB")
+    for name, host in results['hosts'].items():
+        print(f"  {name}: {host['requests']} requests, {host['errors']} errors, p50 {host['p50_ms']:0.1f}ms, p99 {host['p99_ms']:0.1f}ms")
+    phases = ', '.join(f'{phase} {seconds:0.3f}s' for phase, seconds in results['client']['phases'].items())
+    print(f"  phases: {phases}")
+    if args.output:
+        write_results(results, args.output)
+    if args.baseline:
+        with open(args.baseline) as f:
+            for metric, change in compare(json.load(f), results).items():
+                print(f"  {metric}: {'n/a' if change is None else f'{change:+.1%}'} vs baseline")
+
+
+if __name__ == '__main__':
+    main()
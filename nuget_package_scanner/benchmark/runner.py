@@ -0,0 +1,155 @@
+import asyncio
+import contextlib
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from typing import Dict, Optional
+
+from .. import app
+from ..metrics import Metrics
+from ..pipeline import ScanSource
+from ..tracing import Tracer
+from .standin import HostProfile, StandIn
+from .synthetic import SyntheticOrg
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+# Metrics compared by :func compare. Lower is better for all of them.
+COMPARED_METRICS = ('wall_time_s', 'peak_rss_mb', 'requests')
+
+
+def peak_rss_mb() -> Optional[float]:
+    """ The peak resident set size of this process in MiB, or None if it can't be measured on this platform. """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024 # bytes on macOS, KiB elsewhere
+
+
+def _standin_arguments(standin: StandIn) -> dict:
+    return {'org': standin.org.arguments(), 'github': standin.github.profile.arguments(),
+            'raw': standin.raw.profile.arguments(), 'nuget': standin.nuget.profile.arguments(),
+            'search_includes_ref': standin.search_includes_ref, 'flat_container': standin.flat_container,
+            'search_page_size': standin.search_page_size}
+
+
+def _build_standin(arguments: dict) -> StandIn:
+    arguments = dict(arguments)
+    org = SyntheticOrg(**arguments.pop('org'))
+    profiles = {host: HostProfile(**arguments.pop(host)) for host in ('github', 'raw', 'nuget')}
+    return StandIn(org, **profiles, **arguments)
+
+
+def _serve(arguments: dict, conn) -> None:
+    """ Child process entry point: serves the stand-in until the parent asks for its stats. """
+    async def serve():
+        async with _build_standin(arguments) as standin:
+            conn.send({host.name: host.url for host in standin.hosts})
+            await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+            conn.send(standin.stats())
+    asyncio.run(serve())
+
+
+class StandInProcess:
+    """
+    Runs a :class StandIn in a child process, so that serving requests doesn't compete with the scanner for the event
+    loop or show up in its memory use. Exposes the same urls and stats as the stand-in.
+    """
+    def __init__(self, standin: StandIn):
+        self.__arguments = _standin_arguments(standin)
+        self.urls: Dict[str, str] = {}
+        self.__conn = None
+        self.__process = None
+
+    async def __aenter__(self):
+        parent, child = multiprocessing.get_context('spawn').Pipe()
+        self.__process = multiprocessing.get_context('spawn').Process(target=_serve, args=(self.__arguments, child), daemon=True)
+        self.__process.start()
+        self.__conn = parent
+        self.urls = await asyncio.get_running_loop().run_in_executor(None, parent.recv)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if self.__process.is_alive():
+            self.__process.terminate()
+        self.__process.join()
+
+    async def stats(self) -> Dict[str, dict]:
+        """ Stops serving and returns what each host served. """
+        self.__conn.send('stop')
+        return await asyncio.get_running_loop().run_in_executor(None, self.__conn.recv)
+
+
+async def run_benchmark(standin: StandIn, source: ScanSource = ScanSource.SEARCH, in_process: bool = False,
+                        trace_file: Optional[str] = None, **scanner_options) -> dict:
+    """
+    Scans the synthetic org of :param standin end to end with :func app.build_org_report and returns the results:
+    wall time, peak RSS, what was found, what each stand-in host served (requests, statuses and server side
+    p50/p99 latency) and the scanner's own :class Metrics (client side latency, retries, cache hits and phase
+    durations). The stand-in runs in a child process unless :param in_process is True.
+    If :param trace_file is provided, the scan is traced and written there (see :class Tracer).
+    :param scanner_options are passed to :func app.build_org_report (e.g. cache_dir).
+    """
+    server = standin if in_process else StandInProcess(standin)
+    async with server:
+        urls = {host.name: host.url for host in standin.hosts} if in_process else server.urls
+        metrics = Metrics()
+        tracer = Tracer() if trace_file else None
+        start = time.perf_counter()
+        with tracer.activate() if tracer else contextlib.nullcontext():
+            containers = await app.build_org_report(standin.org.name, 'benchmark-token', source=source,
+                                                    github_api_url=urls['github'], github_raw_url=urls['raw'],
+                                                    nuget_index_url=f"{urls['nuget']}/v3/index.json", metrics=metrics,
+                                                    **scanner_options)
+        wall_time = time.perf_counter() - start
+        hosts = standin.stats() if in_process else await server.stats()
+    if tracer:
+        tracer.write(trace_file)
+
+    references = [p for c in containers for p in c.packages]
+    return {
+        'scanner_version': app.VERSION,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {**_standin_arguments(standin), 'source': source.value,
+                   'include_dates': scanner_options.get('include_dates', True)},
+        'wall_time_s': wall_time,
+        'peak_rss_mb': peak_rss_mb(),
+        'containers': len(containers),
+        'expected_containers': len(standin.org.all_files()),
+        'package_references': len(references),
+        'unique_packages': len(set(p.lookup_key for p in references)),
+        'packages_with_details': sum(1 for p in references if p.latest_version),
+        'requests': sum(h['requests'] for h in hosts.values()),
+        'hosts': hosts,
+        'client': metrics.to_json(),
+    }
+
+
+def write_results(results: dict, path: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def compare(baseline: dict, current: dict) -> Dict[str, Optional[float]]:
+    """
+    Returns the relative change (current / baseline - 1) of every metric in :const COMPARED_METRICS, e.g. 0.1 means
+    10% worse. None if the metric is missing from either result.
+    """
+    changes = {}
+    for metric in COMPARED_METRICS:
+        before, after = baseline.get(metric), current.get(metric)
+        changes[metric] = after / before - 1 if before and after is not None else None
+    if baseline.get('config') != current.get('config'):
+        logging.warning('The baseline was run with a different configuration. The comparison may not be meaningful.')
+    return changes
@@ -0,0 +1,294 @@
+import asyncio
+import io
+import random
+import tarfile
+import time
+from typing import Dict, List, Optional
+from urllib.parse import quote, quote_plus
+
+from aiohttp import web
+
+from .synthetic import PACKAGE_CONFIG, SyntheticOrg
+
+INLINE_MAX_VERSIONS = 128 # nuget.org inlines the pages of registration indexes with up to 128 versions
+PAGE_SIZE = 64
+
+
+class HostProfile:
+    """
+    How a stand-in host behaves: every response is delayed by :param latency seconds (+/- :param jitter as a fraction
+    of it) and :param error_rate of the requests fail with a 503.
+    """
+    def __init__(self, latency: float = 0.0, jitter: float = 0.5, error_rate: float = 0.0):
+        assert 0 <= error_rate < 1, ':param error_rate must be in [0, 1)'
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def arguments(self) -> dict:
+        return {'latency': self.latency, 'jitter': self.jitter, 'error_rate': self.error_rate}
+
+
+class HostStats:
+    """ What a stand-in host served. Latencies are measured server side and include the injected latency. """
+    def __init__(self):
+        self.requests = 0
+        self.statuses: Dict[int, int] = {}
+        self.latencies: List[float] = []
+
+    def to_json(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            'requests': self.requests,
+            'errors': sum(c for s, c in self.statuses.items() if s >= 500),
+            'statuses': {str(s): c for s, c in sorted(self.statuses.items())},
+            'p50_ms': _percentile(latencies, 0.50) * 1000,
+            'p99_ms': _percentile(latencies, 0.99) * 1000,
+        }
+
+
+def _percentile(ordered: List[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class StandInHost:
+    """ One local aiohttp server. Latency and errors are injected by middleware that also records :class HostStats. """
+    def __init__(self, name: str, profile: HostProfile, seed: int):
+        self.name = name
+        self.profile = profile
+        self.stats = HostStats()
+        self.app = web.Application(middlewares=[self.__middleware])
+        self.url: Optional[str] = None
+        self.__rng = random.Random(seed)
+        self.__runner: Optional[web.AppRunner] = None
+
+    async def start(self, host: str = '127.0.0.1') -> str:
+        self.__runner = web.AppRunner(self.app, access_log=None)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, host, 0).start()
+        self.url = f'http://{host}:{self.__runner.addresses[0][1]}'
+        return self.url
+
+    async def stop(self) -> None:
+        if self.__runner:
+            await self.__runner.cleanup()
+
+    @web.middleware
+    async def __middleware(self, request: web.Request, handler):
+        start = time.perf_counter()
+        profile = self.profile
+        if profile.latency:
+            await asyncio.sleep(profile.latency * (1 + profile.jitter * (2 * self.__rng.random() - 1)))
+        if profile.error_rate and self.__rng.random() < profile.error_rate:
+            response = web.Response(status=503, text='injected error')
+        else:
+            try:
+                response = await handler(request)
+            except web.HTTPException as e:
+                response = e
+        self.stats.requests += 1
+        self.stats.statuses[response.status] = self.stats.statuses.get(response.status, 0) + 1
+        self.stats.latencies.append(time.perf_counter() - start)
+        if isinstance(response, web.HTTPException) and response.status >= 400:
+            raise response
+        return response
+
+
+class StandIn:
+    """
+    Local stand-ins for the Github API (code search, contents, repos and tarballs), raw.githubusercontent.com and a
+    Nuget V3 feed (service index, flat container and registrations with inlined and paged indexes), all serving the
+    same :class SyntheticOrg. Each runs on its own port so requests can be counted per host.
+
+    >>> async with StandIn(SyntheticOrg()) as standin:
+    >>>     await build_org_report(org.name, 'token', github_api_url=standin.github.url, ...)
+    """
+    def __init__(self, org: SyntheticOrg, github: HostProfile = None, raw: HostProfile = None,
+                 nuget: HostProfile = None, search_includes_ref: bool = True, flat_container: bool = True,
+                 search_page_size: int = 30):
+        """
+        :param search_includes_ref If False, code search items don't include a ref, so every file needs a contents
+            api lookup to find its download url.
+        :param flat_container If False, the feed doesn't advertise a flat container, so every lookup goes through the
+            registration index.
+        """
+        self.org = org
+        self.search_includes_ref = search_includes_ref
+        self.flat_container = flat_container
+        self.search_page_size = search_page_size
+        self.github = StandInHost('github', github or HostProfile(), org.seed)
+        self.raw = StandInHost('raw', raw or HostProfile(), org.seed + 1)
+        self.nuget = StandInHost('nuget', nuget or HostProfile(), org.seed + 2)
+        self.__files = {(f.repo, f.path): f for f in org.all_files()}
+        self.__registrations: Dict[str, dict] = {}
+
+        r = self.github.app.router
+        r.add_get('/rate_limit', self.__rate_limit)
+        r.add_get('/search/code', self.__search)
+        r.add_get('/orgs/{org}/repos', self.__repos)
+        r.add_get('/repos/{org}/{repo}/contents/{path:.*}', self.__contents)
+        r.add_get('/repos/{org}/{repo}/tarball', self.__tarball)
+        self.raw.app.router.add_get('/{org}/{repo}/{ref}/{path:.*}', self.__raw)
+        r = self.nuget.app.router
+        r.add_get('/v3/index.json', self.__service_index)
+        r.add_get('/v3/flatcontainer/{id}/index.json', self.__flat_container)
+        r.add_get('/v3/registration/{id}/index.json', self.__registration_index)
+        r.add_get('/v3/registration/{id}/page/{page}.json', self.__registration_page)
+
+    @property
+    def hosts(self) -> List[StandInHost]:
+        return [self.github, self.raw, self.nuget]
+
+    @property
+    def nuget_index_url(self) -> str:
+        return f'{self.nuget.url}/v3/index.json'
+
+    async def start(self) -> 'StandIn':
+        for host in self.hosts:
+            await host.start()
+        return self
+
+    async def stop(self) -> None:
+        for host in self.hosts:
+            await host.stop()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.stop()
+
+    def stats(self) -> Dict[str, dict]:
+        return {host.name: host.stats.to_json() for host in self.hosts}
+
+    # Github
+
+    async def __rate_limit(self, request: web.Request) -> web.Response:
+        reset = int(time.time()) + 3600
+        resource = {'limit': 1000000, 'remaining': 1000000, 'reset': reset}
+        return web.json_response({'resources': {'core': resource, 'search': resource}}, headers=self.__rate_headers())
+
+    def __rate_headers(self) -> dict:
+        return {'X-RateLimit-Limit': '1000000', 'X-RateLimit-Remaining': '1000000',
+                'X-RateLimit-Reset': str(int(time.time()) + 3600)}
+
+    async def __search(self, request: web.Request) -> web.Response:
+        q = request.query.get('q', '')
+        terms = q.split()
+        org = next((t[len('org:'):] for t in terms if t.startswith('org:')), None)
+        if org != self.org.name:
+            files = []
+        elif 'extension:csproj' in terms:
+            files = [f for f in self.org.all_files() if f.path.endswith('.csproj')]
+        elif f'filename:{PACKAGE_CONFIG}' in terms:
+            files = [f for f in self.org.all_files() if f.path.endswith(PACKAGE_CONFIG)]
+        else:
+            files = [] # e.g. nuget.config: the synthetic org only uses the default feed
+        page = int(request.query.get('page', '1'))
+        per_page = int(request.query.get('per_page', str(self.search_page_size)))
+        items = [self.__search_item(f) for f in files[(page - 1) * per_page:page * per_page]]
+        headers = self.__rate_headers()
+        if page * per_page < len(files):
+            headers['Link'] = f'<{self.github.url}/search/code?q={quote_plus(q, safe=":")}&page={page + 1}>; rel="next"'
+        return web.json_response({'total_count': len(files), 'incomplete_results': False, 'items': items}, headers=headers)
+
+    def __search_item(self, f) -> dict:
+        contents_url = f'{self.github.url}/repos/{self.org.name}/{f.repo}/contents/{quote(f.path)}'
+        if self.search_includes_ref:
+            contents_url += f'?ref={f.sha}'
+        return {'name': f.name, 'path': f.path, 'sha': f.sha, 'url': contents_url,
+                'repository': {'name': f.repo, 'full_name': f'{self.org.name}/{f.repo}'}}
+
+    async def __repos(self, request: web.Request) -> web.Response:
+        if request.match_info['org'] != self.org.name:
+            raise web.HTTPNotFound()
+        repos = [{'name': r, 'full_name': f'{self.org.name}/{r}', 'size': 1} for r in self.org.repo_names]
+        return web.json_response(repos, headers=self.__rate_headers())
+
+    async def __contents(self, request: web.Request) -> web.Response:
+        f = self.__files.get((request.match_info['repo'], request.match_info['path']))
+        if f is None:
+            raise web.HTTPNotFound()
+        download_url = f'{self.raw.url}/{self.org.name}/{f.repo}/{f.sha}/{quote(f.path)}'
+        return web.json_response({'name': f.name, 'path': f.path, 'sha': f.sha, 'download_url': download_url},
+                                 headers=self.__rate_headers())
+
+    async def __tarball(self, request: web.Request) -> web.Response:
+        repo = request.match_info['repo']
+        if request.match_info['org'] != self.org.name or repo not in self.org.repo_names:
+            raise web.HTTPNotFound()
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+            for f in self.org.files(repo):
+                data = f.contents.encode('utf-8')
+                info = tarfile.TarInfo(f'{self.org.name}-{repo}-0000000/{f.path}')
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        return web.Response(body=buffer.getvalue(), content_type='application/x-gzip', headers=self.__rate_headers())
+
+    async def __raw(self, request: web.Request) -> web.Response:
+        f = self.__files.get((request.match_info['repo'], request.match_info['path']))
+        if f is None:
+            raise web.HTTPNotFound()
+        return web.Response(text=f.contents)
+
+    # Nuget
+
+    async def __service_index(self, request: web.Request) -> web.Response:
+        base = self.nuget.url
+        resources = [
+            {'@id': f'{base}/v3/registration/', '@type': 'RegistrationsBaseUrl'},
+            {'@id': f'{base}/v3/registration/', '@type': 'RegistrationsBaseUrl/3.6.0'},
+            {'@id': f'{base}/packages/{{id}}/{{version}}', '@type': 'PackageDetailsUriTemplate/5.1.0'},
+        ]
+        if self.flat_container:
+            resources.append({'@id': f'{base}/v3/flatcontainer/', '@type': 'PackageBaseAddress/3.0.0'})
+        return web.json_response({'version': '3.0.0', 'resources': resources})
+
+    async def __flat_container(self, request: web.Request) -> web.Response:
+        versions = self.org.versions(request.match_info['id'])
+        if not versions:
+            raise web.HTTPNotFound()
+        return web.json_response({'versions': [v.lower() for v, _ in versions]})
+
+    async def __registration_index(self, request: web.Request) -> web.Response:
+        index = self.__registration(request.match_info['id'])
+        if index is None:
+            raise web.HTTPNotFound()
+        return web.json_response(index['index'])
+
+    async def __registration_page(self, request: web.Request) -> web.Response:
+        index = self.__registration(request.match_info['id'])
+        page = int(request.match_info['page'])
+        if index is None or page >= len(index['pages']):
+            raise web.HTTPNotFound()
+        return web.json_response(index['pages'][page])
+
+    def __registration(self, package_id: str) -> Optional[dict]:
+        """ Builds (once) the registration index of :param package_id and its pages. """
+        lower_id = package_id.lower()
+        if lower_id not in self.__registrations:
+            versions = self.org.versions(lower_id)
+            if not versions:
+                return None
+            base = f'{self.nuget.url}/v3/registration/{lower_id}'
+            chunks = [versions[i:i + PAGE_SIZE] for i in range(0, len(versions), PAGE_SIZE)]
+            inline = len(versions) <= INLINE_MAX_VERSIONS
+            pages = []
+            for n, chunk in enumerate(chunks):
+                page = {'@id': f'{base}/page/{n}.json', 'count': len(chunk), 'lower': chunk[0][0].lower(),
+                        'upper': chunk[-1][0].lower(), 'parent': f'{base}/index.json',
+                        'commitTimeStamp': chunk[-1][1], 'items': [self.__leaf(lower_id, base, v, t) for v, t in chunk]}
+                pages.append(page)
+            index_pages = pages if inline else [{k: v for k, v in p.items() if k != 'items'} for p in pages]
+            index = {'@id': f'{base}/index.json', 'count': len(pages), 'commitTimeStamp': versions[-1][1],
+                     'items': index_pages}
+            self.__registrations[lower_id] = {'index': index, 'pages': pages}
+        return self.__registrations[lower_id]
+
+    def __leaf(self, lower_id: str, base: str, version: str, timestamp: str) -> dict:
+        return {'@id': f'{base}/{version.lower()}.json', 'commitTimeStamp': timestamp,
+                'catalogEntry': {'@id': f'{base}/{version.lower()}/catalog.json', 'id': self.org.package_id(lower_id),
+                                 'version': version, 'listed': True, 'published': timestamp}}
@@ -0,0 +1,130 @@
+import datetime
+import hashlib
+import itertools
+import random
+from typing import Dict, List, Tuple
+
+PACKAGE_CONFIG = 'packages.config'
+
+
+class SyntheticFile:
+    __slots__ = ('repo', 'path', 'contents', 'sha')
+
+    def __init__(self, repo: str, path: str, contents: str):
+        self.repo = repo
+        self.path = path
+        self.contents = contents
+        data = contents.encode('utf-8')
+        self.sha = hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+    @property
+    def name(self) -> str:
+        return self.path.rsplit('/', 1)[-1]
+
+
+class SyntheticOrg:
+    """
+    A deterministic, generated Github org and the Nuget feed its projects reference.
+
+    The org has :param repos repositories with :param projects_per_repo project files each (a :param package_config_ratio
+    share of them are packages.config, the rest are csproj). Every project references :param references_per_project
+    of :param packages package ids. Ids are picked with a Zipf-like popularity skew (weight 1 / rank ** :param
+    popularity_skew), so a few packages are referenced everywhere and most are rarely referenced, like in a real org.
+    Each package has between 1 and :param max_versions versions. Packages with more than 128 versions get a paged
+    registration index, the others an inlined one (the same cut-off nuget.org uses).
+
+    The same arguments always generate the same org, so the org can be rebuilt in another process from its arguments.
+    """
+    def __init__(self, name: str = 'synthetic-org', repos: int = 50, projects_per_repo: int = 4, packages: int = 500,
+                 references_per_project: int = 15, popularity_skew: float = 1.1, max_versions: int = 300,
+                 package_config_ratio: float = 0.2, seed: int = 1):
+        assert repos > 0 and projects_per_repo > 0 and packages > 0 and max_versions > 0
+        self.name = name
+        self.repos = repos
+        self.projects_per_repo = projects_per_repo
+        self.packages = packages
+        self.references_per_project = min(references_per_project, packages)
+        self.popularity_skew = popularity_skew
+        self.max_versions = max_versions
+        self.package_config_ratio = package_config_ratio
+        self.seed = seed
+        self.__versions: Dict[str, List[Tuple[str, str]]] = {}
+        self.__files: Dict[str, List[SyntheticFile]] = {}
+        self.__generate()
+
+    def arguments(self) -> dict:
+        """ The arguments that rebuild this org. """
+        return {'name': self.name, 'repos': self.repos, 'projects_per_repo': self.projects_per_repo,
+                'packages': self.packages, 'references_per_project': self.references_per_project,
+                'popularity_skew': self.popularity_skew, 'max_versions': self.max_versions,
+                'package_config_ratio': self.package_config_ratio, 'seed': self.seed}
+
+    @property
+    def repo_names(self) -> List[str]:
+        return list(self.__files)
+
+    def files(self, repo: str) -> List[SyntheticFile]:
+        return self.__files.get(repo, [])
+
+    def all_files(self) -> List[SyntheticFile]:
+        return list(itertools.chain.from_iterable(self.__files.values()))
+
+    def versions(self, package_id: str) -> List[Tuple[str, str]]:
+        """ Returns (version, commit timestamp) for every version of :param package_id (any case), oldest first. """
+        return self.__versions.get(package_id.lower(), [])
+
+    def package_id(self, lower_id: str) -> str:
+        return self.__ids.get(lower_id.lower(), lower_id)
+
+    def __generate(self) -> None:
+        rng = random.Random(self.seed)
+        ids = [f'Synthetic.Package{i:05d}' for i in range(self.packages)]
+        self.__ids = {i.lower(): i for i in ids}
+        start = datetime.datetime(2015, 1, 1, tzinfo=datetime.timezone.utc)
+        for package_id in ids:
+            count = rng.randint(1, self.max_versions)
+            major, minor, patch = rng.randint(0, 3), 0, 0
+            published = start + datetime.timedelta(days=rng.randint(0, 365))
+            versions = []
+            for _ in range(count):
+                step = rng.random()
+                if step < 0.05:
+                    major, minor, patch = major + 1, 0, 0
+                elif step < 0.3:
+                    minor, patch = minor + 1, 0
+                else:
+                    patch += 1
+                version = f'{major}.{minor}.{patch}'
+                if rng.random() < 0.1:
+                    versions.append((f'{version}-beta', published.isoformat()))
+                    published += datetime.timedelta(hours=rng.randint(1, 240))
+                versions.append((version, published.isoformat()))
+                published += datetime.timedelta(hours=rng.randint(1, 240))
+            self.__versions[package_id.lower()] = versions
+
+        weights = [1 / (rank + 1) ** self.popularity_skew for rank in range(self.packages)]
+        for r in range(self.repos):
+            repo = f'repo{r:04d}'
+            files = []
+            for p in range(self.projects_per_repo):
+                references = set()
+                while len(references) < self.references_per_project:
+                    references.update(rng.choices(ids, weights, k=self.references_per_project - len(references)))
+                pinned = [(i, rng.choice(self.__versions[i.lower()])[0]) for i in sorted(references)]
+                if rng.random() < self.package_config_ratio:
+                    files.append(SyntheticFile(repo, f'src/Legacy{p}/{PACKAGE_CONFIG}', _package_config(pinned)))
+                else:
+                    files.append(SyntheticFile(repo, f'src/Project{p}/Project{p}.csproj', _csproj(pinned)))
+            self.__files[repo] = files
+
+
+def _csproj(references: List[Tuple[str, str]]) -> str:
+    lines = [f'    <PackageReference Include="{i}" Version="{v}" />' for i, v in references]
+    return '\n'.join(['<Project Sdk="Microsoft.NET.Sdk">', '  <PropertyGroup>',
+                      '    <TargetFramework>net6.0</TargetFramework>', '  </PropertyGroup>', '  <ItemGroup>',
+                      *lines, '  </ItemGroup>', '</Project>'])
+
+
+def _package_config(references: List[Tuple[str, str]]) -> str:
+    lines = [f'  <package id="{i}" version="{v}" targetFramework="net472" />' for i, v in references]
+    return '\n'.join(['<?xml version="1.0" encoding="utf-8"?>', '<packages>', *lines, '</packages>'])
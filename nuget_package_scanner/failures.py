@@ -0,0 +1,56 @@
+import asyncio
+from enum import Enum
+from xml.etree.ElementTree import ParseError
+
+import aiohttp
+from lxml import etree
+from tenacity import RetryError
+
+
+class FailureKind(Enum):
+    """ Why a file fetch or package lookup failed. The value is what the report shows in the status column. """
+    TIMEOUT = "timeout"
+    CONNECTION = "connection_error" # refused, reset or dropped before a response
+    PAYLOAD = "payload_error" # the response was cut off or couldn't be decoded
+    SERVER = "server_error" # 5xx or 429, after the client's own retries
+    CLIENT = "client_error" # any other 4xx, e.g. a private feed that denies access. Not worth retrying.
+    PARSE = "parse_error" # the contents couldn't be parsed. Fetching the same contents again won't help.
+    OTHER = "error"
+
+    @property
+    def retryable(self) -> bool:
+        return self not in (FailureKind.CLIENT, FailureKind.PARSE)
+
+
+def classify_failure(e: BaseException) -> FailureKind:
+    if isinstance(e, RetryError):
+        return FailureKind.SERVER # see SmartClient.get, which only gives up this way after 5xx or 429 responses
+    if isinstance(e, asyncio.TimeoutError):
+        return FailureKind.TIMEOUT
+    if isinstance(e, (aiohttp.ClientPayloadError, aiohttp.ContentTypeError, UnicodeDecodeError)):
+        return FailureKind.PAYLOAD
+    if isinstance(e, aiohttp.ClientResponseError):
+        return FailureKind.SERVER if e.status >= 500 or e.status == 429 else FailureKind.CLIENT
+    if isinstance(e, aiohttp.ClientError):
+        return FailureKind.CONNECTION
+    if isinstance(e, (etree.LxmlError, ParseError, ValueError, KeyError)):
+        return FailureKind.PARSE
+    return FailureKind.OTHER
+
+
+class RetryPolicy:
+    """
+    How an :class OrgScanner retries the files and package lookups that failed, once everything else is done.
+    Each failed unit is retried up to :param attempts times, :param backoff seconds after the first pass and twice as
+    long before every attempt after that. At most :param budget units are retried in all, so that a scan that fails
+    wholesale (e.g. because a feed is down) gives up quickly instead of hammering the server.
+    """
+    def __init__(self, attempts: int = 2, backoff: float = 2.0, budget: int = 500):
+        assert attempts >= 0 and backoff >= 0 and budget >= 0
+        self.attempts = attempts
+        self.backoff = backoff
+        self.budget = budget
+
+    def delay(self, attempt: int) -> float:
+        """ Seconds to wait before retry :param attempt (starting at 1). """
+        return self.backoff * 2 ** (attempt - 1)
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Mapping, Optional
+from urllib.parse import urlparse
+
+from .host_limiter import parse_retry_after
+
+
+class RateLimitBucket:
+    """
+    Tracks a single Github rate limit resource (e.g. core or search) from the X-RateLimit-* response headers.
+    https://docs.github.com/en/rest/overview/resources-in-the-rest-api#rate-limiting
+    """
+    def __init__(self, name: str, pace_threshold: float = 0.2, reserve: int = 1):
+        """
+        :param pace_threshold Once the remaining budget falls below this fraction of the limit, requests are spread
+            evenly over the time left until the reset instead of being sent as fast as possible.
+        :param reserve Number of requests to hold back. The bucket pauses until the reset when this is reached.
+        """
+        self.name = name
+        self.pace_threshold = pace_threshold
+        self.reserve = reserve
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset: Optional[float] = None # epoch seconds
+        self.paused_until = 0.0 # epoch seconds
+        self.__next_at = 0.0 # epoch seconds
+
+    def update(self, limit, remaining, reset) -> None:
+        if limit is not None:
+            self.limit = int(limit)
+        if remaining is not None:
+            self.remaining = int(remaining)
+        if reset is not None:
+            self.reset = float(reset)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        self.update(headers.get('X-RateLimit-Limit'), headers.get('X-RateLimit-Remaining'), headers.get('X-RateLimit-Reset'))
+
+    def pause(self, seconds: float, now: Optional[float] = None) -> None:
+        now = now if now is not None else time.time()
+        self.paused_until = max(self.paused_until, now + seconds)
+
+    def reserve_delay(self, now: Optional[float] = None) -> float:
+        """
+        Reserves a slot for the next request and returns how long the caller should wait (in seconds) before sending it.
+        Once the budget is down to :attr reserve the bucket is paused until the reset, so every request reserved before
+        then waits for it. The budget is only refilled once the reset has passed.
+        """
+        now = now if now is not None else time.time()
+        start = max(now, self.paused_until)
+        if self.reset is not None and self.reset <= now and self.limit is not None:
+            self.remaining = self.limit # a new window started (until the next response tells us otherwise)
+        if self.remaining is not None and self.reset is not None and self.reset > start:
+            if self.remaining <= self.reserve:
+                logging.warning(f'Github {self.name} rate limit budget exhausted. Pausing until {time.ctime(self.reset)}.')
+                self.paused_until = self.reset + 1
+                return self.paused_until - now
+            if self.limit and self.remaining < self.limit * self.pace_threshold:
+                start = max(start, self.__next_at)
+                self.__next_at = start + (self.reset - start) / (self.remaining - self.reserve)
+            # account for this request until the next response tells us otherwise
+            self.remaining -= 1
+        return max(0.0, start - now)
+
+
+class GithubRateLimiter:
+    """
+    Schedules Github API requests against the core and search rate limit buckets separately. Requests to hosts other
+    than the API (e.g. raw file downloads) are not rate limited by Github and are never delayed.
+    """
+    CORE = 'core'
+    SEARCH = 'search'
+    SECONDARY_LIMIT_PAUSE = 60 # Github asks to wait at least one minute when no Retry-After is provided
+
+    def __init__(self, api_host: str = 'api.github.com', api_path: str = ''):
+        """ :param api_path The path the API is served under, if any (e.g. /api/v3 for Github Enterprise). """
+        self.api_host = api_host
+        self.api_path = api_path.rstrip('/')
+        self.buckets: Dict[str, RateLimitBucket] = {
+            self.CORE: RateLimitBucket(self.CORE),
+            self.SEARCH: RateLimitBucket(self.SEARCH),
+        }
+
+    def bucket_for(self, url: str) -> Optional[RateLimitBucket]:
+        u = urlparse(url)
+        if u.netloc != self.api_host or not u.path.startswith(self.api_path):
+            return None
+        path = u.path[len(self.api_path):]
+        if path == '/rate_limit':
+            return None
+        return self.buckets[self.SEARCH] if path.startswith('/search/') else self.buckets[self.CORE]
+
+    async def wait(self, url: str) -> float:
+        """ Waits until the bucket for :param url allows another request. Returns how long it waited, in seconds. """
+        bucket = self.bucket_for(url)
+        delay = bucket.reserve_delay() if bucket else 0.0
+        if delay > 0:
+            logging.debug(f'Delaying {url} {delay:0.2f}s for the Github {bucket.name} rate limit.')
+            await asyncio.sleep(delay)
+        return delay
+
+    def update(self, url: str, headers: Mapping[str, str]) -> None:
+        bucket = self.bucket_for(url)
+        if bucket:
+            bucket.update_from_headers(headers)
+
+    def update_from_rate_limit_json(self, rate_limit_json: dict) -> None:
+        """ Seeds the buckets from the https://api.github.com/rate_limit response. """
+        resources = rate_limit_json.get('resources', {})
+        for name, bucket in self.buckets.items():
+            resource = resources.get(name)
+            if resource:
+                bucket.update(resource.get('limit'), resource.get('remaining'), resource.get('reset'))
+
+    def rate_limited(self, url: str, status: int, headers: Optional[Mapping[str, str]]) -> Optional[float]:
+        """
+        Inspects an error response and pauses the matching bucket if it was caused by a primary or secondary rate limit.
+        Returns the number of seconds the bucket was paused for, or None if the error wasn't rate limit related.
+        """
+        if status not in (403, 429):
+            return None
+        headers = headers or {}
+        bucket = self.bucket_for(url)
+        now = time.time()
+        delay = parse_retry_after(headers.get('Retry-After'), now)
+        if delay is None and headers.get('X-RateLimit-Remaining') == '0' and headers.get('X-RateLimit-Reset'):
+            delay = max(0.0, float(headers['X-RateLimit-Reset']) - now) + 1
+        if delay is None and status == 429:
+            delay = self.SECONDARY_LIMIT_PAUSE
+        if delay is None:
+            return None # a 403 that isn't rate limit related (e.g. permissions)
+        if bucket:
+            bucket.update_from_headers(headers)
+            bucket.pause(delay, now)
+        return delay
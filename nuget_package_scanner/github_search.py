@@ -2,31 +2,69 @@ import asyncio
 import datetime
 import logging
 import os
-from typing import AsyncGenerator, List, Optional, Set
+from typing import IO, Any, AsyncGenerator, Awaitable, Callable, List, Optional, Set, Tuple
+
+from urllib.parse import parse_qs, quote, urlparse
 
 import aiohttp
 
 from .smart_client import SmartClient
 from .async_utils import wait_or_raise
+from .github_rate_limit import GithubRateLimiter
 from .nuget import NugetConfig
+from .parser_pool import ParserPool
+from .tracing import span
+
+
+GITHUB_API_URL = 'https://api.github.com'
+GITHUB_RAW_URL = 'https://raw.githubusercontent.com'
 
 
 class GithubSearchResult:
-    def __init__(self, name, repo, path, url):        
+    def __init__(self, name, repo, path, url, sha = None):        
         self.name = name
         self.repo = repo
         self.path = path
         self.url = url        
+        self.sha = sha # git blob sha of the file
+
+def raw_content_url(item_json: dict, raw_url: str = GITHUB_RAW_URL) -> Optional[str]:
+    """
+    Builds the raw download url for a code search item from the repository full name, the ref in the item's
+    contents url and the path. Returns None if the item doesn't include enough information to do so.
+    :param raw_url The host that serves raw files.
+    """
+    full_name = item_json.get("repository", {}).get("full_name")
+    ref = parse_qs(urlparse(item_json.get("url", "")).query).get("ref")
+    path = item_json.get("path")
+    if not (full_name and ref and path):
+        return None
+    return f'{raw_url}/{full_name}/{quote(ref[0], safe="")}/{quote(path)}'
 
 class GithubClient:
+    MAX_RATE_LIMIT_RETRIES = 5
          
-    def __init__(self, token, client: SmartClient): 
+    def __init__(self, token, client: SmartClient, contents_concurrency: int = 10, api_url: str = GITHUB_API_URL,
+                 raw_url: str = GITHUB_RAW_URL): 
+        """
+        :param contents_concurrency The maximum number of concurrent contents api lookups for search results that don't
+            include enough information to build a raw download url.
+        :param api_url and :param raw_url The base urls of the API and of raw file downloads. Only needed for Github
+            Enterprise (e.g. https://github.contoso.com/api/v3 and https://github.contoso.com/raw) or a local stand-in.
+        """
         assert isinstance(token, str) and token
         self.headers = {"Authorization" : f"token {token}"}
+        self.api_url = api_url.rstrip('/')
+        self.raw_url = raw_url.rstrip('/')
         self.__client: SmartClient = client
+        api = urlparse(self.api_url)
+        self.rate_limiter = GithubRateLimiter(api.netloc, api.path)
+        self.__rate_limit_wait = client.metrics.counter('github_rate_limit_wait_seconds_total', 'Time requests were held back by the Github rate limits', ['bucket'])
+        self.__rate_limited = client.metrics.counter('github_rate_limited_total', 'Requests rejected by a Github primary or secondary rate limit', ['bucket'])
+        self.__contents_semaphore = asyncio.Semaphore(contents_concurrency)
 
     async def get_search_rate_limit_info(self) -> None:
-        response = await self.__client.get(f'https://api.github.com/rate_limit', False, self.headers)
+        response = await self.__client.get(f'{self.api_url}/rate_limit', False, self.headers)
         response_json = await response.json()
         search = response_json["resources"]["search"]
         github_reset = datetime.datetime.utcfromtimestamp(int(response.headers["X-RateLimit-Reset"]))
@@ -39,19 +77,82 @@ class GithubClient:
         print(f'Search API Reset: { search_reset }')        
     
     async def get_request_as_text(self, url: str) -> str:
-        async with await self.makeRequest(url) as response:            
-            return await response.text() #TODO There is an occassional issue with reading the response            
+        return await self.makeRequest(url, lambda response: response.text()) #TODO There is an occassional issue with reading the response            
 
     async def get_request_as_json(self, url: str) -> dict:
-        async with await self.makeRequest(url) as response:            
-            return await response.json()                                            
+        return await self.makeRequest(url, lambda response: response.json())
 
-    async def makeRequest(self, url) -> aiohttp.ClientResponse:        
-        response = await self.__client.get(url, False, self.headers)        
+    async def makeRequest(self, url, read: Optional[Callable[[aiohttp.ClientResponse], Awaitable[Any]]] = None) -> Any:        
+        """
+        Makes a request once the rate limiter allows it. If the request is rejected because of a primary or secondary
+        rate limit, the matching bucket is paused and the request is retried (up to MAX_RATE_LIMIT_RETRIES times).
+        If :param read is provided, the body is read with it before the request gives up its host limiter slot and what
+        it returns is returned instead of the response (see :meth SmartClient.get).
+        """
+        attempt = 0
+        bucket = self.rate_limiter.bucket_for(url)
+        bucket_name = bucket.name if bucket else 'none'
+        reader = None
+        if read:
+            async def reader(response: aiohttp.ClientResponse) -> Any:
+                self.__observe_rate_limits(url, response)
+                return await read(response)
+        while True:
+            waited = await self.rate_limiter.wait(url)
+            if waited:
+                self.__rate_limit_wait.labels(bucket_name).inc(waited)
+            try:
+                # rate limit errors are passed through to be scheduled against the matching bucket
+                result = await self.__client.get(url, False, self.headers, retry_rate_limits=False, read=reader)
+                break
+            except aiohttp.ClientResponseError as e:
+                delay = self.rate_limiter.rate_limited(url, e.status, e.headers)
+                if delay is not None:
+                    self.__rate_limited.labels(bucket_name).inc()
+                if delay is None or attempt >= self.MAX_RATE_LIMIT_RETRIES:
+                    raise
+                attempt += 1
+                logging.warning(f'Github rate limit hit for {url}. Retrying in {delay:0.0f}s.')
+                if bucket is None:
+                    await asyncio.sleep(delay) # otherwise, the paused bucket delays the next attempt
+                    self.__rate_limit_wait.labels(bucket_name).inc(delay)
+        if not read:
+            self.__observe_rate_limits(url, result)
+        return result
+
+    def __observe_rate_limits(self, url: str, response: aiohttp.ClientResponse) -> None:
+        self.rate_limiter.update(url, response.headers)
         limit = response.headers.get("X-RateLimit-Limit")
         remaining = response.headers.get("X-RateLimit-Remaining")
         logging.debug(f'GET { url } | Limit: { limit } | Remaining: { remaining }')          
-        return response
+
+    async def refresh_rate_limits(self) -> None:
+        """ Seeds the rate limiter from the rate_limit endpoint. This call does not count against any rate limit. """
+        try:
+            response = await self.__client.get(f'{self.api_url}/rate_limit', False, self.headers)
+            async with response:
+                self.rate_limiter.update_from_rate_limit_json(await response.json())
+        except aiohttp.ClientError as e:
+            logging.warning(f'Unable to fetch Github rate limits: {e}')
+
+    async def iter_org_repos(self, org) -> AsyncGenerator[dict, None]:
+        """ Yields the json for every repository in :param org. """
+        url = f'{self.api_url}/orgs/{org}/repos?per_page=100'
+        while url:
+            repos, url = await self.makeRequest(url, self.__read_page)
+            for repo in repos:
+                yield repo
+
+    async def download_repo_tarball(self, full_name: str, fileobj: IO[bytes], chunk_size: int = 64 * 1024) -> None:
+        """ Streams the default branch tarball for the :param full_name (owner/repo) repository into :param fileobj. """
+        async def download(response: aiohttp.ClientResponse) -> None:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                fileobj.write(chunk)
+        await self.makeRequest(f'{self.api_url}/repos/{full_name}/tarball', download)
+
+    async def __read_page(self, response: aiohttp.ClientResponse) -> Tuple[Any, str]:
+        """ Returns the json of a page of results and the url of the next page (empty after the last page). """
+        return await response.json(), self.__getNextPageLink(response)
 
     def __getNextPageLink(self, response: aiohttp.ClientResponse) -> str:
         nextPage = ""
@@ -65,16 +166,24 @@ class GithubClient:
                     break
         return nextPage
 
-    async def __process_search_page(self, item_json, results: List[GithubSearchResult]) -> None:                                
+    async def __process_search_item(self, item_json) -> Optional[GithubSearchResult]:                                
         name = item_json["name"]
         repo_name = item_json["repository"]["name"]
         path = item_json["path"]        
+        sha = item_json.get("sha")
+        sourceUrl = raw_content_url(item_json, self.raw_url)
+        if sourceUrl:
+            return GithubSearchResult(name, repo_name, path, sourceUrl, sha)
+
+        # Fall back to the contents api to find the download url
         details_url = item_json["url"]
         try:     
-            details = await self.get_request_as_json(details_url)
+            async with self.__contents_semaphore:
+                with span('contents lookup', 'github', repo=repo_name, path=path):
+                    details = await self.get_request_as_json(details_url)
             if details:
                 sourceUrl = details["download_url"]                                  
-                results.append(GithubSearchResult(name, repo_name, path, sourceUrl))  
+                return GithubSearchResult(name, repo_name, path, sourceUrl, sha)
         except asyncio.exceptions.TimeoutError:
             logging.warning(f'Skipped: Timed out attempting to fetch details_url json for search result response {details_url}')
         except aiohttp.ClientPayloadError:
@@ -84,54 +193,80 @@ class GithubClient:
     async def search_github_code(self, query, limit: Optional[int] = None) -> List[GithubSearchResult]:
         """ 
         Executes a github code search and returns the results in a list.
+        See :meth iter_github_code for details.
+        """
+        return [r async for r in self.iter_github_code(query, limit)]
+
+    async def iter_github_code(self, query, limit: Optional[int] = None, start_url: Optional[str] = None,
+                               on_page: Optional[Callable[[List[GithubSearchResult], str], None]] = None) -> AsyncGenerator[GithubSearchResult, None]:
+        """ 
+        Executes a github code search and yields each result as soon as it is available.
         Search results are paged - This call will likely result in multple requests to the api in
         order to aggregate all results. This call runs serially as it's explicity requested in
-        the Gihub API documentation (link below).
+        the Gihub API documentation (link below). The raw download url for each result is built directly from the
+        search item (see :func raw_content_url), so no additional request is needed per result.
 
-        Note: There is currently no logic to account for search api rate limiting. The github search
+        Requests are scheduled by the :class GithubRateLimiter, which paces them to spread the remaining
+        search and core budgets until they reset and pauses (rather than fails) when a limit is hit. The github search
         API will occassionally truncate responses based on how expensive the search call is on their
         backend. This can produce unexpected results.
         https://developer.github.com/v3/search/#timeouts-and-incomplete-results
         https://developer.github.com/changes/2014-04-07-understanding-search-results-and-potential-timeouts/
         Explicit ask to not make calls for a user concurrently
         https://developer.github.com/v3/guides/best-practices-for-integrators/#dealing-with-abuse-rate-limits
+
+        :param on_page Called with the results of each page (before they are yielded) and the url of the next page,
+        which is empty after the last page. Pass a next page url as :param start_url to pick a search back up from there.
         """
-        search_results = []  
-        response: aiohttp.ClientResponse = None      
-        url = f'https://api.github.com/search/code?q={query}'
+        url = start_url or f'{self.api_url}/search/code?q={query}'
         result_count = 0
+        page = 0
+        await self.refresh_rate_limits()
         while url:
             logging.info(f'Github Search Query: {url}')
-            #TODO: Bettter limiting checking while running. Currently, this will just bomb when the client
-            # throws an exception.
-            response = await self.makeRequest(url)         
-            results = await response.json()            
+            page += 1
+            # Note: A span can't stay open across a yield, since the consumer runs in between
+            with span('search page', 'github', query=query, page=page):
+                results, url = await self.makeRequest(url, self.__read_page)
 
             if results["incomplete_results"] is True:
                 logging.debug(f'Incomplete results returned for code search query.')
 
-            for item in results["items"]:
-                result_count += 1                
-                await self.__process_search_page(item,search_results)
-                if isinstance(limit, int) and result_count >= limit:                                     
-                    return search_results              
-            url = self.__getNextPageLink(response)     
-        response.release()
-        return search_results    
+            items = results["items"]
+            if isinstance(limit, int):
+                items = items[:max(0, limit - result_count)]
+            result_count += len(items)
+            with span('search items', 'github', query=query, page=page, items=len(items)):
+                processed = [r for r in await asyncio.gather(*[self.__process_search_item(item) for item in items]) if r]
+            if on_page:
+                on_page(processed, url)
+            for result in processed:
+                yield result
+            if isinstance(limit, int) and result_count >= limit:                                     
+                return
 
     async def search_nuget_configs(self, org, limit: Optional[int] = None) -> List[GithubSearchResult]:      
         return await self.search_github_code(f'packageSources+org:{org}+filename:nuget.config', limit)    
 
     async def search_netcore_csproj(self, org, limit: Optional[int] = None) -> List[GithubSearchResult]:
-        return await self.search_github_code(f'PackageReference+org:{org}+extension:csproj', limit)
+        return [r async for r in self.iter_netcore_csproj(org, limit)]
 
     async def search_package_configs(self, org, limit: Optional[int] = None) -> List[GithubSearchResult]:
-        return await self.search_github_code(f'package+org:{org}+filename:packages.config', limit)   
+        return [r async for r in self.iter_package_configs(org, limit)]
+
+    def iter_netcore_csproj(self, org, limit: Optional[int] = None, **page_options) -> AsyncGenerator[GithubSearchResult, None]:
+        """ :param page_options start_url and on_page (see :meth iter_github_code) """
+        return self.iter_github_code(f'PackageReference+org:{org}+extension:csproj', limit, **page_options)
+
+    def iter_package_configs(self, org, limit: Optional[int] = None, **page_options) -> AsyncGenerator[GithubSearchResult, None]:
+        """ :param page_options start_url and on_page (see :meth iter_github_code) """
+        return self.iter_github_code(f'package+org:{org}+filename:packages.config', limit, **page_options)
     
-    async def __build_nuget_config(self, result: GithubSearchResult, configs: dict) -> None:
+    async def __build_nuget_config(self, result: GithubSearchResult, configs: dict, parser: Optional[ParserPool]) -> None:
         try:      
-            source = await self.get_request_as_text(result.url)            
-            nc = NugetConfig(source)
+            with span('nuget.config fetch', 'github', repo=result.repo, path=result.path):
+                source = await self.get_request_as_text(result.url)            
+                nc = await parser.parse_nuget_config(source) if parser else NugetConfig(source)
             for i in nc.indexes:
                 v = nc.indexes[i]
                 if not configs.get(v):
@@ -142,14 +277,16 @@ class GithubClient:
             # https://docs.aiohttp.org/en/stable/client_reference.html#aiohttp.ClientPayloadError
             logging.warning(f'Skipped: Failed to read nuget.config source from {result.url}')        
         
-    async def get_unique_nuget_configs(self, org, limit: Optional[int] = None) -> dict:
+    async def get_unique_nuget_configs(self, org, limit: Optional[int] = None, parser: Optional[ParserPool] = None) -> dict:
         """
         Returns a dict of nuget servers where the key is the server url and the value is the name given in the config
+        :param parser If provided, large nuget.configs are parsed off of the event loop (see :class ParserPool).
         """        
         results = await self.search_nuget_configs(org, limit)  
         configsByValue = {}
         tasks = []
         for r in results:        
-            tasks.append(asyncio.create_task(self.__build_nuget_config(r, configsByValue),name=f'{r.url}'))
-        await asyncio.wait(tasks)
+            tasks.append(asyncio.create_task(self.__build_nuget_config(r, configsByValue, parser),name=f'{r.url}'))
+        if tasks: # asyncio.wait doesn't accept an empty set (e.g. an org without any nuget.config)
+            await asyncio.wait(tasks)
         return configsByValue
@@ -0,0 +1,196 @@
+import asyncio
+import contextlib
+import email.utils
+import logging
+import math
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import aiohttp
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """ Returns the number of seconds to wait from a Retry-After header (delta-seconds or an http date). """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at - (now if now is not None else time.time()))
+
+
+class RequestOutcome:
+    """ Collects the result of a single request made through :meth HostLimiter.request """
+    def __init__(self):
+        self.status: Optional[int] = None
+        self.retry_after: Optional[float] = None
+
+    def observe(self, response: aiohttp.ClientResponse) -> None:
+        self.status = response.status
+        if response.status == 429 or response.status == 503:
+            self.retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
+
+class HostLimiter:
+    """
+    Adaptive (AIMD) concurrency limit for a single host.
+
+    The in-flight limit starts small and grows by one for every healthy response until it reaches the slow start
+    threshold, after which it grows by roughly one per round trip (1/limit per response). Any error (429, 5xx, timeout,
+    connection error) or a response that is much slower than usual halves the limit. A Retry-After header pauses the
+    host entirely until the requested time.
+
+    The request timeout is derived from observed latency percentiles once enough samples have been collected.
+    """
+    ERROR_STATUSES = (429,)
+    LATENCY_WINDOW = 200
+    MIN_SAMPLES = 20
+    MAX_LIMIT = 100
+
+    def __init__(self, host: str, initial_limit: int = 10, min_limit: int = 1, max_limit: int = MAX_LIMIT,
+                 default_timeout: float = 20, min_timeout: float = 10, max_timeout: float = 60,
+                 slow_latency_factor: float = 4.0):
+        assert 1 <= min_limit <= initial_limit <= max_limit, ':param initial_limit must be between min_limit and max_limit'
+        self.host = host
+        self.limit: float = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.slow_latency_factor = slow_latency_factor
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.__slow_start_threshold: float = max_limit
+        self.__last_decrease = float('-inf')
+        self.__latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self.__condition: Optional[asyncio.Condition] = None
+
+    @property
+    def _condition(self) -> asyncio.Condition:
+        if self.__condition is None:
+            self.__condition = asyncio.Condition()
+        return self.__condition
+
+    def percentile(self, p: float) -> Optional[float]:
+        """ Returns the :param p (0-100) percentile of recently observed latencies in seconds. """
+        if not self.__latencies:
+            return None
+        ordered = sorted(self.__latencies)
+        index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    @property
+    def timeout(self) -> float:
+        """ Total request timeout in seconds based on the observed p99 latency. """
+        if len(self.__latencies) < self.MIN_SAMPLES:
+            return self.default_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.percentile(99) * self.slow_latency_factor))
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    # release the lock while paused so that a newer Retry-After can extend the pause
+                    self._condition.release()
+                    try:
+                        await asyncio.sleep(pause)
+                    finally:
+                        await self._condition.acquire()
+                    continue
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                await self._condition.wait()
+
+    async def release(self, latency: float, status: Optional[int] = None, retry_after: Optional[float] = None,
+                      started: Optional[float] = None, adjust: bool = True) -> None:
+        """
+        Releases a slot and adjusts the limit.
+        :param status The http status of the response or None if the request failed without one (e.g. timeout).
+        :param started The time.monotonic() the request was started at. Errors from requests that started before the
+            last decrease don't decrease the limit again, so a burst of failures only halves the limit once.
+        :param adjust If False, the slot is released without adjusting the limit (e.g. the request was cancelled).
+        """
+        async with self._condition:
+            self.in_flight -= 1
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                logging.warning(f'{self.host} asked to retry after {retry_after:0.1f}s. Pausing requests.')
+            if not adjust:
+                pass
+            elif status is None or status in self.ERROR_STATUSES or status >= 500:
+                self.__decrease(started)
+            elif self.__is_slow(latency):
+                self.__latencies.append(latency)
+                self.__decrease(started)
+            else:
+                self.__latencies.append(latency)
+                self.__increase()
+            self._condition.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def request(self):
+        """
+        Waits for a slot and yields a :class RequestOutcome that should be given the response.
+        Exceptions raised in the block are recorded as errors.
+
+        >>> async with limiter.request() as outcome:
+        >>>     response = await session.get(url, timeout=aiohttp.ClientTimeout(total=limiter.timeout))
+        >>>     outcome.observe(response)
+        """
+        await self.acquire()
+        outcome = RequestOutcome()
+        start = time.monotonic()
+        adjust = True
+        try:
+            yield outcome
+        except aiohttp.ClientResponseError as e:
+            outcome.status = e.status
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            outcome.status = None
+            raise
+        except asyncio.CancelledError:
+            adjust = False
+            raise
+        finally:
+            await self.release(time.monotonic() - start, outcome.status, outcome.retry_after, start, adjust)
+
+    def __is_slow(self, latency: float) -> bool:
+        if len(self.__latencies) < self.MIN_SAMPLES:
+            return False
+        return latency > self.percentile(50) * self.slow_latency_factor
+
+    def __increase(self) -> None:
+        if self.limit < self.__slow_start_threshold:
+            self.limit += 1
+        else:
+            self.limit += 1 / self.limit
+        self.limit = min(self.limit, self.max_limit)
+
+    def __decrease(self, started: Optional[float]) -> None:
+        if started is not None and started < self.__last_decrease:
+            return
+        self.__last_decrease = time.monotonic()
+        self.__slow_start_threshold = max(self.min_limit, self.limit / 2)
+        self.limit = self.__slow_start_threshold
+        logging.debug(f'Reduced concurrency limit for {self.host} to {int(self.limit)}')
+
+
+class HostLimiters:
+    """ Creates and holds a :class HostLimiter per host. Extra keyword arguments are passed to every limiter. """
+    def __init__(self, **limiter_kwargs):
+        self.__limiter_kwargs = limiter_kwargs
+        self.limiters: Dict[str, HostLimiter] = {}
+
+    def get(self, host: str) -> HostLimiter:
+        if self.limiters.get(host) is None:
+            self.limiters[host] = HostLimiter(host, **self.__limiter_kwargs)
+        return self.limiters[host]
@@ -0,0 +1,102 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Mapping, Optional
+
+
+class CachedResponse:
+    """
+    A response body that was previously stored on disk along with the validators (ETag/Last-Modified) that the
+    server returned for it. The body is only read from disk when it is actually needed (i.e. after a 304).
+    """
+    def __init__(self, url: str, body_path: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.__body_path = body_path
+
+    def conditional_headers(self) -> dict:
+        """ Returns the request headers needed to revalidate this response with the server. """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def read_body(self) -> str:
+        with gzip.open(self.__body_path, 'rt', encoding='utf-8') as f:
+            return f.read()
+
+
+class HttpCache:
+    """
+    Persistent, on-disk cache of GET response bodies keyed by url. Bodies are stored gzip compressed next to a small
+    json file holding the validators needed to make a conditional request on the next run. Only responses that
+    include an ETag or Last-Modified header are stored since there is no way to revalidate anything else.
+
+    >>> cache = HttpCache('~/.nuget-package-scanner/http')
+    >>> entry = cache.load(url)
+    >>> headers = entry.conditional_headers() if entry else {}
+    """
+    def __init__(self, directory: str):
+        assert isinstance(directory, str) and directory, ':param directory must be a non-empty string.'
+        self.directory = os.path.expanduser(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __paths(self, url: str):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key[:2], key)
+        return f'{base}.json', f'{base}.gz'
+
+    def load(self, url: str) -> Optional[CachedResponse]:
+        """ Returns the stored entry for :param url or None if there isn't a usable one. """
+        meta_path, body_path = self.__paths(url)
+        if not os.path.exists(meta_path) or not os.path.exists(body_path):
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            logging.debug(f'Ignoring unreadable http cache entry for {url}')
+            return None
+        if meta.get('url') != url:
+            return None
+        return CachedResponse(url, body_path, meta.get('etag'), meta.get('last_modified'))
+
+    def store(self, url: str, body: str, headers: Mapping[str, str]) -> bool:
+        """
+        Stores :param body for :param url if the response :param headers include a validator.
+        Returns True if the body was stored.
+        """
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if body is None or not (etag or last_modified):
+            return False
+        meta_path, body_path = self.__paths(url)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        # write the body before the metadata so that a crash never leaves metadata pointing at a partial body
+        self.__write_atomic(body_path, gzip.compress(body.encode('utf-8')))
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified}
+        self.__write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+        return True
+
+    def invalidate(self, url: str) -> None:
+        for path in self.__paths(url):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def __write_atomic(self, path: str, data: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
@@ -0,0 +1,98 @@
+import json
+from typing import Any, FrozenSet, Iterable, Tuple
+
+try:
+    import ijson # optional: pip install nuget-package-scanner[streaming]
+except ImportError: # pragma: no cover
+    ijson = None
+
+# The only registration index/page/leaf fields the scanner reads. Everything else (e.g. the bulk of catalogEntry) is
+# dropped while decoding.
+REGISTRATION_KEYS: FrozenSet[str] = frozenset([
+    '@id', 'count', 'lower', 'upper', 'parent', 'commitTimeStamp', 'items', 'catalogEntry', 'id', 'version', 'listed',
+    'published',
+])
+
+
+def project(obj: Any, keys: FrozenSet[str]) -> Any:
+    """ Returns a copy of the decoded json :param obj that only keeps object members whose name is in :param keys. """
+    if isinstance(obj, dict):
+        return {k: project(v, keys) for k, v in obj.items() if k in keys}
+    if isinstance(obj, list):
+        return [project(v, keys) for v in obj]
+    return obj
+
+
+class JsonProjector:
+    """
+    Builds the projection of a json document (see :func project) from a stream of ijson parse events, so that dropped
+    members are never turned into python objects.
+    """
+    def __init__(self, keys: FrozenSet[str]):
+        self.keys = keys
+        self.result = None
+        self.__stack = []
+        self.__key = None
+        self.__skip_value = False # the next value belongs to a dropped member
+        self.__skip_depth = 0 # nesting depth inside a dropped member
+
+    def feed(self, events: Iterable[Tuple[str, str, Any]]) -> None:
+        for _, event, value in events:
+            self.event(event, value)
+
+    def event(self, event: str, value: Any) -> None:
+        if self.__skip_depth:
+            if event in ('start_map', 'start_array'):
+                self.__skip_depth += 1
+            elif event in ('end_map', 'end_array'):
+                self.__skip_depth -= 1
+            return
+        if self.__skip_value:
+            self.__skip_value = False
+            if event in ('start_map', 'start_array'):
+                self.__skip_depth = 1
+            return
+        if event == 'map_key':
+            if value in self.keys:
+                self.__key = value
+            else:
+                self.__skip_value = True
+        elif event in ('start_map', 'start_array'):
+            container = {} if event == 'start_map' else []
+            self.__add(container)
+            self.__stack.append(container)
+        elif event in ('end_map', 'end_array'):
+            self.__stack.pop()
+        else:
+            self.__add(value)
+
+    def __add(self, value: Any) -> None:
+        if not self.__stack:
+            self.result = value
+        elif isinstance(self.__stack[-1], list):
+            self.__stack[-1].append(value)
+        else:
+            self.__stack[-1][self.__key] = value
+
+
+def loads_projected(text: str, keys: FrozenSet[str]) -> Any:
+    """ Decodes the json :param text and returns its projection onto :param keys. """
+    if ijson is None:
+        return project(json.loads(text), keys)
+    projector = JsonProjector(keys)
+    projector.feed(ijson.parse(text.encode('utf-8'), use_float=True))
+    return projector.result
+
+
+async def read_projected_json(stream, keys: FrozenSet[str]) -> Any:
+    """
+    Decodes the json body read from :param stream (e.g. aiohttp's response.content) and returns its projection onto
+    :param keys. With ijson installed, the body is parsed incrementally as chunks arrive and only the projection is
+    ever held in memory. Without it, the body is read and decoded in full before being projected.
+    """
+    if ijson is None:
+        return project(json.loads(await stream.read()), keys)
+    projector = JsonProjector(keys)
+    async for _, event, value in ijson.parse_async(stream, use_float=True):
+        projector.event(event, value)
+    return projector.result
@@ -0,0 +1,260 @@
+import bisect
+import contextlib
+import json
+import math
+import os
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .tracing import span
+
+# Upper bounds (in seconds) of the default histogram buckets. Suited to http latencies, from a local cache to a slow feed.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PHASE_SECONDS = 'phase_seconds_total'
+
+
+class _Counter:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        assert amount >= 0, 'Counters can only go up'
+        self.value += amount
+
+    def summary(self):
+        return self.value
+
+
+class _Gauge:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_max(self, value: float) -> None:
+        """ Keeps the highest value seen, e.g. for the high-water mark of a queue. """
+        self.value = max(self.value, value)
+
+    def summary(self):
+        return self.value
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @contextlib.contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """ Returns (upper bound, number of observations <= upper bound) for every bucket including +Inf. """
+        total = 0
+        result = []
+        for bound, count in zip([*self.buckets, math.inf], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimates the :param q quantile by interpolating linearly within the bucket it falls in (like Prometheus'
+        histogram_quantile). Observations above the last bucket are reported as the last bucket's upper bound.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower, below = 0.0, 0
+        for bound, total in self.cumulative():
+            if total >= rank:
+                if math.isinf(bound):
+                    return lower
+                in_bucket = total - below
+                return lower + (bound - lower) * ((rank - below) / in_bucket if in_bucket else 1)
+            lower, below = bound, total
+        return lower
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+        }
+
+
+class MetricFamily:
+    """ A named metric with a fixed set of label names. Each combination of label values is tracked separately. """
+    TYPES = {'counter': _Counter, 'gauge': _Gauge, 'histogram': _Histogram}
+
+    def __init__(self, name: str, kind: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        assert kind in self.TYPES, f'Unknown metric type {kind}'
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values):
+        """ Returns the counter, gauge or histogram for :param values (one per label name, in order). """
+        assert len(values) == len(self.label_names), f'{self.name} expects labels {self.label_names}'
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            child = _Histogram(self.buckets) if self.kind == 'histogram' else self.TYPES[self.kind]()
+            self.children[key] = child
+        return child
+
+    def items(self) -> Iterator[Tuple[Dict[str, str], object]]:
+        for key, child in sorted(self.children.items()):
+            yield dict(zip(self.label_names, key)), child
+
+
+class Metrics:
+    """
+    Registry of the counters, gauges and histograms recorded during a scan. Components register the metrics they
+    record by name, and registering the same name again returns the existing metric, so every component that shares a
+    :class SmartClient also shares its registry.
+
+    Collectors (see :meth add_collector) are called right before every export, to copy in values that are tracked
+    elsewhere (e.g. the :class ResponseCache hit counters). Sections (see :meth add_section) add derived views to the
+    json summary, e.g. one line per host.
+
+    >>> metrics = Metrics()
+    >>> requests = metrics.counter('http_requests_total', 'Http requests', ['host', 'status'])
+    >>> requests.labels('api.github.com', 200).inc()
+    >>> with metrics.phase('scan'):
+    >>>     ...
+    >>> metrics.write('metrics.prom')
+    """
+    def __init__(self, prefix: str = 'nuget_scanner'):
+        self.prefix = prefix
+        self.families: Dict[str, MetricFamily] = {}
+        self.__collectors: List[Callable[[], None]] = []
+        self.__sections: Dict[str, Callable[[], object]] = {}
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> MetricFamily:
+        return self.__register(name, 'counter', help, labels)
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> MetricFamily:
+        return self.__register(name, 'gauge', help, labels)
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> MetricFamily:
+        return self.__register(name, 'histogram', help, labels, buckets)
+
+    def __register(self, name: str, kind: str, help: str, labels: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS) -> MetricFamily:
+        family = self.families.get(name)
+        if family is None:
+            family = MetricFamily(name, kind, help, labels, buckets)
+            self.families[name] = family
+        assert family.kind == kind and family.label_names == tuple(labels), f'{name} is already registered differently'
+        return family
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        self.__collectors.append(collector)
+
+    def add_section(self, name: str, section: Callable[[], object]) -> None:
+        self.__sections[name] = section
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Adds the time spent in the block to the :param name phase. Phases that run several times accumulate.
+        The phase is also recorded as a span if tracing is active (see :mod tracing).
+        """
+        seconds = self.counter(PHASE_SECONDS, 'Wall time spent in each phase of a run', ['phase']).labels(name)
+        start = time.perf_counter()
+        try:
+            with span(name, 'phase'):
+                yield
+        finally:
+            seconds.inc(time.perf_counter() - start)
+
+    def phases(self) -> Dict[str, float]:
+        family = self.families.get(PHASE_SECONDS)
+        return {labels['phase']: child.value for labels, child in family.items()} if family else {}
+
+    def collect(self) -> None:
+        for collector in self.__collectors:
+            collector()
+
+    def to_prometheus(self) -> str:
+        """ Returns every metric in the Prometheus text exposition format (e.g. for the node_exporter textfile collector). """
+        self.collect()
+        lines = []
+        for family in self.families.values():
+            name = f'{self.prefix}_{family.name}' if self.prefix else family.name
+            lines.append(f'# HELP {name} {_escape_help(family.help)}')
+            lines.append(f'# TYPE {name} {family.kind}')
+            for labels, child in family.items():
+                if family.kind == 'histogram':
+                    for bound, total in child.cumulative():
+                        lines.append(f'{name}_bucket{_format_labels({**labels, "le": _format_value(bound)})} {total}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(child.sum)}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {child.count}')
+                else:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(child.value)}')
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self) -> dict:
+        """ Returns a json serializable summary: histograms are reduced to count, sum, mean and p50/p90/p99. """
+        self.collect()
+        summary = {name: section() for name, section in self.__sections.items()}
+        summary['phases'] = self.phases()
+        summary['metrics'] = {
+            family.name: {
+                'type': family.kind,
+                'help': family.help,
+                'values': [{'labels': labels, 'value': child.summary()} for labels, child in family.items()],
+            }
+            for family in self.families.values()
+        }
+        return summary
+
+    def write(self, path: str) -> None:
+        """ Writes the Prometheus text format if :param path ends with .prom (or .txt), the json summary otherwise. """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            if os.path.splitext(path)[1].lower() in ('.prom', '.txt'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_json(), f, indent=2)
+
+
+def _escape_help(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
@@ -2,6 +2,8 @@ from . import version_util
 from . import date_util
 from .nuget import Nuget
 from .nuget_server import NugetServer
+from .feed_resolver import FeedResolver
+from .catalog_mirror import CatalogMirror
 from .registrations import Registrations
 from .registrations import RegistrationsIndex
 from .registrations import RegistrationsVersion
@@ -14,4 +16,5 @@ from .nuget_config import Package
 from .nuget_config import PackageConfig
 from .nuget_config import PackageContainer
 from .nuget_config import NetCoreProject
-from .version_util import VersionPart
\ No newline at end of file
+from .version_util import VersionPart
+from .nuget_version import NuGetVersion
\ No newline at end of file
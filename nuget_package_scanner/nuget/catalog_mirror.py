@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import sqlite3
+from typing import List, Optional, Tuple
+
+from ..smart_client import SmartClient
+from . import date_util
+from .nuget_server import NugetServer
+from .nuget_version import NuGetVersion
+
+PACKAGE_DETAILS = "nuget:PackageDetails"
+PACKAGE_DELETE = "nuget:PackageDelete"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feeds (
+    feed TEXT PRIMARY KEY,      -- service index url
+    cursor TEXT,                -- commitTimeStamp of the last catalog item applied
+    complete INTEGER NOT NULL   -- 1 once the whole catalog of the feed has been applied
+);
+CREATE TABLE IF NOT EXISTS versions (
+    feed TEXT NOT NULL,
+    id TEXT NOT NULL,           -- lower case package id
+    version_key TEXT NOT NULL,  -- lower case normalized version (see version_key)
+    version TEXT NOT NULL,
+    date TEXT,                  -- YYYY-MM-DD of the commit (the same date registrations report)
+    listed INTEGER,             -- only known if leaves were fetched
+    deprecated INTEGER,         -- only known if leaves were fetched
+    PRIMARY KEY (feed, id, version_key)
+);
+"""
+
+
+def version_key(version: str) -> str:
+    """
+    Returns the lower case normalized form of :param version that Nuget uses to tell versions apart: missing parts are
+    0, leading zeroes and a 0 revision are dropped and build metadata is ignored (e.g. 1.01-Beta+abc -> 1.1.0-beta).
+    """
+    try:
+        v = NuGetVersion.parse(version)
+    except AssertionError:
+        return version.lower()
+    return str(NuGetVersion(v.major, v.minor, v.patch, v.revision, v.release_labels)).lower()
+
+
+class CatalogMirror:
+    """
+    A local, indexed copy of the package id -> versions -> dates of one or more Nuget feeds, kept up to date from each
+    feed's catalog (https://docs.microsoft.com/en-us/nuget/api/catalog-resource).
+
+    :meth sync reads the catalog incrementally from the cursor stored for the feed, so only the items committed since
+    the last sync are downloaded. Once a feed has been mirrored from the start of its catalog, :meth get_versions
+    answers lookups for it without any network calls.
+
+    Catalog items don't include the listed/deprecation state. Pass :param fetch_leaves to fetch every item's leaf
+    document to record them (one request per item).
+    """
+    def __init__(self, path: str, client: SmartClient, fetch_leaves: bool = False, page_concurrency: int = 8):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.fetch_leaves = fetch_leaves
+        self.page_concurrency = page_concurrency
+        self.__client = client
+        self.__db = sqlite3.connect(path)
+        self.__db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.__db.close()
+
+    def feeds(self) -> List[str]:
+        """ Returns the service index url of every feed that has been (at least partially) mirrored. """
+        return [row[0] for row in self.__db.execute("SELECT feed FROM feeds")]
+
+    def cursor(self, feed: str) -> Optional[str]:
+        row = self.__db.execute("SELECT cursor FROM feeds WHERE feed = ?", (feed,)).fetchone()
+        return row[0] if row else None
+
+    def is_complete(self, feed: str) -> bool:
+        row = self.__db.execute("SELECT complete FROM feeds WHERE feed = ?", (feed,)).fetchone()
+        return bool(row and row[0])
+
+    def get_versions(self, feed: str, package_id: str) -> Optional[List[Tuple[str, Optional[str]]]]:
+        """
+        Returns (version, date) for every version of :param package_id on :param feed, or None if :param feed hasn't
+        been mirrored completely (in which case the mirror can't tell whether the package exists).
+        """
+        if not self.is_complete(feed):
+            return None
+        rows = self.__db.execute("SELECT version, date FROM versions WHERE feed = ? AND id = ?", (feed, package_id.lower()))
+        return rows.fetchall()
+
+    async def sync(self, server: NugetServer) -> int:
+        """ Applies every catalog item committed since the last sync of :param server. Returns the number applied. """
+        if not server.catalog_url:
+            return 0
+        feed = server.index_url
+        cursor = self.cursor(feed)
+        if cursor is None:
+            with self.__db:
+                self.__db.execute("INSERT OR IGNORE INTO feeds (feed, cursor, complete) VALUES (?, NULL, 0)", (feed,))
+
+        # commit timestamps are compared parsed, since their offsets and fraction widths vary
+        committed = lambda i: date_util.get_datetime_from_iso_string(i["commitTimeStamp"])
+        after = date_util.get_datetime_from_iso_string(cursor) if cursor else None
+        catalog = await self.__get_json(server.catalog_url)
+        pages = sorted((p for p in catalog.get("items", []) if after is None or committed(p) > after), key=committed)
+        applied = 0
+        # Pages are downloaded concurrently but applied in commit order, so the cursor never skips an item.
+        for start in range(0, len(pages), self.page_concurrency):
+            batch = pages[start:start + self.page_concurrency]
+            for page_json in await asyncio.gather(*[self.__get_json(p["@id"]) for p in batch]):
+                items = sorted((i for i in page_json.get("items", []) if after is None or committed(i) > after),
+                               key=committed)
+                applied += await self.__apply(feed, items)
+        with self.__db:
+            self.__db.execute("UPDATE feeds SET complete = 1 WHERE feed = ?", (feed,))
+        logging.info(f'Applied {applied} catalog item(s) to the mirror of {feed}.')
+        return applied
+
+    async def __apply(self, feed: str, items: List[dict]) -> int:
+        if not items:
+            return 0
+        leaves = await asyncio.gather(*[self.__get_leaf(i) for i in items])
+        with self.__db:
+            for item, leaf in zip(items, leaves):
+                package_id = item["nuget:id"].lower()
+                version = item["nuget:version"]
+                if item["@type"] == PACKAGE_DELETE:
+                    self.__db.execute("DELETE FROM versions WHERE feed = ? AND id = ? AND version_key = ?",
+                                      (feed, package_id, version_key(version)))
+                elif item["@type"] == PACKAGE_DETAILS:
+                    date = date_util.get_date_from_iso_string(item["commitTimeStamp"]).strftime('%Y-%m-%d')
+                    listed = leaf.get("listed") if leaf else None
+                    deprecated = (leaf.get("deprecation") is not None) if leaf else None
+                    self.__db.execute("INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                      (feed, package_id, version_key(version), version, date, listed, deprecated))
+            self.__db.execute("UPDATE feeds SET cursor = ? WHERE feed = ?", (items[-1]["commitTimeStamp"], feed))
+        return len(items)
+
+    async def __get_leaf(self, item: dict) -> Optional[dict]:
+        if self.fetch_leaves and item["@type"] == PACKAGE_DETAILS:
+            return await self.__get_json(item["@id"])
+
+    async def __get_json(self, url: str) -> dict:
+        # Catalog documents are read once, so they bypass the response cache
+        document = await self.__client.get(url, read=lambda response: response.json(content_type=None))
+        return {} if document is None else document
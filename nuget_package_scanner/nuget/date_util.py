@@ -1,6 +1,30 @@
 import datetime
+import re
+
+ISO_TIMESTAMP = re.compile(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?(Z|[+-]\d{2}:?\d{2})?$')
 
 def get_date_from_iso_string(iso_date_string: str) -> datetime.date:
     assert isinstance(iso_date_string,str) and iso_date_string
     parts = str.split(iso_date_string,'T')    
-    return datetime.datetime.strptime(parts[0],'%Y-%m-%d')   
+    return datetime.datetime.strptime(parts[0],'%Y-%m-%d')
+
+
+def get_datetime_from_iso_string(iso_date_string: str) -> datetime.datetime:
+    """
+    Parses an ISO 8601 timestamp such as a catalog commitTimeStamp (e.g. 2020-02-08T04:03:07.1786999Z) into a timezone
+    aware datetime, so that timestamps with different offsets or fraction widths compare correctly. Timestamps without
+    an offset are taken to be UTC and digits beyond microseconds are dropped.
+    """
+    assert isinstance(iso_date_string,str) and iso_date_string
+    match = ISO_TIMESTAMP.match(iso_date_string)
+    assert match, f':param iso_date_string [{iso_date_string}] is not a valid timestamp.'
+    seconds, fraction, offset = match.groups()
+    timestamp = datetime.datetime.strptime(seconds, '%Y-%m-%dT%H:%M:%S')
+    if fraction:
+        timestamp = timestamp.replace(microsecond=int(fraction[:6].ljust(6, '0')))
+    tz = datetime.timezone.utc
+    if offset and offset != 'Z':
+        hours, minutes = int(offset[1:3]), int(offset[-2:])
+        sign = -1 if offset[0] == '-' else 1
+        tz = datetime.timezone(sign * datetime.timedelta(hours=hours, minutes=minutes))
+    return timestamp.replace(tzinfo=tz)
@@ -0,0 +1,110 @@
+import asyncio
+import fnmatch
+import json
+import logging
+import os
+import tempfile
+from typing import Dict, List, Optional, Set
+
+from ..tracing import span
+from .nuget_server import NugetServer
+
+
+class FeedResolver:
+    """
+    Finds the Nuget server (feed) that houses a package id.
+
+    - Routing rules map package id globs to a feed index url (e.g. {'Contoso.*': 'https://contoso/nuget/v3/index.json'}).
+      Matching feeds are tried first, in rule order.
+    - Routes learned in previous runs (persisted to :param route_file) are tried next.
+    - Otherwise every feed is probed concurrently. The first feed in priority order (nuget.org, then the configured
+      feeds) that has the id wins, so results don't depend on which feed answers first.
+    - Ids that aren't found on any feed are remembered for the rest of the run.
+
+    In the common case, resolving an id costs one request no matter how many feeds are configured.
+    """
+    VERSION = 1
+
+    def __init__(self, rules: Optional[Dict[str, str]] = None, route_file: Optional[str] = None):
+        self.rules = [(pattern.lower(), index_url) for pattern, index_url in (rules or {}).items()]
+        self.route_file = route_file
+        self.__routes: Dict[str, str] = {} # lower case package id -> feed index url
+        self.__misses: Set[str] = set()
+        self.__pending: Dict[str, asyncio.Future] = {}
+        self.__load()
+
+    def __load(self) -> None:
+        if not self.route_file or not os.path.exists(self.route_file):
+            return
+        try:
+            with open(self.route_file, 'r') as f:
+                routes = json.load(f)
+        except (OSError, ValueError):
+            logging.warning(f'Ignoring unreadable feed routes {self.route_file}.')
+            return
+        if routes.get('version') == self.VERSION:
+            self.__routes = routes.get('routes', {})
+
+    def save(self) -> None:
+        if not self.route_file:
+            return
+        directory = os.path.dirname(os.path.abspath(self.route_file))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'version': self.VERSION, 'routes': self.__routes}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.route_file)
+
+    def forget_misses(self) -> None:
+        """ Call when a feed is added, since ids that weren't found before may be found on it. """
+        self.__misses.clear()
+
+    def route_for(self, package_id: str) -> Optional[str]:
+        return self.__routes.get(package_id.lower())
+
+    async def resolve(self, package_id: str, servers: List[NugetServer]) -> Optional[NugetServer]:
+        """ Returns the :class NugetServer in :param servers (in priority order) that houses :param package_id. """
+        key = package_id.lower()
+        if key in self.__misses:
+            return None
+        pending = self.__pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self.__resolve(package_id, servers))
+            self.__pending[key] = pending
+            pending.add_done_callback(lambda _: self.__pending.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def __resolve(self, package_id: str, servers: List[NugetServer]) -> Optional[NugetServer]:
+        key = package_id.lower()
+        by_url = {s.index_url: s for s in servers}
+        preferred = [by_url[url] for pattern, url in self.rules if url in by_url and fnmatch.fnmatchcase(key, pattern)]
+        route = self.__routes.get(key)
+        if route in by_url:
+            preferred.append(by_url[route])
+        for server in dict.fromkeys(preferred): # unique, in order
+            if await self.__has(server, package_id):
+                return self.__found(key, server)
+
+        # probe every feed at once, but honor the priority order when more than one has the id
+        probes = [asyncio.ensure_future(self.__has(s, package_id)) for s in servers]
+        try:
+            for server, probe in zip(servers, probes):
+                if await probe:
+                    return self.__found(key, server)
+        finally:
+            for probe in probes:
+                probe.cancel()
+        self.__misses.add(key)
+        self.__routes.pop(key, None)
+        return None
+
+    def __found(self, key: str, server: NugetServer) -> NugetServer:
+        self.__routes[key] = server.index_url
+        return server
+
+    @staticmethod
+    async def __has(server: NugetServer, package_id: str) -> bool:
+        with span('feed probe', 'nuget', feed=server.index_url, package=package_id) as s:
+            found = await server.has_package(package_id)
+            s.set(found=found)
+            return found
@@ -1,18 +1,19 @@
-import datetime
-import functools
+import asyncio
 import logging
-from enum import Enum
-from typing import AsyncGenerator, List, Union
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 
 from ..smart_client import SmartClient
+from ..tracing import span
 
-import nuget_package_scanner.nuget
-import nuget_package_scanner.nuget.date_util as date_util
 import nuget_package_scanner.nuget.version_util as version_util
 
+from .catalog_mirror import CatalogMirror
+from .feed_resolver import FeedResolver
 from .nuget_server import NugetServer
 from .nuget_config import Package
-from .registrations import RegistrationsIndex
+from .nuget_version import NuGetVersion
+from .registration_timeline import RegistrationTimeline
 from .version_util import VersionPart
 
 
@@ -25,32 +26,73 @@ class Nuget:
         return self
     
     async def __aexit__(self, exc_type, exc_value, traceback):
-        return
+        self._resolver.save()
 
-    def __init__(self, client: SmartClient, configs: dict = {}): 
+    def __init__(self, client: SmartClient, configs: dict = {}, feed_rules: Optional[Dict[str, str]] = None,
+                 route_file: Optional[str] = None, include_dates: bool = True,
+                 catalog_mirror: Optional[CatalogMirror] = None,
+                 default_index_url: str = NugetServer.DEFAULT_SERVICE_INDEX_URL): 
         """
         Initializes the client.
         param: configs Additional Nuget servers to search if a package is not found on nuget.org.\n
             key: Nuget server server index url
             value: Name
+        param: feed_rules Package id globs mapped to the server index url that should be tried first for matching ids
+            (e.g. {'Contoso.*': 'https://pkgs.contoso.com/nuget/v3/index.json'}). See :class FeedResolver.
+        param: route_file If provided, the server each package id was found on is persisted here and tried first on
+            the next run.
+        param: include_dates If False, publish dates aren't looked up. On servers with a flat container, this means the
+            registration index and pages are never fetched. If True, the registration index is needed anyway, so the
+            flat container isn't used: packages are found and their versions listed with the registration index alone.
+        param: catalog_mirror If provided, the feeds it has mirrored are brought up to date when the client is
+            initialized and packages on those feeds are looked up locally, without any network calls.
+        param: default_index_url The server that is searched first, nuget.org unless overridden (e.g. by a stand-in).
         """      
-        self._configs = configs
+        self._configs = dict(configs)
+        self._resolver = FeedResolver(feed_rules, route_file)
+        self.include_dates = include_dates
         self._clients_cache: List[NugetServer] = []
-        self._package_cache = {}
+        self._timelines: Dict[str, asyncio.Future] = {} # RegistrationTimeline per registration index url
+        self._mirror = catalog_mirror
+        self._default_index_url = default_index_url
         self._client = client  
+        self._lookups = client.metrics.counter('nuget_lookups_total', 'Package lookups by feed and result (mirror, found or not_found)', ['feed', 'result'])
     
     async def initialize_clients(self):          
-        await self.__get_clients()    
+        with self._client.metrics.phase('initialize_feeds'):
+            clients = await self.__get_clients()    
+            if self._mirror:
+                mirrored = self._mirror.feeds()
+                await asyncio.gather(*[self._mirror.sync(c) for c in clients if c.index_url in mirrored])
 
     async def __get_clients(self):
         if self._clients_cache:
             return self._clients_cache     
-        self._clients_cache.append(await NugetServer.create(self._client)) # ensuring that nuget.org is added first
+        self._clients_cache.append(await self.__create_server(self._default_index_url)) # ensuring that nuget.org is added first
         for c in self._configs:
-            self._clients_cache.append(await NugetServer.create(self._client,c))
+            self._clients_cache.append(await self.__create_server(c))
 
         return self._clients_cache   
     
+    async def __create_server(self, index_url: str) -> NugetServer:
+        return await NugetServer.create(self._client, index_url, use_flat_container=not self.include_dates)
+
+    async def add_config(self, index_url: str, name: str = ''):
+        """
+        Adds a Nuget server that was discovered after this client was initialized (e.g. from a nuget.config found while
+        scanning). Servers that are already configured, or that fail to initialize, are ignored.
+        """
+        clients = await self.__get_clients()
+        if index_url in self._configs or any(c.index_url == index_url for c in clients):
+            return
+        self._configs[index_url] = name
+        try:
+            clients.append(await self.__create_server(index_url))
+            self._resolver.forget_misses()
+            logging.info(f'Added Nuget Server {name} Index: {index_url}')
+        except Exception:
+            logging.warning(f'Skipped: Failed to initialize Nuget Server {name} Index: {index_url}')
+
     async def get_fetch_package_details(self, package: Package):
         """
         Attempts to ge the package from cache, then falls back to a nuget server query if not found.
@@ -59,17 +101,29 @@ class Nuget:
         to cycle through any :param configs that have been provided.
         """
         assert isinstance(package, Package)        
-        nuget_server: NugetServer = await self.__fetch_server_for_id(package.name)
-        # Note: If you're wondering where caching is at, it's on in the client
+        mirrored = await self.__get_mirrored_timeline(package.name)
+        if mirrored:
+            nuget_server, timeline = mirrored
+        else:
+            nuget_server: NugetServer = await self.__fetch_server_for_id(package.name)
+            # Note: If you're wondering where caching is at, it's on in the client
+            timeline = await self.__get_timeline(nuget_server, package.name) if nuget_server else None
+        feed = urlparse(nuget_server.index_url).netloc if nuget_server else ''
+        self._lookups.labels(feed, 'mirror' if mirrored else 'found' if nuget_server else 'not_found').inc()
         if nuget_server:
-            registrations_index = await nuget_server.registrations.index(package.name) # will already be cached
-            package.source =  registrations_index.url            
-            await self.__fetch_and_populate_version(registrations_index, package)
-            await self.__fetch_and_populate_latest_release(registrations_index, package)
-            await self.__fetch_and_populate_latest_version(registrations_index, package)
-            package.available_version_count = self.__get_available_package_count(registrations_index)
+            package.source = timeline.url
+            if self.include_dates:
+                with span('version dates', 'nuget', package=package.name, version=package.version):
+                    await timeline.load_latest_dates()
+                    if package.version:
+                        package.version_date = await timeline.get_version_date(package.version)
+            package.latest_release = timeline.latest_release
+            package.latest_release_date = timeline.latest_release_date
+            package.latest_version = timeline.latest_version
+            package.latest_version_date = timeline.latest_version_date
+            package.available_version_count = timeline.count
             if package.version and package.latest_release:                
-                version_diff = version_util.get_version_count_behind(package.version, package.latest_release)
+                version_diff = version_util.get_version_count_behind(NuGetVersion.parse(package.version), NuGetVersion.parse(package.latest_release))
                 package.major_releases_behind = version_diff[VersionPart.MAJOR]
                 package.minor_releases_behind = version_diff[VersionPart.MINOR]
                 package.patch_releases_behind = version_diff[VersionPart.PATCH]
@@ -77,56 +131,78 @@ class Nuget:
         else:
             logging.warn(f'Could not find {package.name} in any of the configured nuget servers.')
 
+    async def get_registration_validators(self, package_id: str) -> Optional[dict]:
+        """
+        Returns the http cache validators (etag/last_modified) of the flat container version list (or the registration
+        index if the server doesn't have one) for :param package_id on the server that houses it. This can be used to
+        tell whether previously fetched details are still current.
+        Returns None if the package can't be found, is answered by the catalog mirror or the client doesn't have an
+        http cache.
+        """
+        if await self.__get_mirrored_timeline(package_id):
+            return None
+        nuget_server = await self.__fetch_server_for_id(package_id)
+        if nuget_server:
+            return self._client.get_validators(nuget_server.versions_url(package_id) or nuget_server.registrations.index_url(package_id))
+
+    async def invalidate_package(self, package_id: str) -> None:
+        """
+        Forgets the registration timeline of :param package_id on every server, along with the flat container and
+        registration index responses it was built from, so that a failed lookup can be tried again from scratch instead
+        of being answered by the same (failed or corrupt) cache entries. Nothing cached for other packages is touched.
+        """
+        for nuget_server in await self.__get_clients():
+            url = nuget_server.registrations.index_url(package_id)
+            self._timelines.pop(url, None)
+            self._client.invalidate(url)
+            versions_url = nuget_server.versions_url(package_id)
+            if versions_url:
+                self._client.invalidate(versions_url)
+
     async def __fetch_server_for_id(self, id: str) -> NugetServer:
         """
         Returns the first :type nuget.NugetServer that houses the provided :param id.
-        The strategy is to first search for package registrations at nuget.org and then 
-        to cycle through any :param configs that have been provided.    
-        :param configs: A :class:dict  that contains non-nuget.org server implementations to query
-        :param id: A :class:dict  that contains non-nuget.org server implementations to query
+        The servers are probed concurrently, but nuget.org takes priority over the configured servers, which take
+        priority in the order they were configured. See :class FeedResolver.
+        """
+        return await self._resolver.resolve(id, await self.__get_clients())
+
+    async def __get_mirrored_timeline(self, package_id: str) -> Optional[Tuple[NugetServer, RegistrationTimeline]]:
+        """
+        Looks :param package_id up in the catalog mirror, in server priority order. Returns None if the mirror can't
+        answer: either there isn't one, or a server that takes priority over the one with the package isn't mirrored.
         """
-        ## TODO: Allow for preferred ordering in some cases? You may have a convention or some other means that allows you to know exactly which server to query.
-        for c in await self.__get_clients():
-            index = await c.registrations.index(id)                
-            if index:
-                return c        
-
-    # TODO: Potentially optimize these
-    async def __fetch_and_populate_version(self, registrationsIndex: RegistrationsIndex, package: Package):
-        if registrationsIndex and package.version:
-            for page in registrationsIndex.items:                            
-                if not version_util.is_newer_release(page.upper, package.version):
-                    for leaf in await page.items():
-                        if leaf.catalogEntry.version == package.version and leaf.commitTimeStamp:
-                            package.version_date = date_util.get_date_from_iso_string(leaf.commitTimeStamp).strftime('%Y-%m-%d')
-                            return
-
-    async def __fetch_and_populate_latest_version(self, registrationsIndex: RegistrationsIndex, package: Package):
-        # current version metadata
-        if registrationsIndex:
-            # assuming the newest is aways at the end of the list
-            for page in reversed(registrationsIndex.items):                                
-                for leaf in reversed(await page.items()):                    
-                    package.latest_version = leaf.catalogEntry.version
-                    if leaf.commitTimeStamp:
-                        package.latest_version_date = date_util.get_date_from_iso_string(leaf.commitTimeStamp).strftime('%Y-%m-%d')
-                    return                         
-
-    async def __fetch_and_populate_latest_release(self, registrationsIndex: RegistrationsIndex, package: Package):
-        # current version metadata
-        if registrationsIndex:
-            # assuming the newest is aways at the end of the list
-            for page in reversed(registrationsIndex.items):                                
-                for leaf in reversed(await page.items()):
-                    if version_util.is_full_release(leaf.catalogEntry.version):
-                        package.latest_release = leaf.catalogEntry.version 
-                        if leaf.commitTimeStamp:
-                            package.latest_release_date = date_util.get_date_from_iso_string(leaf.commitTimeStamp).strftime('%Y-%m-%d')
-                        return
-
-    def __get_available_package_count(self, registrationsIndex: RegistrationsIndex) -> int:
-        count = 0
-        if registrationsIndex:         
-            for page in registrationsIndex.items:
-                count += page.count 
-        return count
+        if not self._mirror:
+            return None
+        for nuget_server in await self.__get_clients():
+            versions = self._mirror.get_versions(nuget_server.index_url, package_id)
+            if versions is None:
+                return None
+            if versions:
+                url = nuget_server.registrations.index_url(package_id)
+                return nuget_server, RegistrationTimeline.from_dates(url, versions)
+        return None
+
+    async def __get_timeline(self, nuget_server: NugetServer, package_id: str) -> RegistrationTimeline:
+        """ Returns the (memoized) :class RegistrationTimeline shared by every package with the same registration index. """
+        url = nuget_server.registrations.index_url(package_id)
+        task = self._timelines.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self.__create_timeline(nuget_server, package_id))
+            self._timelines[url] = task
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            if self._timelines.get(url) is task:
+                del self._timelines[url] # let the next package with this id try again
+            raise
+
+    async def __create_timeline(self, nuget_server: NugetServer, package_id: str) -> RegistrationTimeline:
+        with span('timeline', 'nuget', feed=nuget_server.index_url, package=package_id):
+            # The flat container lists every version in one small document. Registrations are only needed for dates.
+            # (When dates are included, the flat container isn't used and this falls through to the registration index.)
+            versions = await nuget_server.versions(package_id)
+            if versions:
+                url = nuget_server.registrations.index_url(package_id)
+                return RegistrationTimeline.from_versions(url, versions, lambda: nuget_server.registrations.index(package_id))
+            return await RegistrationTimeline.create(await nuget_server.registrations.index(package_id))
@@ -1,5 +1,7 @@
+import io
 import logging
-from typing import List
+import re
+from typing import Iterator, List, Union
 
 from lxml import etree
 
@@ -7,6 +9,13 @@ class Package:
     """
     Class for accessing nuget package metadata.
     """
+    # Fields that are populated from a nuget server (as opposed to the package reference itself)
+    DETAIL_FIELDS = (
+        'version_date', 'latest_release', 'latest_release_date', 'latest_version', 'latest_version_date',
+        'major_releases_behind', 'minor_releases_behind', 'patch_releases_behind', 'available_version_count',
+        'source', 'details_url'
+    )
+
     def __init__(self, name: str, version: str = "", target_framework: str = ""):
         assert isinstance(name, str)        
         self.name = name
@@ -23,7 +32,31 @@ class Package:
         self.available_version_count = 0
         self.source = ""
         self.details_url = ""
+        # How the details lookup went: ok, not_found, retried (ok after a retry) or why it failed (see FailureKind)
+        self.status = ""
     
+    def copy_details(self, other: 'Package'):
+        """
+        Copies the details fetched from a nuget server for :param other onto this package.
+        Useful for fanning out details that were fetched once for many references to the same package and version.
+        """
+        for field in self.DETAIL_FIELDS:
+            setattr(self, field, getattr(other, field))
+
+    def get_details(self) -> dict:
+        """ Returns the fields populated from a nuget server as a (json serializable) dict. """
+        return {field: getattr(self, field) for field in self.DETAIL_FIELDS}
+
+    def set_details(self, details: dict):
+        for field in self.DETAIL_FIELDS:
+            if field in details:
+                setattr(self, field, details[field])
+
+    @property
+    def lookup_key(self) -> tuple:
+        """ Key identifying the nuget server details for this package. Package ids are case-insensitive. """
+        return (self.name.lower(), self.version)
+
     def set_details_url(self, template_uri: str):
         if template_uri:
             self.details_url = template_uri.replace('{id}',str.lower(self.name)).replace('{version}', self.version)
@@ -39,14 +72,26 @@ class PackageContainer:
     Base class for  a nuget package configuraion. Implementation of package parsing from the file contents
     is left up to the inheriting class.
     """
-    def __init__(self, contents: str, name: str = '', repo = '', path = ''):
+    def __init__(self, contents: Union[str, bytes], name: str = '', repo = '', path = ''):
         assert contents is not None, ':param contents cannot be empty.'
         logging.debug(f'PackageContainer ctor() Repo: {repo} Path: {path}')
         self.name = name
         self.repo = repo   
         self.path = path        
+        self.sha = None # git blob sha of the contents, if known
         self.packages = self._load_packages(contents)
 
+    @classmethod
+    def from_packages(cls, packages: List[Package], name: str = '', repo = '', path = '', sha = None):
+        """ Creates a container from packages that were parsed previously without parsing any contents. """
+        container = cls.__new__(cls)
+        container.name = name
+        container.repo = repo
+        container.path = path
+        container.sha = sha
+        container.packages = packages
+        return container
+
     def _load_packages(self, contents: str) -> List[Package]:
         return []
 
@@ -58,12 +103,8 @@ class PackageConfig(PackageContainer):
         super().__init__(contents, name, repo, path)
     
     def _load_packages(self, contents) -> List[Package]:
-        root = etree.fromstring(_strip_declaration(contents))
-        elements = root.findall(".//package")        
-        packages = []      
-        for element in elements:
-            packages.append(Package(element.get("id"), element.get("version"), element.get("targetFramework")))
-        return packages       
+        return [Package(element.get("id"), element.get("version"), element.get("targetFramework"))
+                for element in _iter_elements(contents, "package")]
 
 class NetCoreProject(PackageContainer):
     """
@@ -73,26 +114,49 @@ class NetCoreProject(PackageContainer):
         super().__init__(contents, name, repo, path)
 
     def _load_packages(self, contents) -> List[Package]: 
-        root = etree.fromstring(_strip_declaration(contents))
-        elements = root.findall(".//PackageReference")
-        packages = []      
-        for element in elements:            
-            packages.append(Package(element.get("Include"),element.get("Version")))
-        return packages     
+        return [Package(element.get("Include"), element.get("Version"))
+                for element in _iter_elements(contents, "PackageReference")]
 
-def _strip_declaration(contents: str):
-    """ Strips declaration from the file if there - lxml doesn't like it."""
-    return str.replace(contents,r'<?xml version="1.0" encoding="utf-8"?>','').strip()
+_LEADING_SPACE = re.compile(r'\s*')
+_LEADING_SPACE_BYTES = re.compile(rb'\s*')
+
+class _Utf8Reader:
+    """ Read-only file object over a str that encodes it to utf-8 a chunk at a time, as the parser asks for it. """
+    def __init__(self, text: str, start: int = 0):
+        self.__text = text
+        self.__position = start
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self.__text) if size is None or size < 0 else self.__position + size
+        chunk = self.__text[self.__position:end]
+        self.__position = end
+        return chunk.encode('utf-8')
+
+def _iter_elements(contents: Union[str, bytes], tag: str) -> Iterator[etree._Element]:
+    """
+    Incrementally parses :param contents and yields every :param tag element (with its attributes) as soon as it has
+    been read. Each one is cleared once the caller is done with it, so the tree doesn't hold on to their contents.
+    lxml refuses str input that has an encoding declaration, so str is fed to the parser as utf-8 a chunk at a time.
+    Bytes (e.g. straight from an archive) are parsed as they are. Neither is copied.
+    """
+    # an xml declaration is only allowed at the very start of the document, so leading whitespace is skipped
+    if isinstance(contents, str):
+        source = _Utf8Reader(contents, _LEADING_SPACE.match(contents).end())
+    else:
+        source = io.BytesIO(contents) # shares the buffer of the bytes until written to
+        source.seek(_LEADING_SPACE_BYTES.match(contents).end())
+    for _, element in etree.iterparse(source, events=('end',), tag=tag, remove_comments=True):
+        yield element
+        element.clear(keep_tail=True)
 
 class NugetConfig:
     """
     A class to load and access nuget server source url configurations from a nuget.config file.
     """
-    def __init__(self, contents: str): 
+    def __init__(self, contents: Union[str, bytes]): 
         assert contents is not None
-        stripped = _strip_declaration(contents)        
-        root = etree.fromstring(stripped)
-        elements = root.findall(".//packageSources/add")
         self.indexes = {}        
-        for element in elements:
-            self.indexes[element.get("key")] = element.get("value")
+        for element in _iter_elements(contents, "add"):
+            parent = element.getparent()
+            if parent is not None and parent.tag == "packageSources":
+                self.indexes[element.get("key")] = element.get("value")
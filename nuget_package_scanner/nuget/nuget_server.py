@@ -1,6 +1,8 @@
 import logging
+from typing import List, Optional
 
 from .registrations import Registrations
+from ..response_cache import CacheNamespace
 from ..smart_client import SmartClient
 
 class NugetServer:
@@ -17,25 +19,67 @@ class NugetServer:
         pass      
     
     @classmethod
-    async def create(cls, client: SmartClient, service_index_url = DEFAULT_SERVICE_INDEX_URL):
+    async def create(cls, client: SmartClient, service_index_url = DEFAULT_SERVICE_INDEX_URL,
+                     use_flat_container: bool = True):
         """
         The constructor for the Nuget class. This creates and initialize the root 
         object for accessing the API. This method will make a call out to the Nuget 
         Service index to fetch the list of resources and that are available on the 
         API and the urls used to access them.
+        If :param use_flat_container is False, packages are always looked up with the registration index, even if the
+        server has a flat container. This saves a request per package when the registrations are needed anyway.
         """    
         self = NugetServer()
         self.__client: SmartClient = client
+        self.use_flat_container = use_flat_container
         logging.info(f'Initializing Nuget Server API @ { service_index_url }')
         await self.__fetch_base_urls(service_index_url)
         return self
         
     async def __fetch_base_urls(self, service_index_url):  
         self.index_url = service_index_url
-        json = await self.__client.get_as_json(service_index_url)                   
+        json = await self.__client.get_as_json(service_index_url, namespace=CacheNamespace.SERVICE_INDEX)                   
         self.registrations = Registrations(json, self.__client)
         self.package_uri_template = self.__get_package_uri_template(json)
-        
+        self.package_base_address = self.__get_package_base_address(json)
+        self.catalog_url = self.__get_resource_url(json, "Catalog/3.0.0")
+
+    def versions_url(self, package_id: str) -> Optional[str]:
+        """
+        Returns the flat container url that lists every version of :param package_id, if the server has one (and it
+        is used).
+        """
+        if self.package_base_address and self.use_flat_container:
+            return f'{self.package_base_address}{package_id.lower()}/index.json'
+
+    async def versions(self, package_id: str) -> Optional[List[str]]:
+        """
+        Returns every version of :param package_id (lower case, normalized) from the flat container.
+        This is a single, small request no matter how many versions there are.
+        Returns None if the server doesn't have a flat container or the package isn't on it.
+        https://docs.microsoft.com/en-us/nuget/api/package-base-address-resource#enumerate-package-versions
+        """
+        url = self.versions_url(package_id)
+        if url:
+            json = await self.__client.get_as_json(url, namespace=CacheNamespace.FLAT_CONTAINER)
+            if json:
+                return json.get("versions")
+
+    async def has_package(self, package_id: str) -> bool:
+        """ True if :param package_id is on this server. Uses the flat container when possible since it's much smaller. """
+        if self.versions_url(package_id):
+            return bool(await self.versions(package_id))
+        return bool(await self.registrations.index(package_id))
+
+    def __get_package_base_address(self, service_index_json: dict) -> Optional[str]:
+        base = self.__get_resource_url(service_index_json, "PackageBaseAddress/3.0.0")
+        if base:
+            return base if base.endswith('/') else base + '/'
+
+    def __get_resource_url(self, service_index_json: dict, resource_type: str) -> Optional[str]:
+        for resource in service_index_json.get("resources", []):
+            if resource.get("@type") == resource_type:
+                return resource["@id"]
 
     def __get_package_uri_template(self, service_index_json: dict) -> str:
         assert isinstance(service_index_json, dict), ":param service_index_json cannot be None"
@@ -0,0 +1,112 @@
+import functools
+import re
+from typing import Optional, Tuple, Union
+
+"""
+Modified Semver 2.0 spec Regex https://semver.org/
+Template: <major>.<minor>.<patch>.<build>-<prerelease>+<buildmetadata>
+How they differ from spec:    
+    major: required (no changes)
+    minor: optional (required in spec)
+    patch: optional (required in spec)
+    build: optional (not allowed in spec)
+    prerelease: optional (no changes)
+    buildmetadata: optional (no changes)
+
+    * All version parts allow leading zeroes (not allowed in spec)
+
+Note: As indicated above, this is not strict Semver 2.0. Nuget advertises using Semver but is not strict in it's application
+"""
+#SERMVER_2_0_WITH_BUILD_PATTERN = r'^(?P<major>0|[1-9]\d*)(?:\.(?P<minor>0|[1-9]\d*))?(?:\.(?P<patch>0|[1-9]\d*))?(?:\.(?P<build>0|[1-9]\d*))?(?:-(?P<prerelease>(?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*))*))?(?:\+(?P<buildmetadata>[0-9a-zA-Z-]+(?:\.[0-9a-zA-Z-]+)*))?$'
+SERMVER_2_0_WITH_BUILD_PATTERN = r'^(?P<major>[0-9]\d*)(?:\.(?P<minor>[0-9]\d*))?(?:\.(?P<patch>[0-9]\d*))?(?:\.(?P<build>[0-9]\d*))?(?:-(?P<prerelease>(?:[0-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*))*))?(?:\+(?P<buildmetadata>[0-9a-zA-Z-]+(?:\.[0-9a-zA-Z-]+)*))?$'
+pattern = re.compile(SERMVER_2_0_WITH_BUILD_PATTERN)
+
+PARSE_CACHE_SIZE = 64 * 1024
+
+
+@functools.total_ordering
+class NuGetVersion:
+    """
+    An immutable, parsed Nuget package version. Versions are parsed once (see :meth parse) and then compared with plain
+    tuple comparisons.
+
+    Ordering follows Nuget's rules https://docs.microsoft.com/en-us/nuget/concepts/package-versioning#version-precedence
+        - major, minor, patch and revision are compared numerically (missing parts are 0)
+        - a prerelease version is lower than the matching release version
+        - prerelease labels are compared part by part: numeric parts numerically, alphanumeric parts case-insensitively,
+          and numeric parts are lower than alphanumeric parts. If all parts are equal, more parts is higher.
+        - build metadata is ignored
+    """
+    __slots__ = ('original', 'major', 'minor', 'patch', 'revision', 'release_labels', 'metadata', '_key')
+
+    def __init__(self, major: int, minor: int = 0, patch: int = 0, revision: int = 0,
+                 release_labels: Tuple[str, ...] = (), metadata: Optional[str] = None, original: Optional[str] = None):
+        self.major = major
+        self.minor = minor
+        self.patch = patch
+        self.revision = revision
+        self.release_labels = release_labels
+        self.metadata = metadata
+        self.original = original if original is not None else str(self)
+        self._key = (major, minor, patch, revision, self.__release_key(release_labels))
+
+    @staticmethod
+    def __release_key(release_labels: Tuple[str, ...]) -> tuple:
+        if not release_labels:
+            return (1,) # releases sort after every prerelease
+        return (0, tuple((0, int(l), '') if l.isdigit() else (1, 0, l.lower()) for l in release_labels))
+
+    @classmethod
+    def parse(cls, version: str) -> 'NuGetVersion':
+        """
+        Returns the parsed :param version. Parsed versions are cached, so parsing the same string again is a dict lookup.
+        """
+        return _parse(version)
+
+    @property
+    def is_prerelease(self) -> bool:
+        return bool(self.release_labels)
+
+    @property
+    def is_full_release(self) -> bool:
+        """ True for versions without a prerelease label or build metadata. """
+        return not self.release_labels and not self.metadata
+
+    def __eq__(self, other):
+        if not isinstance(other, NuGetVersion):
+            return NotImplemented
+        return self._key == other._key
+
+    def __lt__(self, other):
+        if not isinstance(other, NuGetVersion):
+            return NotImplemented
+        return self._key < other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __str__(self):
+        version = f'{self.major}.{self.minor}.{self.patch}'
+        if self.revision:
+            version += f'.{self.revision}'
+        if self.release_labels:
+            version += '-' + '.'.join(self.release_labels)
+        if self.metadata:
+            version += '+' + self.metadata
+        return version
+
+    def __repr__(self):
+        return f'NuGetVersion({self.original!r})'
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(version: str) -> NuGetVersion:
+    match: re.Match = pattern.match(version)
+    assert match, f':param version [{version}] is not a valid version.'
+    major, minor, patch, build, prerelease, metadata = match.groups()
+    return NuGetVersion(int(major), int(minor or 0), int(patch or 0), int(build or 0),
+                        tuple(prerelease.split('.')) if prerelease else (), metadata, version)
+
+
+def as_version(version: Union[str, NuGetVersion]) -> NuGetVersion:
+    return version if isinstance(version, NuGetVersion) else _parse(version)
@@ -0,0 +1,150 @@
+import asyncio
+import bisect
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from . import date_util
+from .nuget_version import NuGetVersion
+from .registrations import RegistrationPage, RegistrationsIndex
+
+
+class PageTimeline:
+    """ The versions of a single registration page, sorted by version, with their publish dates (YYYY-MM-DD). """
+    __slots__ = ('versions', 'dates')
+
+    def __init__(self, entries: List[Tuple[NuGetVersion, Optional[str]]]):
+        entries.sort(key=lambda e: e[0])
+        self.versions: List[NuGetVersion] = [v for v, _ in entries]
+        self.dates: List[Optional[str]] = [d for _, d in entries]
+
+    def date_of(self, version: NuGetVersion) -> Optional[str]:
+        i = bisect.bisect_left(self.versions, version)
+        if i < len(self.versions) and self.versions[i] == version:
+            return self.dates[i]
+        return None
+
+
+class RegistrationTimeline:
+    """
+    Everything the scanner needs to know about a package id, computed once from its :class RegistrationsIndex:
+    the latest version and release (with their dates), the number of available versions and a version -> publish
+    date lookup.
+
+    Pages are loaded lazily and at most once: the latest version/release only needs the newest page(s) and a version
+    lookup only needs the page that can contain it (see :meth RegistrationsIndex.find_page). Pages that are needed at
+    the same time are fetched concurrently. Build instances with :meth create.
+
+    When the server has a flat container, use :meth from_versions instead: the version list answers the latest
+    version/release and count on its own, and the registration index is only fetched if a date is asked for.
+    If every version and date is already known (e.g. from a :class CatalogMirror), use :meth from_dates.
+    """
+    def __init__(self, url: str, count: int = 0):
+        self.url = url
+        self.count = count
+        self.latest_version: Optional[str] = None
+        self.latest_version_date: Optional[str] = None
+        self.latest_release: Optional[str] = None
+        self.latest_release_date: Optional[str] = None
+        self.__index: Optional[RegistrationsIndex] = None
+        self.__index_loader: Optional[Callable[[], Awaitable[Optional[RegistrationsIndex]]]] = None
+        self.__index_task: Optional[asyncio.Future] = None
+        self.__pages: Dict[int, asyncio.Task] = {}
+        self.__dates: Optional[PageTimeline] = None
+
+    @classmethod
+    async def create(cls, index: RegistrationsIndex) -> 'RegistrationTimeline':
+        timeline = cls(index.url, sum(p.count for p in index.items))
+        timeline.__index = index
+        await timeline.__load_latest()
+        return timeline
+
+    @classmethod
+    def from_versions(cls, url: str, versions: List[str],
+                      index_loader: Callable[[], Awaitable[Optional[RegistrationsIndex]]]) -> 'RegistrationTimeline':
+        """
+        :param url The registration index url for the package.
+        :param versions Every version of the package (e.g. from the flat container).
+        :param index_loader Fetches the registration index. Only called the first time a date is needed.
+        """
+        timeline = cls(url, len(versions))
+        timeline.__index_loader = index_loader
+        parsed = sorted(NuGetVersion.parse(v) for v in versions)
+        if parsed:
+            timeline.latest_version = parsed[-1].original
+        releases = [v for v in parsed if v.is_full_release]
+        if releases:
+            timeline.latest_release = releases[-1].original
+        return timeline
+
+    @classmethod
+    def from_dates(cls, url: str, entries: List[Tuple[str, Optional[str]]]) -> 'RegistrationTimeline':
+        """ Builds a timeline from (version, date) pairs that are already known (e.g. from a :class CatalogMirror). """
+        timeline = cls(url, len(entries))
+        timeline.__dates = PageTimeline([(NuGetVersion.parse(v), d) for v, d in entries])
+        timeline.__set_latest([timeline.__dates])
+        return timeline
+
+    async def load_latest_dates(self) -> None:
+        """ Fills in the latest version/release dates if they weren't already (only needed after :meth from_versions). """
+        if self.latest_version and self.latest_version_date is None:
+            self.latest_version_date = await self.get_version_date(self.latest_version)
+        if self.latest_release and self.latest_release_date is None:
+            self.latest_release_date = await self.get_version_date(self.latest_release)
+
+    async def get_version_date(self, version: str) -> Optional[str]:
+        """ Returns the publish date of :param version or None if it isn't in the index. """
+        version = NuGetVersion.parse(version)
+        if self.__dates is not None:
+            return self.__dates.date_of(version)
+        index = await self.__get_index()
+        page = index.find_page(version) if index else None
+        if page is None:
+            return None
+        timeline = await self.__page(index.items.index(page))
+        return timeline.date_of(version)
+
+    async def __get_index(self) -> Optional[RegistrationsIndex]:
+        if self.__index is None and self.__index_loader:
+            if self.__index_task is None:
+                self.__index_task = asyncio.ensure_future(self.__index_loader())
+            self.__index = await asyncio.shield(self.__index_task)
+        return self.__index
+
+    async def __load_latest(self) -> None:
+        pages = self.__index.items
+        if not pages:
+            return
+        # The newest page almost always holds a release as well. Otherwise, load the rest of the pages at once.
+        newest = await self.__page(len(pages) - 1)
+        timelines = [newest]
+        if not self.__set_latest(timelines) and len(pages) > 1:
+            timelines = await asyncio.gather(*[self.__page(i) for i in range(len(pages))])
+            self.__set_latest(timelines)
+
+    def __set_latest(self, timelines: List[PageTimeline]) -> bool:
+        """ Sets the latest fields from :param timelines (ordered oldest to newest). Returns True if a release was found. """
+        for t in reversed(timelines):
+            if t.versions and self.latest_version is None:
+                self.latest_version = t.versions[-1].original
+                self.latest_version_date = t.dates[-1]
+            for v, d in zip(reversed(t.versions), reversed(t.dates)):
+                if v.is_full_release:
+                    self.latest_release = v.original
+                    self.latest_release_date = d
+                    return True
+        return False
+
+    def __page(self, i: int) -> asyncio.Task:
+        """ Returns the (shared) task that loads page :param i. """
+        task = self.__pages.get(i)
+        if task is None:
+            task = asyncio.ensure_future(self.__load_page(self.__index.items[i]))
+            self.__pages[i] = task
+        return task
+
+    @staticmethod
+    async def __load_page(page: RegistrationPage) -> PageTimeline:
+        entries = []
+        for leaf in await page.items():
+            date = date_util.get_date_from_iso_string(leaf.commitTimeStamp).strftime('%Y-%m-%d') if leaf.commitTimeStamp else None
+            entries.append((NuGetVersion.parse(leaf.version), date))
+        return PageTimeline(entries)
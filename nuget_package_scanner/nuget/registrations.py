@@ -1,42 +1,46 @@
+import bisect
 import logging
-from typing import List, Union
+from typing import List, Optional, Union
 
+from ..response_cache import CacheNamespace
 from ..smart_client import SmartClient
+from ..tracing import span
 
+from .nuget_version import NuGetVersion, as_version
 from .registrations_version import (RegistrationsVersion,
                                     RegistrationsVersionConfig)
 
 
 class CatalogEntry:
+    """
+    The catalog entry fields that survive the registration projection (see :const json_projection.REGISTRATION_KEYS).
+    The rest of the catalog entry (description, tags, dependency groups etc.) is dropped while decoding.
+    """
+    __slots__ = ('url', 'id', 'version', 'listed', 'published')
+
     def __init__(self, json):
         self.url: str = json["@id"]
         self.id: str = json["id"]
         self.version: str = json["version"]
-        
-        self.authors: Union[str, List[str]] = json.get("authors")       
-        self.depracation = json.get("deprecation")
-        self.description: str = json.get("description")
-        self.licenseUrl: str = json.get("licenseUrl")
-        self.licenseExpression: str = json.get("licenseExpression")
         self.listed: bool = json.get("listed")
-        self.minClientVersion: str = json.get("minClientVersion")
-        self.projectUrl: str = json.get("projectUrl")
         self.published: str = json.get("published")
-        self.requireLicenseAcceptance: bool = json.get("requireLicenseAcceptance")
-        self.summary: str = json.get("summary")
-        self.tags: Union[str, List[str]] = json.get("tags")
-        self.title: str = json.get("title")
-
-        self.dependencyGroups = json.get("dependencyGroups")        
 
 class RegistrationLeaf:    
+    """
+    The catalog entry is copied into a :class CatalogEntry when the leaf is built, so the decoded json isn't kept.
+    """
+    __slots__ = ('url', 'packageContent', 'version', 'commitTimeStamp', 'catalogEntry')
+
     def __init__(self, json):
         self.url: str = json["@id"]
         self.packageContent: str = json["@id"]
-        self.catalogEntry = CatalogEntry(json["catalogEntry"])
+        self.catalogEntry: CatalogEntry = CatalogEntry(json["catalogEntry"])
+        self.version: str = self.catalogEntry.version
         self.commitTimeStamp: str = json.get("commitTimeStamp")
 
 class RegistrationPage:    
+    __slots__ = ('url', 'count', 'lower', 'parent', 'upper', 'commitTimeStamp', '__items', '__client')
+
     def __init__(self, json, client: SmartClient):        
         self.url: str = json["@id"]
         self.count: int = json["count"]
@@ -52,7 +56,8 @@ class RegistrationPage:
         Gets or fetches every RegistrationLeaf for this page. This will require a Server API call to self.url if the items were not included originally.
         """
         if not self.__items:
-            json = await self.__client.get_as_json(self.url)
+            with span('registration page fetch', 'nuget', url=self.url):
+                json = await self.__client.get_as_registration_json(self.url, namespace=CacheNamespace.REGISTRATION_PAGE)
             if json:
                 self.__set_items(json)            
         
@@ -79,6 +84,20 @@ class RegistrationsIndex:
         self.commitTimeStamp: str = json.get("commitTimeStamp")
         for i in json["items"]:
             self.items.append(RegistrationPage(i, client))        
+        self.__uppers: Optional[List[NuGetVersion]] = None
+
+    def find_page(self, version: Union[str, NuGetVersion]) -> Optional[RegistrationPage]:
+        """
+        Returns the only page whose lower/upper range can contain :param version, or None if no page can.
+        Pages are ordered by version, so this is a binary search over the page bounds and doesn't fetch any page items.
+        """
+        version = as_version(version)
+        if self.__uppers is None:
+            self.__uppers = [NuGetVersion.parse(p.upper) for p in self.items]
+        i = bisect.bisect_left(self.__uppers, version)
+        if i < len(self.items) and NuGetVersion.parse(self.items[i].lower) <= version:
+            return self.items[i]
+        return None
 
 class Registrations:
     """
@@ -95,10 +114,14 @@ class Registrations:
         assert isinstance(client, SmartClient)
         self.__client = client
     
-    async def index(self, package_id: str, service_version: RegistrationsVersion = RegistrationsVersion.RELEASE) -> RegistrationsIndex:
+    def index_url(self, package_id: str, service_version: RegistrationsVersion = RegistrationsVersion.RELEASE) -> str:
         assert isinstance(package_id, str), ":param package_id must be a str"
-        url = f'{self._version_config.get_base_url(service_version)}{package_id.lower()}/index.json'
-        json = await self.__client.get_as_json(url)
+        return f'{self._version_config.get_base_url(service_version)}{package_id.lower()}/index.json'
+
+    async def index(self, package_id: str, service_version: RegistrationsVersion = RegistrationsVersion.RELEASE) -> RegistrationsIndex:
+        url = self.index_url(package_id, service_version)
+        with span('registration index fetch', 'nuget', url=url):
+            json = await self.__client.get_as_registration_json(url, namespace=CacheNamespace.REGISTRATION_INDEX)
         if json:                        
             return RegistrationsIndex(json, url, self.__client)        
         return
@@ -1,24 +1,13 @@
 import re
 from enum import Enum
+from typing import Union
 
-"""
-Modified Semver 2.0 spec Regex https://semver.org/
-Template: <major>.<minor>.<patch>.<build>-<prerelease>+<buildmetadata>
-How they differ from spec:    
-    major: required (no changes)
-    minor: optional (required in spec)
-    patch: optional (required in spec)
-    build: optional (not allowed in spec)
-    prerelease: optional (no changes)
-    buildmetadata: optional (no changes)
-
-    * All version parts allow leading zeroes (not allowed in spec)
+from .nuget_version import NuGetVersion, as_version, pattern
 
-Note: As indicated above, this is not strict Semver 2.0. Nuget advertises using Semver but is not strict in it's application
 """
-#SERMVER_2_0_WITH_BUILD_PATTERN = r'^(?P<major>0|[1-9]\d*)(?:\.(?P<minor>0|[1-9]\d*))?(?:\.(?P<patch>0|[1-9]\d*))?(?:\.(?P<build>0|[1-9]\d*))?(?:-(?P<prerelease>(?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*))*))?(?:\+(?P<buildmetadata>[0-9a-zA-Z-]+(?:\.[0-9a-zA-Z-]+)*))?$'
-SERMVER_2_0_WITH_BUILD_PATTERN = r'^(?P<major>[0-9]\d*)(?:\.(?P<minor>[0-9]\d*))?(?:\.(?P<patch>[0-9]\d*))?(?:\.(?P<build>[0-9]\d*))?(?:-(?P<prerelease>(?:[0-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*))*))?(?:\+(?P<buildmetadata>[0-9a-zA-Z-]+(?:\.[0-9a-zA-Z-]+)*))?$'
-pattern = re.compile(SERMVER_2_0_WITH_BUILD_PATTERN)
+String based helpers kept for compatibility. They are implemented on top of :class NuGetVersion, so each distinct
+version string is only run through the regex once.
+"""
 
 class VersionPart(Enum):
     MAJOR = "major"
@@ -28,59 +17,22 @@ class VersionPart(Enum):
     PRERELEASE = "prerelease"
     BUILDMETADATA = "buildmetadata"
 
-def is_full_release(version: str) -> bool:
-    match = pattern.match(version)
-    assert match, f':param version [{version}] is not a valid version.'
-    return False if match.group(VersionPart.PRERELEASE.value) or \
-        match.group(VersionPart.BUILDMETADATA.value) else True
-
-def is_newer_release(version: str, compare: str) -> bool:
-    v_match = pattern.match(version)
-    assert v_match, f':param version [{version}] is not a valid version.'
-    c_match = pattern.match(compare)
-    assert c_match, f':param compare [{compare}] is not a valid version.'
-
-    major = get_version_part(v_match, VersionPart.MAJOR)
-    major_compare = get_version_part(c_match, VersionPart.MAJOR)
-    if major_compare > major:
-        return True
-    if major_compare < major:
-        return False
+def is_full_release(version: Union[str, NuGetVersion]) -> bool:
+    return as_version(version).is_full_release
 
-    minor = get_version_part(v_match, VersionPart.MINOR)
-    minor_compare = get_version_part(c_match, VersionPart.MINOR)
-    if minor_compare > minor:
-        return True
-    if minor_compare < minor:
-        return False
-
-    patch = get_version_part(v_match, VersionPart.PATCH)
-    patch_compare = get_version_part(c_match, VersionPart.PATCH)
-    if patch_compare > patch:
-        return True
-    if patch_compare < patch:
-        return False
-
-    build = get_version_part(v_match, VersionPart.BUILD)
-    build_compare = get_version_part(c_match, VersionPart.BUILD)
-    if build_compare > build:
-        return True
-    if build_compare < build:
-        return False
-    
-    return False # Equal versions
+def is_newer_release(version: Union[str, NuGetVersion], compare: Union[str, NuGetVersion]) -> bool:
+    """Returns True if :param compare has a higher precedence than :param version"""
+    return as_version(compare) > as_version(version)
 
 def get_version_part(match: re.Match, version_part: VersionPart) -> int:
     """Returns the matched version part or the default value provided"""
     value = match.group(version_part.value)
     return int(value) if value else 0
 
-def get_version_count_behind(version: str, compare: str) -> dict:
+def get_version_count_behind(version: Union[str, NuGetVersion], compare: Union[str, NuGetVersion]) -> dict:
     """Returns a dict of VersionPart keys with the values set to count behind"""
-    v_match = pattern.match(version)
-    assert v_match, f':param version [{version}] is not a valid version.'
-    c_match = pattern.match(compare)
-    assert c_match, f':param compare [{compare}] is not a valid version.'
+    v = as_version(version)
+    c = as_version(compare)
 
     result = {
         VersionPart.MAJOR: 0,
@@ -88,17 +40,11 @@ def get_version_count_behind(version: str, compare: str) -> dict:
         VersionPart.PATCH: 0
     }
 
-    result[VersionPart.MAJOR] = get_version_part_count_behind(v_match, c_match, VersionPart.MAJOR)
+    result[VersionPart.MAJOR] = c.major - v.major
     if result[VersionPart.MAJOR] == 0:
-        result[VersionPart.MINOR] = get_version_part_count_behind(v_match, c_match, VersionPart.MINOR)
+        result[VersionPart.MINOR] = c.minor - v.minor
         if result[VersionPart.MINOR] == 0:
-            result[VersionPart.PATCH] = get_version_part_count_behind(v_match, c_match, VersionPart.PATCH)
+            result[VersionPart.PATCH] = c.patch - v.patch
             if result[VersionPart.PATCH] < 0:
                 result[VersionPart.PATCH] = 0
     return result
-
-def get_version_part_count_behind(match: re.Match, compare_match: re.match, version_part: VersionPart) -> int:
-    """Returns the matched version part or the default value provided"""
-    v = get_version_part(match, version_part)
-    c = get_version_part(compare_match, version_part)    
-    return c - v
\ No newline at end of file
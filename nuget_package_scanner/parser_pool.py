@@ -0,0 +1,80 @@
+import asyncio
+import concurrent.futures
+import io
+from typing import IO, List, Optional, Set, Type, Union
+
+from .nuget import NugetConfig, PackageContainer
+from .tarball import iter_tarball
+
+
+def _parse_container(container_type: Type[PackageContainer], contents: Union[str, bytes], name: str, repo: str,
+                     path: str) -> PackageContainer:
+    # module level so that it can be pickled for a process pool
+    return container_type(contents, name, repo, path)
+
+
+def _parse_archive(archive: Union[IO[bytes], bytes], repo: str) -> List[Union[PackageContainer, NugetConfig]]:
+    if isinstance(archive, bytes):
+        archive = io.BytesIO(archive)
+    return list(iter_tarball(archive, repo))
+
+
+class ParserPool:
+    """
+    Parses project files and nuget.configs off of the event loop so that large documents don't stall in-flight
+    requests. Documents are sent to a thread pool by default, or to a process pool with :param processes to use
+    multiple cores on big orgs (parsed containers are pickled back to the loop, which is cheap next to parsing).
+    Documents smaller than :param inline_max_size are parsed on the loop since that's faster than a round trip to
+    the pool.
+
+    >>> with ParserPool(processes=True) as parser:
+    >>>     container = await parser.parse(NetCoreProject, contents, name, repo, path)
+    """
+    def __init__(self, workers: Optional[int] = None, processes: bool = False, inline_max_size: int = 4 * 1024):
+        self.processes = processes
+        self.inline_max_size = inline_max_size
+        if processes:
+            self.executor = concurrent.futures.ProcessPoolExecutor(workers)
+        else:
+            self.executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='parser')
+        self.__pending: Set[concurrent.futures.Future] = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        # Note: shutdown(cancel_futures=True) would do this, but it needs Python 3.9
+        for future in list(self.__pending):
+            future.cancel()
+        self.executor.shutdown(wait=False)
+
+    def __submit(self, fn, *args) -> asyncio.Future:
+        future = self.executor.submit(fn, *args)
+        self.__pending.add(future)
+        future.add_done_callback(self.__pending.discard)
+        return asyncio.wrap_future(future)
+
+    async def parse(self, container_type: Type[PackageContainer], contents: Union[str, bytes], name: str = '',
+                    repo: str = '', path: str = '') -> PackageContainer:
+        """ Returns a :param container_type parsed from :param contents. Raises the parser's error if it is invalid. """
+        if len(contents) <= self.inline_max_size:
+            return _parse_container(container_type, contents, name, repo, path)
+        return await self.__submit(_parse_container, container_type, contents, name, repo, path)
+
+    async def parse_nuget_config(self, contents: Union[str, bytes]) -> NugetConfig:
+        if len(contents) <= self.inline_max_size:
+            return NugetConfig(contents)
+        return await self.__submit(NugetConfig, contents)
+
+    async def parse_archive(self, archive: IO[bytes], repo: str) -> List[Union[PackageContainer, NugetConfig]]:
+        """
+        Returns every project file and nuget.config in the tar :param archive of :param repo (see :func iter_tarball).
+        Archives are always sent to the pool. A process pool is sent the archive's bytes, since open files can't be
+        pickled.
+        """
+        if self.processes:
+            return await self.__submit(_parse_archive, archive.read(), repo)
+        return await self.__submit(_parse_archive, archive, repo)
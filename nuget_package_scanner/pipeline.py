@@ -0,0 +1,568 @@
+import asyncio
+import logging
+import os
+import time
+from enum import Enum
+from typing import AsyncGenerator, Dict, List, NamedTuple, Optional, Set, Tuple, Type, Union
+
+from .failures import FailureKind, RetryPolicy, classify_failure
+from .github_search import GITHUB_API_URL, GITHUB_RAW_URL, GithubClient, GithubSearchResult
+from .metrics import Metrics
+from .parser_pool import ParserPool
+from .nuget import CatalogMirror, NetCoreProject, Nuget, NugetConfig, NugetServer, Package, PackageConfig, PackageContainer
+from .response_cache import CacheNamespace
+from .scan_journal import ScanJournal
+from .scan_state import ScanState
+from .smart_client import SmartClient
+from .tarball import DirectoryArchiveSource, GithubArchiveSource
+from .tracing import Tracer, span
+
+_DONE = object() # queue sentinel
+FEED_ROUTES_FILE = 'feed_routes.json'
+
+
+class _MeteredQueue(asyncio.Queue):
+    """ Bounded queue that records its high-water mark and how long producers were blocked because it was full. """
+    def __init__(self, maxsize: int, name: str, metrics: Metrics):
+        super().__init__(maxsize)
+        self.__depth = metrics.gauge('scan_queue_depth_max', 'Highest number of items waiting in each pipeline queue', ['queue']).labels(name)
+        self.__blocked = metrics.counter('scan_queue_blocked_seconds_total', 'Time producers waited for room in each pipeline queue', ['queue']).labels(name)
+
+    async def put(self, item) -> None:
+        if self.full():
+            start = time.perf_counter()
+            await super().put(item)
+            self.__blocked.inc(time.perf_counter() - start)
+        else:
+            await super().put(item)
+        self.__depth.set_max(self.qsize())
+
+
+class _FailedFetch(NamedTuple):
+    org: str
+    container_type: Optional[Type[PackageContainer]]
+    unit: Union[GithubSearchResult, str] # a search result or, with ScanSource.TARBALL, a repo
+    result: GithubSearchResult # as reported in OrgScanner.failed_results
+    kind: FailureKind
+
+
+class ScanSource(Enum):
+    SEARCH = "search" # find project files with code search and download them one at a time
+    TARBALL = "tarball" # download each repository archive once and read the project files from it
+
+
+class OrgScanner:
+    """
+    Streams a github org through a pipeline of concurrent stages connected by bounded queues:
+
+        code search -> file fetch + parse -> package detail lookup -> results
+
+    Github-bound and Nuget-bound stages overlap, so package details are being fetched while code search is still
+    paginating. Package details are fetched once per unique :attr Package.lookup_key and shared by every reference.
+    The bounded queues apply back pressure so that a slow stage doesn't cause unbounded memory growth.
+
+    With :attr ScanSource.TARBALL, the first two stages are replaced by: list repos -> download and stream each
+    repository archive, which costs one request per repository instead of one per project file. Any nuget.config
+    found in an archive is added to the Nuget client before that repository's packages are looked up.
+    :param archive_source Where archives come from (defaults to a :class GithubArchiveSource). Pass a
+    :class DirectoryArchiveSource to scan a local directory of tarballs.
+    :param scan_state If provided, files whose blob sha hasn't changed since the last scan are not downloaded or parsed
+    again and package details whose registration index hasn't changed are not computed again.
+    :param parser Where project files are parsed (see :class ParserPool). By default, the scanner parses them in its own
+    thread pool, which is shut down when the scan is done.
+    :param metrics Where queue depths, back pressure and container/failure counts are recorded (see :class Metrics).
+    A queue that is always full points at the stage after it as the bottleneck.
+    :param journal If provided, completed search pages, containers and package details are recorded there as they are
+    done, and whatever it already records (when resuming an interrupted scan) isn't searched, fetched or looked up
+    again (see :class ScanJournal).
+    :param retry If provided, the files and package lookups that failed are retried once everything else is done (see
+    :class RetryPolicy). Failures are classified (see :class FailureKind) and the cache entries a failed lookup used are
+    evicted first, so only the failed units are redone. Containers with a failed lookup are held back until their
+    packages have been retried. Every package's :attr Package.status tells how its lookup went.
+
+    >>> scanner = OrgScanner(github_client, nuget)
+    >>> async for container in scanner.scan('my-org'):
+    >>>     print(container.repo, container.path, len(container.packages))
+    """
+    def __init__(self, github: GithubClient, nuget: Nuget, fetch_workers: int = 10, detail_workers: int = 20,
+                 queue_size: int = 100, source: ScanSource = ScanSource.SEARCH,
+                 archive_source: Union[GithubArchiveSource, DirectoryArchiveSource] = None, scan_state: ScanState = None,
+                 parser: ParserPool = None, metrics: Metrics = None, journal: ScanJournal = None,
+                 retry: RetryPolicy = None):
+        self.github = github
+        self.nuget = nuget
+        self.source = source
+        self.archive_source = archive_source or (GithubArchiveSource(github) if source == ScanSource.TARBALL else None)
+        self.scan_state = scan_state
+        self.parser = parser
+        self.journal = journal
+        self.retry = retry
+        self.metrics = metrics or Metrics()
+        self.__containers = self.metrics.counter('scan_containers_total', 'Package containers processed per org', ['org'])
+        self.__failures = self.metrics.counter('scan_failures_total', 'Failed package containers and package lookups', ['kind'])
+        self.__retries = self.metrics.counter('scan_retries_total', 'Failed package containers and package lookups that were retried', ['unit', 'failure'])
+        self.__recovered = self.metrics.counter('scan_recovered_total', 'Retried package containers and package lookups that succeeded', ['unit'])
+        self.fetch_workers = fetch_workers
+        self.detail_workers = detail_workers
+        self.queue_size = queue_size
+        self.failed_results: List[GithubSearchResult] = []
+        self.failed_packages: List[Package] = []
+        self.__detail_tasks: Dict[tuple, asyncio.Task] = {}
+        self.__failed_fetches: List[_FailedFetch] = []
+        self.__deferred: List[Tuple[str, PackageContainer]] = [] # containers waiting for their lookups to be retried
+        self.__retried_keys: Set[tuple] = set()
+
+    async def scan(self, org: str) -> AsyncGenerator[PackageContainer, None]:
+        """ Yields each :class PackageContainer in :param org with package details populated as soon as it is done. """
+        async for _, container in self.scan_orgs([org]):
+            yield container
+
+    async def scan_orgs(self, orgs: List[str]) -> AsyncGenerator[Tuple[str, PackageContainer], None]:
+        """
+        Yields (org, :class PackageContainer) for every container in :param orgs. The orgs share one set of queues and
+        workers, so an org's files are fetched and its packages are looked up while the next org is being searched,
+        and a package referenced in several orgs is only looked up once.
+        Note: Repository names aren't qualified by org, so :param scan_state should only be used to scan a single org.
+        """
+        search_queue = _MeteredQueue(self.queue_size, 'search', self.metrics)
+        container_queue = _MeteredQueue(self.queue_size, 'container', self.metrics)
+        results_queue = _MeteredQueue(self.queue_size, 'results', self.metrics)
+        owned_parser = self.parser is None
+        if owned_parser:
+            self.parser = ParserPool()
+
+        fetchers = [asyncio.create_task(self.__fetch_stage(search_queue, container_queue)) for _ in range(self.fetch_workers)]
+        detailers = [asyncio.create_task(self.__detail_stage(container_queue, results_queue)) for _ in range(self.detail_workers)]
+        supervisor = asyncio.create_task(self.__supervise(orgs, search_queue, container_queue, results_queue, fetchers, detailers))
+        try:
+            while True:
+                item = await results_queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                self.__containers.labels(item[0]).inc()
+                yield item
+        finally:
+            tasks = [supervisor, *fetchers, *detailers]
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if owned_parser:
+                self.parser.close()
+                self.parser = None
+
+    async def __supervise(self, orgs, search_queue, container_queue, results_queue, fetchers, detailers) -> None:
+        try:
+            for org in orgs:
+                await self.__search_stage(org, search_queue)
+            for _ in fetchers:
+                await search_queue.put(_DONE)
+            await asyncio.gather(*fetchers)
+            for _ in detailers:
+                await container_queue.put(_DONE)
+            await asyncio.gather(*detailers)
+            if self.retry:
+                await self.__retry_stage(results_queue)
+            self.__failures.labels('container').inc(len(self.__failed_fetches))
+            await results_queue.put(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await results_queue.put(e)
+
+    async def __search_stage(self, org: str, search_queue: asyncio.Queue) -> None:
+        if self.source == ScanSource.TARBALL:
+            count = 0
+            async for repo in self.archive_source.iter_repos(org):
+                count += 1
+                await search_queue.put((org, None, repo))
+            logging.info(f'Found {count} repositories to process in {org}.')
+            return
+        # Note: These searches run one after another since the Github API forbids concurrent searches
+        searches = [(NetCoreProject, self.github.iter_netcore_csproj), (PackageConfig, self.github.iter_package_configs)]
+        for container_type, search in searches:
+            count = 0
+            results = self.__replay_search(org, container_type.__name__, search) if self.journal else search(org)
+            async for result in results:
+                count += 1
+                await search_queue.put((org, container_type, result))
+            logging.info(f'Found {count} {container_type.__name__} project(s) to process in {org}.')
+
+    async def __replay_search(self, org: str, name: str, search) -> AsyncGenerator[GithubSearchResult, None]:
+        """ Yields the journaled pages of the :param search and then searches on from the page after them. """
+        pages = self.journal.search_pages(org, name)
+        for page in pages:
+            for result in page.results:
+                yield result
+        if pages and not pages[-1].next_url:
+            return # the search was complete
+        on_page = lambda results, next_url: self.journal.put_search_page(org, name, results, next_url)
+        start_url = pages[-1].next_url if pages else None
+        async for result in search(org, start_url=start_url, on_page=on_page):
+            yield result
+
+    async def __fetch_stage(self, search_queue: asyncio.Queue, container_queue: asyncio.Queue) -> None:
+        while True:
+            item = await search_queue.get()
+            if item is _DONE:
+                return
+            org, container_type, result = item
+            if self.source == ScanSource.TARBALL:
+                for container in await self.__fetch_archive(org, result):
+                    await container_queue.put((org, container))
+                continue
+            container = await self.__fetch_container(org, container_type, result)
+            if container:
+                await container_queue.put((org, container))
+
+    async def __fetch_archive(self, org: str, repo: str) -> List[PackageContainer]:
+        journaled = self.journal.get_archive(org, repo) if self.journal else None
+        if journaled:
+            containers, configs = journaled
+            for index_url, name in configs.items():
+                await self.nuget.add_config(index_url, name)
+            for c in containers:
+                self.__remember_container(c)
+            return containers
+        try:
+            with span('archive fetch', 'github', org=org, repo=repo):
+                archive = await self.archive_source.open_archive(repo, org)
+            if archive is None:
+                return []
+            with archive, span('archive parse', 'parse', repo=repo):
+                parsed = await self.parser.parse_archive(archive, repo)
+        except Exception as e:
+            self.__fetch_failed(org, None, repo, GithubSearchResult('', repo, '', ''), e)
+            return []
+        containers = []
+        configs = {}
+        for p in parsed:
+            if isinstance(p, NugetConfig):
+                for name, index_url in p.indexes.items():
+                    configs.setdefault(index_url, name)
+                    await self.nuget.add_config(index_url, name)
+            else:
+                self.__remember_container(p)
+                containers.append(p)
+        if self.journal:
+            self.journal.put_archive(org, repo, containers, configs)
+        return containers
+
+    def __remember_container(self, container: PackageContainer) -> None:
+        if self.scan_state:
+            self.scan_state.get_container(container.repo, container.path, container.sha) # marks the file as seen
+            self.scan_state.put_container(container)
+
+    async def __fetch_container(self, org: str, container_type: Type[PackageContainer], result: GithubSearchResult) -> Optional[PackageContainer]:
+        if self.scan_state:
+            container = self.scan_state.get_container(result.repo, result.path, result.sha)
+            if container:
+                return container
+        if self.journal:
+            container = self.journal.get_container(org, result.repo, result.path, result.sha)
+            if container:
+                if self.scan_state:
+                    self.scan_state.put_container(container)
+                return container
+        try:
+            with span('file fetch', 'github', repo=result.repo, path=result.path):
+                source = await self.github.get_request_as_text(result.url)
+            with span('parse', 'parse', repo=result.repo, path=result.path, bytes=len(source)):
+                container = await self.parser.parse(container_type, source, result.name, result.repo, result.path)
+            container.sha = result.sha
+            if self.scan_state:
+                self.scan_state.put_container(container)
+            if self.journal:
+                self.journal.put_container(org, container)
+            return container
+        except Exception as e:
+            self.__fetch_failed(org, container_type, result, result, e)
+
+    def __fetch_failed(self, org: str, container_type: Optional[Type[PackageContainer]], unit: Union[GithubSearchResult, str],
+                       result: GithubSearchResult, e: Exception) -> None:
+        kind = classify_failure(e)
+        if container_type is None:
+            logging.warning(f'Failed to get the archive for {result.repo} ({kind.value})')
+        else:
+            logging.warning(f'Failed to get package container {result.name} from {result.url} ({kind.value})')
+        self.failed_results.append(result)
+        self.__failed_fetches.append(_FailedFetch(org, container_type, unit, result, kind))
+
+    async def __detail_stage(self, container_queue: asyncio.Queue, results_queue: asyncio.Queue) -> None:
+        while True:
+            item = await container_queue.get()
+            if item is _DONE:
+                return
+            with span('container details', 'nuget', repo=item[1].repo, path=item[1].path, packages=len(item[1].packages)):
+                failed = await self.__populate_details(item[1])
+            if failed and self.retry:
+                self.__deferred.append(item) # yielded once the failed lookups have been retried
+            else:
+                await self.__emit(item, failed, results_queue)
+
+    async def __emit(self, item: Tuple[str, PackageContainer], failed: List[Package], results_queue: asyncio.Queue) -> None:
+        self.failed_packages.extend(failed)
+        self.__failures.labels('package').inc(len(failed))
+        await results_queue.put(item)
+
+    async def __populate_details(self, container: PackageContainer) -> List[Package]:
+        """ Copies the details of every package in :param container and returns the packages whose lookup failed. """
+        tasks = [self.__details_task(p) for p in container.packages]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        failed = []
+        for package, details in zip(container.packages, results):
+            if isinstance(details, BaseException):
+                package.status = classify_failure(details).value
+                failed.append(package)
+            else:
+                package.copy_details(details)
+                package.status = details.status
+        return failed
+
+    async def __retry_stage(self, results_queue: asyncio.Queue) -> None:
+        """
+        Retries the file fetches and package lookups that failed (see :class RetryPolicy), then yields the containers
+        that were held back. Before a lookup is retried, the timeline and responses cached for that package id are
+        evicted. Nothing else is redone: the lookups that succeeded are still shared by the retried containers.
+        """
+        budget = self.retry.budget
+        for attempt in range(1, self.retry.attempts + 1):
+            fetches = [f for f in self.__failed_fetches if f.kind.retryable]
+            lookups = {key: kind for key, kind in self.__failed_lookups().items() if kind.retryable}
+            if len(fetches) + len(lookups) > budget:
+                logging.warning(f'{len(fetches)} file(s) and {len(lookups)} package lookup(s) failed, which is more than the '
+                                f'remaining retry budget of {budget}. Only retrying {budget}.')
+                fetches = fetches[:budget]
+                lookups = dict(list(lookups.items())[:budget - len(fetches)])
+            if not fetches and not lookups:
+                break
+            budget -= len(fetches) + len(lookups)
+            delay = self.retry.delay(attempt)
+            logging.info(f'Retrying {len(fetches)} file(s) and {len(lookups)} package lookup(s) in {delay:0.1f}s '
+                         f'(attempt {attempt} of {self.retry.attempts}).')
+            await asyncio.sleep(delay)
+            with span('retry', 'scan', attempt=attempt, files=len(fetches), packages=len(lookups)):
+                for f in fetches:
+                    self.__failed_fetches.remove(f)
+                    self.failed_results.remove(f.result)
+                    self.__retries.labels('container', f.kind.value).inc()
+                for key, kind in lookups.items():
+                    self.__retries.labels('package', kind.value).inc()
+                    del self.__detail_tasks[key] # the next reference to this key looks it up again
+                    self.__retried_keys.add(key)
+                for package_id in set(key[0] for key in lookups):
+                    await self.nuget.invalidate_package(package_id)
+
+                fetched = await asyncio.gather(*[self.__refetch(f) for f in fetches])
+                still_failing = set(id(f.unit) for f in self.__failed_fetches)
+                for f, containers in zip(fetches, fetched):
+                    if id(f.unit) not in still_failing:
+                        self.__recovered.labels('container').inc()
+                    self.__deferred.extend((f.org, c) for c in containers)
+                deferred, self.__deferred = self.__deferred, []
+                failures = await asyncio.gather(*[self.__populate_details(c) for _, c in deferred])
+                still_failing = self.__failed_lookups()
+                self.__recovered.labels('package').inc(sum(1 for key in lookups if key not in still_failing))
+                for item, failed in zip(deferred, failures):
+                    if failed:
+                        self.__deferred.append(item)
+                    else:
+                        await self.__emit(item, failed, results_queue)
+        # the retries ran out: yield what is left with the status of its last failure
+        deferred, self.__deferred = self.__deferred, []
+        for item in deferred:
+            await self.__emit(item, await self.__populate_details(item[1]), results_queue)
+
+    async def __refetch(self, f: _FailedFetch) -> List[PackageContainer]:
+        if f.container_type is None:
+            return await self.__fetch_archive(f.org, f.unit)
+        container = await self.__fetch_container(f.org, f.container_type, f.unit)
+        return [container] if container else []
+
+    def __failed_lookups(self) -> Dict[tuple, FailureKind]:
+        return {key: classify_failure(task.exception()) for key, task in self.__detail_tasks.items()
+                if task.done() and not task.cancelled() and task.exception() is not None}
+
+    def __details_task(self, package: Package) -> asyncio.Task:
+        """ Returns the (shared) task that fetches details for every package with the same lookup key. """
+        key = package.lookup_key
+        task = self.__detail_tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(self.__fetch_details(Package(package.name, package.version)), name=f'{key[0]} {key[1]}')
+            self.__detail_tasks[key] = task
+        return task
+
+    async def __fetch_details(self, package: Package) -> Package:
+        try:
+            with span('package details', 'nuget', package=package.name, version=package.version):
+                validators = None
+                journaled = self.journal.get_details(package.lookup_key) if self.journal else None
+                if journaled:
+                    details, validators = journaled
+                    package.set_details(details)
+                    if self.scan_state:
+                        self.scan_state.put_details(package, validators)
+                    return self.__lookup_done(package)
+                if self.scan_state:
+                    validators = await self.nuget.get_registration_validators(package.name)
+                    details = self.scan_state.get_details(package.lookup_key, validators)
+                    if details is not None:
+                        package.set_details(details)
+                        return self.__lookup_done(package)
+                await self.nuget.get_fetch_package_details(package)
+                if self.scan_state:
+                    self.scan_state.put_details(package, validators)
+                if self.journal:
+                    self.journal.put_details(package, validators)
+        except Exception as e:
+            logging.warning(f'Failed to get package {package.name} from discovered nuget server(s) ({classify_failure(e).value}).')
+            raise
+        return self.__lookup_done(package)
+
+    def __lookup_done(self, package: Package) -> Package:
+        if not package.source:
+            package.status = 'not_found'
+        else:
+            package.status = 'retried' if package.lookup_key in self.__retried_keys else 'ok'
+        return package
+
+    @property
+    def unique_package_count(self) -> int:
+        return len(self.__detail_tasks)
+
+
+async def scan_org(org: str, token: str, cache_dir: str = None, cache_max_bytes: int = None, state_file: str = None,
+                   delta_file: str = None, feed_rules: Dict[str, str] = None, catalog_file: str = None,
+                   github_api_url: str = GITHUB_API_URL, github_raw_url: str = GITHUB_RAW_URL,
+                   nuget_index_url: str = NugetServer.DEFAULT_SERVICE_INDEX_URL, metrics: Metrics = None,
+                   journal_file: str = None, resume: bool = False, retry: Optional[RetryPolicy] = RetryPolicy(),
+                   include_dates: bool = True,
+                   **scanner_options) -> AsyncGenerator[PackageContainer, None]:
+    """
+    Public streaming API. Discovers the nuget servers configured in :param org and then yields every package container
+    in the org (with package details) as soon as it has been processed.
+    :param state_file If provided, the scan is incremental: unchanged files and package details are reused from the
+    previous scan that used the same file (see :class ScanState).
+    :param delta_file If provided along with :param state_file, what changed since the previous scan is written here.
+    :param feed_rules Package id globs mapped to the nuget server that should be tried first (see :class FeedResolver).
+    The server each package id was found on is remembered in :param cache_dir (if provided) for the next scan.
+    :param catalog_file If provided, packages on the feeds mirrored in this :class CatalogMirror are looked up locally.
+    The mirrored feeds are synced first. See :func app.sync_catalog_mirror to start mirroring a feed.
+    :param github_api_url, :param github_raw_url and :param nuget_index_url replace api.github.com,
+    raw.githubusercontent.com and nuget.org (e.g. for Github Enterprise or an offline stand-in, see :mod benchmark).
+    :param metrics If provided, requests, cache hits, queue depths and phase durations are recorded here (see :class
+    Metrics). Export it once the scan is done with :meth Metrics.write.
+    :param journal_file If provided, the scan's progress is checkpointed here as it goes, and the file is removed once
+    the scan completes. If the scan is interrupted, run it again with :param resume True to pick up where it stopped
+    instead of starting over (see :class ScanJournal).
+    :param retry How the files and package lookups that failed are retried at the end of the scan (see :class
+    RetryPolicy). Pass None to not retry them.
+    :param include_dates If False, publish dates aren't looked up, which takes far fewer requests on feeds with a flat
+    container (see :class Nuget).
+    :param scanner_options are passed to :class OrgScanner (e.g. source=ScanSource.TARBALL)
+
+    >>> async for container in scan_org('my-org', token):
+    >>>     ...
+    """
+    state = ScanState(state_file) if state_file else None
+    async for _, container in scan_orgs([org], token, cache_dir, cache_max_bytes, feed_rules=feed_rules,
+                                        catalog_file=catalog_file, github_api_url=github_api_url,
+                                        github_raw_url=github_raw_url, nuget_index_url=nuget_index_url, metrics=metrics,
+                                        journal_file=journal_file, resume=resume, retry=retry,
+                                        include_dates=include_dates, scan_state=state, **scanner_options):
+        yield container
+    if state:
+        delta = state.finish()
+        logging.info(f'{delta.unchanged_files} unchanged, {len(delta.added_files)} added, {len(delta.changed_files)} changed and {len(delta.removed_files)} removed package container(s).')
+        if delta_file:
+            delta.write(delta_file)
+
+
+async def scan_orgs(orgs: List[str], token: str, cache_dir: str = None, cache_max_bytes: int = None,
+                    feed_rules: Dict[str, str] = None, catalog_file: str = None,
+                    github_api_url: str = GITHUB_API_URL, github_raw_url: str = GITHUB_RAW_URL,
+                    nuget_index_url: str = NugetServer.DEFAULT_SERVICE_INDEX_URL, metrics: Metrics = None,
+                    journal_file: str = None, resume: bool = False, retry: Optional[RetryPolicy] = RetryPolicy(),
+                    include_dates: bool = True,
+                    **scanner_options) -> AsyncGenerator[Tuple[str, PackageContainer], None]:
+    """
+    Public streaming API for scanning several orgs in one batch. Yields (org, container) for every package container
+    in :param orgs as soon as it has been processed.
+    Unlike calling :func scan_org once per org, every org shares the same http client (and response caches), nuget
+    servers, registration timelines and work queue (see :meth OrgScanner.scan_orgs), so a package that is referenced
+    in several orgs is only looked up once. The nuget servers configured in every org are available to all of them.
+    See :func scan_org for the other parameters. Incremental scans (state_file) aren't supported for batches.
+
+    >>> async for org, container in scan_orgs(['org-a', 'org-b'], token):
+    >>>     ...
+    """
+    start = time.perf_counter()
+    journal = ScanJournal(journal_file, orgs, resume) if journal_file else None
+    parser = scanner_options.pop('parser', None)
+    owned_parser = parser is None
+    if owned_parser:
+        parser = ParserPool() # shared by config discovery and the scanner
+    completed = False
+    try:
+        async with SmartClient(cache_dir, cache_max_bytes, metrics=metrics) as client:
+            g = GithubClient(token, client, api_url=github_api_url, raw_url=github_raw_url)
+            configs = {}
+            with client.metrics.phase('discover_configs'):
+                for org in orgs:
+                    # Note: These run one after another since the Github API forbids concurrent searches
+                    for index_url, name in (await _discover_configs(g, org, journal, parser)).items():
+                        configs.setdefault(index_url, name)
+
+            logging.info(f'Found {len(configs)} Nuget Server(s) to query across {len(orgs)} org(s).')
+            for c in configs:
+                logging.info(f'{configs[c]} Index: {c}')
+
+            route_file = os.path.join(cache_dir, FEED_ROUTES_FILE) if cache_dir else None
+            mirror = CatalogMirror(catalog_file, client) if catalog_file else None
+            async with Nuget(client, configs, feed_rules, route_file, include_dates, catalog_mirror=mirror,
+                             default_index_url=nuget_index_url) as n:
+                scanner = OrgScanner(g, n, parser=parser, metrics=client.metrics, journal=journal, retry=retry,
+                                     **scanner_options)
+                counts = dict.fromkeys(orgs, 0)
+                with client.metrics.phase('scan'):
+                    async for org, container in scanner.scan_orgs(orgs):
+                        counts[org] += 1
+                        yield org, container
+
+                stop = time.perf_counter()
+                for org, count in counts.items():
+                    logging.info(f'Processed {count} package container(s) in {org}.')
+                logging.info(f'Processed {len(orgs)} org(s) for Nuget packages ({scanner.unique_package_count} unique package versions) in {stop - start:0.4f} seconds')
+                logging.info(f'{len(scanner.failed_results)} package container(s) and {len(scanner.failed_packages)} package reference(s) failed.')
+                for namespace in CacheNamespace:
+                    logging.info(f'Cache Hit Info for {namespace.value}  {client.response_cache.info(namespace)}')
+                _log_host_report(client)
+            if mirror:
+                mirror.close()
+        completed = True
+    finally:
+        if owned_parser:
+            parser.close()
+        if journal and completed:
+            journal.finish()
+        elif journal:
+            journal.close() # kept, so that the scan can be resumed
+
+
+async def _discover_configs(g: GithubClient, org: str, journal: Optional[ScanJournal],
+                            parser: Optional[ParserPool] = None) -> Dict[str, str]:
+    """ Returns the nuget servers (index url: name) configured in :param org, from the :param journal if it has them. """
+    configs = journal.get_configs(org) if journal else None
+    if configs is None:
+        configs = await g.get_unique_nuget_configs(org, parser=parser)
+        if journal:
+            journal.put_configs(org, configs)
+    return configs
+
+
+def _log_host_report(client: SmartClient) -> None:
+    for host, r in client.host_report().items():
+        latency = f"p50 {r['p50_s']:0.3f}s p99 {r['p99_s']:0.3f}s" if r['p50_s'] is not None else 'no latency samples'
+        logging.info(f"{host}: {r['requests']} request(s), {r['errors']} error(s), {r['retries']} retry(ies), "
+                     f"{r['seconds']:0.1f}s in requests ({latency}), {r['limiter_wait_s']:0.1f}s waiting for the host limiter")
@@ -0,0 +1,190 @@
+import abc
+import csv
+import heapq
+import json
+import os
+import sqlite3
+import tempfile
+from typing import Iterator, List, Optional
+
+from .nuget import PackageContainer
+
+# (csv column, field) for every row of a report. There is one row per package reference.
+REPORT_COLUMNS = [
+    ("Repo Name", "repo"), ("Container Path", "path"), ("Name", "name"), ("Referenced Version", "version"),
+    ("Date", "version_date"), ("Latest Release", "latest_release"), ("Latest Release Date", "latest_release_date"),
+    ("Latest Package", "latest_version"), ("Latest Package Date", "latest_version_date"),
+    ("Major Release Behind", "major_releases_behind"), ("Minor Release Behind", "minor_releases_behind"),
+    ("Patch Release Behind", "patch_releases_behind"), ("Available Version Count", "available_version_count"),
+    ("Link", "details_url"), ("Source", "source"), ("Status", "status"),
+]
+REPORT_FIELDS = [field for _, field in REPORT_COLUMNS]
+
+
+def report_rows(container: PackageContainer) -> List[list]:
+    """ Returns a row (ordered like :const REPORT_FIELDS) for every package referenced by :param container. """
+    return [
+        [
+            container.repo, container.path, package.name, package.version, package.version_date,
+            package.latest_release, package.latest_release_date, package.latest_version,
+            package.latest_version_date, package.major_releases_behind,
+            package.minor_releases_behind, package.patch_releases_behind,
+            package.available_version_count, package.details_url, package.source, package.status
+        ]
+        for package in container.packages
+    ]
+
+
+class ReportSink(abc.ABC):
+    """
+    Receives package containers as soon as they have been processed and writes them out, so that nothing needs to be
+    held in memory until the end of a scan. Rows are written in the order they arrive. Sinks are context managers.
+    Subclasses implement :meth _write_rows (and :meth close if they hold on to a file or connection):
+
+    >>> with CsvSink('report.csv') as sink:
+    >>>     async for container in scan_org(org, token):
+    >>>         sink.write(container)
+    """
+    def __init__(self, path: str, include_org: bool = False):
+        """ :param include_org Adds the org as the first field of each row (for reports that span several orgs). """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.include_org = include_org
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def fields(self) -> List[str]:
+        return ["org", *REPORT_FIELDS] if self.include_org else REPORT_FIELDS
+
+    def write(self, container: PackageContainer, org: Optional[str] = None) -> None:
+        rows = report_rows(container)
+        if self.include_org:
+            rows = [[org, *row] for row in rows]
+        self._write_rows(rows)
+        self.rows += len(rows)
+
+    def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def _write_rows(self, rows: List[list]) -> None:
+        """ Writes :param rows (ordered like :attr fields). """
+
+
+class CsvSink(ReportSink):
+    """ Writes the report as csv with the same columns as :func app.write_to_csv. Any existing file is written over. """
+    def __init__(self, path: str, include_org: bool = False):
+        super().__init__(path, include_org)
+        self.__file = open(path, 'w', newline='')
+        self.__writer = csv.writer(self.__file)
+        columns = [column for column, _ in REPORT_COLUMNS]
+        self.__writer.writerow(["Org", *columns] if include_org else columns)
+
+    def _write_rows(self, rows: List[list]) -> None:
+        self.__writer.writerows(rows)
+
+    def close(self) -> None:
+        self.__file.close()
+
+
+class JsonLinesSink(ReportSink):
+    """ Writes one json object per package reference and line (https://jsonlines.org). """
+    def __init__(self, path: str, include_org: bool = False):
+        super().__init__(path, include_org)
+        self.__file = open(path, 'w')
+
+    def _write_rows(self, rows: List[list]) -> None:
+        fields = self.fields
+        self.__file.writelines(json.dumps(dict(zip(fields, row))) + '\n' for row in rows)
+
+    def close(self) -> None:
+        self.__file.close()
+
+
+class SqliteSink(ReportSink):
+    """
+    Writes the report to the packages table of a SQLite database, which is indexed to query by repo, by package and by
+    how far behind references are after the scan, e.g.
+
+        SELECT name, version, count(*) FROM packages WHERE major_releases_behind > 0 GROUP BY name, version
+
+    Rows are committed every :param commit_rows rows. Any existing packages table is replaced.
+    """
+    def __init__(self, path: str, include_org: bool = False, commit_rows: int = 10000):
+        super().__init__(path, include_org)
+        self.commit_rows = commit_rows
+        self.__pending = 0
+        self.__db = sqlite3.connect(path)
+        fields = self.fields
+        self.__insert = f"INSERT INTO packages ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})"
+        with self.__db:
+            self.__db.execute("DROP TABLE IF EXISTS packages")
+            self.__db.execute(f"CREATE TABLE packages ({', '.join(fields)})")
+
+    def _write_rows(self, rows: List[list]) -> None:
+        self.__db.executemany(self.__insert, rows)
+        self.__pending += len(rows)
+        if self.__pending >= self.commit_rows:
+            self.__db.commit()
+            self.__pending = 0
+
+    def close(self) -> None:
+        # Indexes are built once at the end, which is much faster than maintaining them on every insert
+        with self.__db:
+            self.__db.execute("CREATE INDEX packages_repo ON packages (repo, path)")
+            self.__db.execute("CREATE INDEX packages_name ON packages (name COLLATE NOCASE, version)")
+            self.__db.execute("CREATE INDEX packages_behind ON packages (major_releases_behind, minor_releases_behind, patch_releases_behind)")
+            if self.include_org:
+                self.__db.execute("CREATE INDEX packages_org ON packages (org)")
+        self.__db.close()
+
+
+SINK_TYPES = {'.csv': CsvSink, '.jsonl': JsonLinesSink, '.db': SqliteSink, '.sqlite': SqliteSink}
+
+
+def sink_for_path(path: str, include_org: bool = False) -> ReportSink:
+    """ Returns the sink for the extension of :param path (.csv, .jsonl, .db or .sqlite). """
+    extension = os.path.splitext(path)[1].lower()
+    assert extension in SINK_TYPES, f'Unsupported report extension {extension}. Use one of {", ".join(SINK_TYPES)}.'
+    return SINK_TYPES[extension](path, include_org)
+
+
+def sort_csv(path: str, key_columns: int = 2, chunk_rows: int = 100000) -> None:
+    """
+    Sorts the rows of the csv at :param path (after its header) by its first :param key_columns columns, in place.
+    This is an external merge sort: at most :param chunk_rows rows are held in memory at once.
+    """
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as tmp:
+        chunks = []
+        with open(path, 'r', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            while True:
+                rows = [row for _, row in zip(range(chunk_rows), reader)]
+                if not rows:
+                    break
+                rows.sort(key=lambda r: r[:key_columns])
+                chunk = os.path.join(tmp, f'{len(chunks)}.csv')
+                with open(chunk, 'w', newline='') as c:
+                    csv.writer(c).writerows(rows)
+                chunks.append(chunk)
+
+        files = [open(chunk, 'r', newline='') for chunk in chunks]
+        try:
+            with open(path, 'w', newline='') as f:
+                w = csv.writer(f)
+                w.writerow(header)
+                readers: List[Iterator[list]] = [csv.reader(c) for c in files]
+                w.writerows(heapq.merge(*readers, key=lambda r: r[:key_columns]))
+        finally:
+            for c in files:
+                c.close()
@@ -0,0 +1,283 @@
+import asyncio
+import functools
+import itertools
+import logging
+import sys
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+
+class CacheNamespace(Enum):
+    """ Groups cached responses so that each kind of resource can be given its own memory budget. """
+    DEFAULT = "default"
+    SERVICE_INDEX = "service_index"
+    REGISTRATION_INDEX = "registration_index"
+    REGISTRATION_PAGE = "registration_page"
+    FLAT_CONTAINER = "flat_container"
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    bytes: int
+    entries: int
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Returns a rough estimate of the number of bytes held by :param value. Containers are walked recursively so that
+    decoded json (dicts of lists of dicts...) is accounted for as a whole.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += estimate_size(k) + estimate_size(v)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for v in value:
+            size += estimate_size(v)
+    return size
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'tick')
+
+    def __init__(self, value, size: int, tick: int):
+        self.value = value
+        self.size = size
+        self.tick = tick
+
+
+class _Counters:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class _Namespace(_Counters):
+    def __init__(self, max_bytes: Optional[int]):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.entries: 'OrderedDict[Any, _Entry]' = OrderedDict()
+        self.bytes = 0
+
+
+class ResponseCache:
+    """
+    In-memory LRU cache with a byte budget. Every value is assigned a :class CacheNamespace, each of which may have its
+    own budget on top of the overall budget. When a budget is exceeded the least recently used entries are evicted
+    (from the offending namespace, or from across all namespaces for the overall budget).
+    A budget of None means unbounded.
+    """
+    def __init__(self, max_bytes: Optional[int] = None, namespace_max_bytes: Optional[Dict[CacheNamespace, int]] = None):
+        assert max_bytes is None or max_bytes >= 0, ':param max_bytes must be None or >= 0'
+        self.max_bytes = max_bytes
+        namespace_max_bytes = namespace_max_bytes or {}
+        self.__namespaces: Dict[CacheNamespace, _Namespace] = {ns: _Namespace(namespace_max_bytes.get(ns)) for ns in CacheNamespace}
+        self.__key_namespaces: Dict[Any, CacheNamespace] = {}
+        self.__methods: Dict[str, _Counters] = {} # per :class cached_response method
+        self.__ticks = itertools.count()
+        self.bytes = 0
+
+    def get(self, key, namespace: CacheNamespace = CacheNamespace.DEFAULT) -> Tuple[bool, Any]:
+        """
+        Returns a (found, value) tuple. The value may legitimately be None (e.g. for a 404).
+        :param namespace is only used to account for a miss. A hit is counted against the namespace the key was stored in.
+        """
+        stored_namespace = self.__key_namespaces.get(key)
+        if stored_namespace is None:
+            self.__namespaces[namespace].misses += 1
+            self.__method_counters(key).misses += 1
+            return False, None
+        ns = self.__namespaces[stored_namespace]
+        entry = ns.entries[key]
+        ns.hits += 1
+        self.__method_counters(key).hits += 1
+        entry.tick = next(self.__ticks)
+        ns.entries.move_to_end(key)
+        return True, entry.value
+
+    def put(self, key, value, namespace: CacheNamespace = CacheNamespace.DEFAULT) -> bool:
+        """ Stores :param value and evicts as needed. Returns False if the value is too large to ever fit. """
+        self.invalidate(key)
+        ns = self.__namespaces[namespace]
+        size = estimate_size(value)
+        if (ns.max_bytes is not None and size > ns.max_bytes) or (self.max_bytes is not None and size > self.max_bytes):
+            logging.debug(f'Not caching {key}. {size} bytes exceeds the {namespace.value} budget.')
+            return False
+        ns.entries[key] = _Entry(value, size, next(self.__ticks))
+        ns.bytes += size
+        self.bytes += size
+        self.__key_namespaces[key] = namespace
+        while ns.max_bytes is not None and ns.bytes > ns.max_bytes:
+            self.__evict_oldest(ns)
+        while self.max_bytes is not None and self.bytes > self.max_bytes:
+            self.__evict_oldest(min((n for n in self.__namespaces.values() if n.entries),
+                key=lambda n: next(iter(n.entries.values())).tick))
+        return True
+
+    def invalidate(self, key) -> bool:
+        namespace = self.__key_namespaces.pop(key, None)
+        if namespace is None:
+            return False
+        ns = self.__namespaces[namespace]
+        entry = ns.entries.pop(key)
+        ns.bytes -= entry.size
+        self.bytes -= entry.size
+        return True
+
+    def invalidate_url(self, url: str) -> int:
+        """
+        Drops every response a :class cached_response method stored for :param url, whichever method and arguments it
+        was requested with. Returns how many were dropped.
+        """
+        return self.__invalidate_responses(lambda key: key.url == url)
+
+    def invalidate_method(self, method: str) -> int:
+        """
+        Drops every response the :class cached_response method named :param method stored, leaving the responses of
+        other methods sharing this cache alone. Returns how many were dropped.
+        """
+        return self.__invalidate_responses(lambda key: key.method == method)
+
+    def __invalidate_responses(self, predicate: Callable[['_ResponseKey'], bool]) -> int:
+        keys = [key for key in self.__key_namespaces if isinstance(key, _ResponseKey) and predicate(key)]
+        for key in keys:
+            self.invalidate(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        for ns in self.__namespaces.values():
+            ns.entries.clear()
+            ns.bytes = 0
+        self.__key_namespaces.clear()
+        self.bytes = 0
+
+    def info(self, namespace: Optional[CacheNamespace] = None, method: Optional[str] = None) -> CacheInfo:
+        """
+        Returns hit/miss/eviction/size counters for :param namespace or for the whole cache if not provided.
+        If :param method is provided, only the responses of the :class cached_response method with that name are counted.
+        """
+        if method is not None:
+            counters = self.__methods.get(method, _Counters())
+            entries = [e for ns in self.__namespaces.values() for k, e in ns.entries.items()
+                       if isinstance(k, _ResponseKey) and k.method == method]
+            return CacheInfo(hits=counters.hits, misses=counters.misses, evictions=counters.evictions,
+                             bytes=sum(e.size for e in entries), entries=len(entries))
+        namespaces = [self.__namespaces[namespace]] if namespace else self.__namespaces.values()
+        return CacheInfo(
+            hits=sum(ns.hits for ns in namespaces),
+            misses=sum(ns.misses for ns in namespaces),
+            evictions=sum(ns.evictions for ns in namespaces),
+            bytes=sum(ns.bytes for ns in namespaces),
+            entries=sum(len(ns.entries) for ns in namespaces))
+
+    def __evict_oldest(self, ns: _Namespace) -> None:
+        key, entry = ns.entries.popitem(last=False)
+        del self.__key_namespaces[key]
+        ns.bytes -= entry.size
+        self.bytes -= entry.size
+        ns.evictions += 1
+        self.__method_counters(key).evictions += 1
+
+    def __method_counters(self, key) -> _Counters:
+        if not isinstance(key, _ResponseKey):
+            return _Counters() # not from a cached_response method, so nothing keeps count
+        counters = self.__methods.get(key.method)
+        if counters is None:
+            counters = self.__methods[key.method] = _Counters()
+        return counters
+
+
+class _ResponseKey(NamedTuple):
+    method: str
+    url: str
+    ignore_404: bool
+    headers: Any
+
+
+def _freeze(value):
+    return frozenset(value.items()) if isinstance(value, dict) else value
+
+
+class _BoundCachedResponse:
+    def __init__(self, fn, instance, name: str):
+        self.__fn = fn
+        self.__instance = instance
+        self.__name = name
+        self.__pending: Dict[Any, asyncio.Future] = {}
+        functools.update_wrapper(self, fn)
+
+    def __key(self, url, ignore_404, headers):
+        return _ResponseKey(self.__name, url, ignore_404, _freeze(headers))
+
+    @property
+    def __cache(self) -> ResponseCache:
+        return self.__instance.response_cache
+
+    async def __call__(self, url: str, ignore_404 = True, headers: Optional[dict] = None,
+                       namespace: CacheNamespace = CacheNamespace.DEFAULT):
+        key = self.__key(url, ignore_404, headers)
+        found, value = self.__cache.get(key, namespace)
+        if found:
+            return value
+        # concurrent callers for the same resource share a single request
+        pending = self.__pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self.__fn(self.__instance, url, ignore_404, headers))
+            self.__pending[key] = pending
+            pending.add_done_callback(functools.partial(self.__on_done, key, namespace))
+        return await asyncio.shield(pending)
+
+    def __on_done(self, key, namespace: CacheNamespace, future: asyncio.Future) -> None:
+        self.__pending.pop(key, None)
+        if not future.cancelled() and future.exception() is None:
+            self.__cache.put(key, future.result(), namespace)
+
+    def cache_info(self) -> CacheInfo:
+        """ Counters for the responses of this method only. See :meth ResponseCache.info for the whole cache. """
+        return self.__cache.info(method=self.__name)
+
+    def cache_clear(self) -> None:
+        """ Drops the responses of this method only. See :meth ResponseCache.clear to drop everything. """
+        self.__cache.invalidate_method(self.__name)
+
+    def invalidate(self, url: str, ignore_404 = True, headers: Optional[dict] = None) -> bool:
+        return self.__cache.invalidate(self.__key(url, ignore_404, headers))
+
+    async def close(self) -> None:
+        """ Cancels any requests that are still in flight. """
+        pending = list(self.__pending.values())
+        for p in pending:
+            p.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+
+class cached_response:
+    """
+    Memoizes an async (self, url, ignore_404, headers) method into the instance's `response_cache`
+    (a :class ResponseCache). Callers may pass a `namespace` keyword to choose which budget the result counts against.
+    Concurrent calls for the same key share a single in-flight request. Exceptions are not cached.
+
+    The decorated method also exposes cache_info() and cache_clear() (which only count and drop its own responses, not
+    the rest of the shared cache), invalidate(url, ...) and close().
+    """
+    def __init__(self, fn):
+        self.__fn = fn
+        self.__name = fn.__name__
+        functools.update_wrapper(self, fn)
+
+    def __set_name__(self, owner, name):
+        self.__name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        bound = instance.__dict__.get(self.__name)
+        if bound is None:
+            bound = _BoundCachedResponse(self.__fn, instance, self.__name)
+            instance.__dict__[self.__name] = bound
+        return bound
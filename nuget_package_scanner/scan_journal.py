@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .github_search import GithubSearchResult
+from .nuget import Package, PackageContainer
+from .scan_state import CONTAINER_TYPES
+
+
+class JournaledPage:
+    """ A page of code search results that was recorded before a crash, and the url of the page after it. """
+    __slots__ = ('results', 'next_url')
+
+    def __init__(self, results: List[GithubSearchResult], next_url: str):
+        self.results = results
+        self.next_url = next_url # empty once the search is complete
+
+
+class ScanJournal:
+    """
+    Append-only record of the work a scan has completed, so that a scan that dies partway through (rate limits, a
+    network drop, a crash...) can be resumed without repeating it. Every record is a json line that is flushed as soon
+    as it is written and synced to disk every :param sync_interval seconds:
+
+    - the nuget servers discovered in each org,
+    - every page of code search results and the url of the next page (or, with :attr ScanSource.TARBALL, every
+      repository archive that was read and the containers and nuget.config servers found in it),
+    - every parsed package container,
+    - the details of every package that was looked up, along with the validators of its registration index.
+
+    When :param resume is True, an existing journal for the same :param orgs is replayed: the scanner only searches
+    from the page after the last recorded one, only fetches and parses files that aren't recorded and only looks up
+    packages that aren't recorded. Failures aren't recorded, so they're tried again. Otherwise, any existing journal
+    is discarded. A journal that was cut off mid-record (e.g. by a power loss) is replayed up to the last full record.
+
+    Call :meth finish once the scan is complete. The journal is removed, since there is nothing left to resume.
+    """
+    VERSION = 1
+
+    def __init__(self, path: str, orgs: List[str], resume: bool = False, sync_interval: float = 1.0):
+        self.path = path
+        self.orgs = list(orgs)
+        self.sync_interval = sync_interval
+        self.replayed = 0
+        self.__configs: Dict[str, Dict[str, str]] = {}
+        self.__pages: Dict[Tuple[str, str], List[JournaledPage]] = {}
+        self.__archives: Dict[Tuple[str, str], dict] = {}
+        self.__containers: Dict[Tuple[str, str, str], dict] = {}
+        self.__details: Dict[Tuple[str, str], dict] = {}
+        self.__last_sync = time.monotonic()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        end = self.__load() if resume else None
+        if end is None:
+            self.__file = open(path, 'w')
+            self.__write({'type': 'scan', 'version': self.VERSION, 'orgs': self.orgs})
+        else:
+            self.__file = open(path, 'r+')
+            self.__file.seek(end)
+            self.__file.truncate() # drop a partially written record
+            logging.info(f'Resuming the scan recorded in {path}: {self.replayed} completed step(s) will be replayed.')
+
+    def __load(self) -> Optional[int]:
+        """ Replays the journal and returns the offset after its last full record, or None if it can't be resumed. """
+        if not os.path.exists(self.path):
+            return None
+        end = 0
+        with open(self.path, 'r') as f:
+            for line in iter(f.readline, ''):
+                try:
+                    record = json.loads(line) if line.endswith('\n') else None
+                except ValueError:
+                    record = None
+                if record is None:
+                    break
+                if end == 0 and (record.get('version') != self.VERSION or record.get('orgs') != self.orgs):
+                    logging.warning(f'The journal {self.path} is for a different scan. Starting over.')
+                    return None
+                self.__apply(record)
+                end = f.tell()
+        return end or None
+
+    def __apply(self, record: dict) -> None:
+        kind = record['type']
+        if kind == 'configs':
+            self.__configs[record['org']] = record['configs']
+        elif kind == 'search_page':
+            results = [GithubSearchResult(*r) for r in record['results']]
+            self.__pages.setdefault((record['org'], record['search']), []).append(JournaledPage(results, record['next']))
+        elif kind == 'archive':
+            self.__archives[(record['org'], record['repo'])] = record
+        elif kind == 'container':
+            self.__containers[(record['org'], record['repo'], record['path'])] = record
+        elif kind == 'details':
+            self.__details[tuple(record['key'])] = record
+        else:
+            return
+        self.replayed += 1
+
+    def __write(self, record: dict) -> None:
+        self.__file.write(json.dumps(record) + '\n')
+        self.__file.flush()
+        now = time.monotonic()
+        if now - self.__last_sync >= self.sync_interval:
+            os.fsync(self.__file.fileno())
+            self.__last_sync = now
+
+    def get_configs(self, org: str) -> Optional[Dict[str, str]]:
+        """ Returns the nuget servers (index url: name) recorded for :param org, or None if discovery didn't finish. """
+        return self.__configs.get(org)
+
+    def put_configs(self, org: str, configs: Dict[str, str]) -> None:
+        self.__configs[org] = dict(configs)
+        self.__write({'type': 'configs', 'org': org, 'configs': configs})
+
+    def search_pages(self, org: str, search: str) -> List[JournaledPage]:
+        """ Returns the pages recorded for the :param search (e.g. a container type) in :param org, in order. """
+        return self.__pages.get((org, search), [])
+
+    def put_search_page(self, org: str, search: str, results: List[GithubSearchResult], next_url: str) -> None:
+        page = JournaledPage(results, next_url)
+        self.__pages.setdefault((org, search), []).append(page)
+        self.__write({'type': 'search_page', 'org': org, 'search': search, 'next': next_url,
+                      'results': [[r.name, r.repo, r.path, r.url, r.sha] for r in results]})
+
+    def get_archive(self, org: str, repo: str) -> Optional[Tuple[List[PackageContainer], Dict[str, str]]]:
+        """ Returns the containers and nuget.config servers recorded for the archive of :param repo, if it was read. """
+        record = self.__archives.get((org, repo))
+        if record is None:
+            return None
+        return [_container(c) for c in record['containers']], record['configs']
+
+    def put_archive(self, org: str, repo: str, containers: List[PackageContainer], configs: Dict[str, str]) -> None:
+        record = {'type': 'archive', 'org': org, 'repo': repo, 'configs': configs,
+                  'containers': [_container_record(c) for c in containers]}
+        self.__archives[(org, repo)] = record
+        self.__write(record)
+
+    def get_container(self, org: str, repo: str, path: str, sha: Optional[str]) -> Optional[PackageContainer]:
+        """ Returns the container recorded for :param path, unless it was parsed from a different blob :param sha. """
+        record = self.__containers.get((org, repo, path))
+        if record is None or (sha and record['sha'] and record['sha'] != sha):
+            return None
+        return _container(record)
+
+    def put_container(self, org: str, container: PackageContainer) -> None:
+        record = {'type': 'container', 'org': org, **_container_record(container)}
+        self.__containers[(org, container.repo, container.path)] = record
+        self.__write(record)
+
+    def get_details(self, key: tuple) -> Optional[Tuple[dict, Optional[dict]]]:
+        """ Returns the (details, validators) recorded for the package :param key (see :attr Package.lookup_key). """
+        record = self.__details.get((key[0], key[1] or ''))
+        return (record['details'], record['validators']) if record else None
+
+    def put_details(self, package: Package, validators: Optional[dict] = None) -> None:
+        key = [package.lookup_key[0], package.lookup_key[1] or '']
+        record = {'type': 'details', 'key': key, 'details': package.get_details(), 'validators': validators}
+        self.__details[tuple(key)] = record
+        self.__write(record)
+
+    def close(self) -> None:
+        if not self.__file.closed:
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+            self.__file.close()
+
+    def finish(self) -> None:
+        """ Closes and removes the journal once the scan it records is complete. """
+        self.close()
+        os.remove(self.path)
+
+
+def _container_record(container: PackageContainer) -> dict:
+    return {
+        'repo': container.repo,
+        'path': container.path,
+        'name': container.name,
+        'sha': container.sha,
+        'kind': type(container).__name__,
+        'packages': [[p.name, p.version, p.target_framework] for p in container.packages],
+    }
+
+
+def _container(record: dict) -> PackageContainer:
+    packages = [Package(name, version, framework) for name, version, framework in record['packages']]
+    return CONTAINER_TYPES[record['kind']].from_packages(packages, record['name'], record['repo'], record['path'], record['sha'])
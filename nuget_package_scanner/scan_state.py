@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+from .nuget import NetCoreProject, Package, PackageConfig, PackageContainer
+
+CONTAINER_TYPES = {t.__name__: t for t in (NetCoreProject, PackageConfig)}
+
+
+class ScanDelta:
+    """ What changed between the previous scan and this one. """
+    def __init__(self):
+        self.added_files: List[List[str]] = [] # [repo, path]
+        self.changed_files: List[List[str]] = []
+        self.removed_files: List[List[str]] = []
+        self.unchanged_files = 0
+        self.changed_packages: List[dict] = [] # {'name', 'version', 'changes': {field: [old, new]}}
+
+    def to_json(self) -> dict:
+        return {
+            'files': {
+                'added': self.added_files,
+                'changed': self.changed_files,
+                'removed': self.removed_files,
+                'unchanged': self.unchanged_files,
+            },
+            'packages': self.changed_packages,
+        }
+
+    def write(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_json(), f, indent=2)
+
+
+class ScanState:
+    """
+    Persistent state between scans of an org, stored as a json file.
+
+    - Project files are keyed by (repo, path) and hold the git blob sha they were parsed from along with the parsed
+      package list. A file whose sha hasn't changed doesn't need to be downloaded or parsed again.
+    - Package details are keyed by (id, version) and hold the validators (etag/last_modified) of the registration index
+      they were computed from. Details whose registration index hasn't changed don't need to be computed again.
+
+    Call :meth finish once the scan is complete to compute the :class ScanDelta and save the state.
+    """
+    VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self.__files: Dict[str, dict] = {}
+        self.__packages: Dict[str, dict] = {}
+        self.__seen_files = set()
+        self.delta = ScanDelta()
+        self.__load()
+
+    def __load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            logging.warning(f'Ignoring unreadable scan state {self.path}. A full scan will be run.')
+            return
+        if state.get('version') != self.VERSION:
+            return
+        self.__files = state.get('files', {})
+        self.__packages = state.get('packages', {})
+
+    @staticmethod
+    def __file_key(repo: str, path: str) -> str:
+        return f'{repo}\n{path}'
+
+    @staticmethod
+    def __package_key(key: tuple) -> str:
+        return f'{key[0]}\n{key[1] or ""}'
+
+    def get_container(self, repo: str, path: str, sha: Optional[str]) -> Optional[PackageContainer]:
+        """ Returns the container parsed previously from the same blob :param sha or None if the file has changed. """
+        key = self.__file_key(repo, path)
+        self.__seen_files.add(key)
+        record = self.__files.get(key)
+        if not sha or not record or record['sha'] != sha or record['type'] not in CONTAINER_TYPES:
+            return None
+        self.delta.unchanged_files += 1
+        packages = [Package(name, version, framework) for name, version, framework in record['packages']]
+        return CONTAINER_TYPES[record['type']].from_packages(packages, record['name'], repo, path, sha)
+
+    def put_container(self, container: PackageContainer) -> None:
+        """
+        Records the packages parsed from :param container along with its :attr PackageContainer.sha. Containers without
+        a sha are recorded too (so they aren't reported as added again), but are compared on their packages and are
+        never reused.
+        """
+        sha = container.sha
+        key = self.__file_key(container.repo, container.path)
+        self.__seen_files.add(key)
+        previous = self.__files.get(key)
+        packages = [[p.name, p.version, p.target_framework] for p in container.packages]
+        if previous is None:
+            self.delta.added_files.append([container.repo, container.path])
+        elif sha and previous['sha'] and previous['sha'] != sha:
+            self.delta.changed_files.append([container.repo, container.path])
+        elif not (sha and previous['sha']):
+            if previous['packages'] != packages:
+                self.delta.changed_files.append([container.repo, container.path])
+            else:
+                self.delta.unchanged_files += 1
+        if type(container).__name__ not in CONTAINER_TYPES:
+            return
+        self.__files[key] = {
+            'sha': sha,
+            'type': type(container).__name__,
+            'name': container.name,
+            'packages': packages,
+        }
+
+    def get_details(self, key: tuple, validators: Optional[dict]) -> Optional[dict]:
+        """ Returns the details stored for the package :param key if they came from the same registration index. """
+        record = self.__packages.get(self.__package_key(key))
+        if not validators or not record or record.get('validators') != validators:
+            return None
+        return record['details']
+
+    def put_details(self, package: Package, validators: Optional[dict]) -> None:
+        key = self.__package_key(package.lookup_key)
+        details = package.get_details()
+        previous = self.__packages.get(key)
+        if previous:
+            changes = {f: [previous['details'].get(f), v] for f, v in details.items() if previous['details'].get(f) != v}
+            if changes:
+                self.delta.changed_packages.append({'name': package.name, 'version': package.version, 'changes': changes})
+        self.__packages[key] = {'details': details, 'validators': validators}
+
+    def finish(self) -> ScanDelta:
+        """ Records files that weren't seen in this scan as removed and saves the state. """
+        for key in list(self.__files.keys()):
+            if key not in self.__seen_files:
+                self.delta.removed_files.append(key.split('\n', 1))
+                del self.__files[key]
+        self.save()
+        return self.delta
+
+    def save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'version': self.VERSION, 'files': self.__files, 'packages': self.__packages}, f)
+        os.replace(tmp_path, self.path)
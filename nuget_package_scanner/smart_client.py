@@ -1,12 +1,28 @@
 import asyncio
+import json
 import logging
-from typing import Dict, Optional
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
 from urllib.parse import urlparse
 import urllib.parse
 
 import aiohttp
-from async_lru import alru_cache
-from tenacity import before_log, retry, retry_if_exception_type, stop_after_attempt, wait_random, TryAgain
+from tenacity import RetryCallState, before_log, retry, retry_if_exception_type, stop_after_attempt, wait_random, TryAgain
+
+from .host_limiter import HostLimiter, HostLimiters
+from .http_cache import HttpCache
+from .json_projection import REGISTRATION_KEYS, loads_projected, read_projected_json
+from .metrics import Metrics
+from .response_cache import CacheNamespace, ResponseCache, cached_response
+from .tracing import span
+
+
+RETRIES_METRIC = 'http_retries_total'
+
+
+def _count_retry(retry_state: RetryCallState) -> None:
+    client, url = retry_state.args[0], retry_state.args[1]
+    client.metrics.families[RETRIES_METRIC].labels(urlparse(url).netloc).inc()
 
 
 class SmartClient:
@@ -16,8 +32,17 @@ class SmartClient:
     
     The get method includes some basic retry logic that should cover the case in which a resource is temporarily
     unavailable and is not memoized. The get_as_json and get_as_text methods are memoized and will only result
-    in 1 external call to fetch the matching resource per application session. See async_lru documentation for a
-    a description of how to flush cache if necessary.
+    in 1 external call to fetch the matching resource per application session. Memoized responses are held in a
+    :class ResponseCache that can be given an overall byte budget and per :class CacheNamespace budgets, in which case
+    the least recently used responses are evicted (and re-fetched if needed again).
+
+    If a cache_dir is provided, response bodies are also persisted to disk (see :class HttpCache) and revalidated
+    with the server on the next application session using If-None-Match/If-Modified-Since. A 304 response is
+    served from disk.
+
+    Every request is recorded in :attr metrics (a :class Metrics registry, shared with the clients built on top of this
+    one): request counts by host and status, latency, time spent waiting for the host limiter, response bytes (as
+    reported by Content-Length) and retries, as well as the response cache hits and misses per :class CacheNamespace.
 
     >>> async with SmartClient() as sc
     >>>     # initial call to server is wrapped in retry logic (will retry 3 times)
@@ -25,27 +50,50 @@ class SmartClient:
     >>>     # subsequent call is retrieved from cache
     >>>     response_json2 = await sc.get_as_json('http://site.com/resource')
     '''
-    clients: Dict[str, aiohttp.ClientSession] = {} # Dictionary to cache clients per base url to better support connection pooling    
+    def __init__(self, cache_dir: Optional[str] = None, cache_max_bytes: Optional[int] = None,
+                 namespace_max_bytes: Optional[Dict[CacheNamespace, int]] = None, metrics: Optional[Metrics] = None):
+        # Dictionary to cache clients per base url to better support connection pooling. This is per instance so that
+        # a client never hands out sessions that another (closed) client created.
+        self.clients: Dict[str, aiohttp.ClientSession] = {}
+        self.http_cache: Optional[HttpCache] = HttpCache(cache_dir) if cache_dir else None
+        self.response_cache = ResponseCache(cache_max_bytes, namespace_max_bytes)
+        self.host_limiters = HostLimiters()
+        self.metrics = metrics or Metrics()
+        self.__requests = self.metrics.counter('http_requests_total', 'Http requests by host and status (error for connection errors and timeouts)', ['host', 'status'])
+        self.__latency = self.metrics.histogram('http_request_duration_seconds', 'Time until the response headers were received', ['host'])
+        self.__limiter_wait = self.metrics.histogram('http_limiter_wait_seconds', 'Time spent waiting for the host limiter to allow a request', ['host'])
+        self.__bytes = self.metrics.counter('http_response_bytes_total', 'Response bytes (from Content-Length)', ['host'])
+        self.__retries = self.metrics.counter(RETRIES_METRIC, 'Requests retried after a 5xx or 429', ['host'])
+        self.metrics.add_collector(self.__collect_cache_metrics)
+        self.metrics.add_section('hosts', self.host_report)
     
     async def __aenter__(self):
         return self
     
     async def __aexit__(self, exc_type, exc_value, traceback):
-        # The following 2 close() methods are present as a result of the methods being wrapped by alru_cache
+        # The following 2 close() methods cancel any memoized requests that are still in flight
         # pylint: disable=no-member        
         await self.get_as_text.close()
         await self.get_as_json.close()
+        await self.get_as_registration_json.close()
         # pylint: enable=no-member
         await self.close()                     
         
     def get_aiohttp_client(self, url: str) -> aiohttp.ClientSession:        
-        u = urlparse(url)
-        key = f'{u.scheme}{u.netloc}'        
+        key = self.__host_key(url)
         if self.clients.get(key) is None:
-            conn = aiohttp.TCPConnector(limit=100) #TODO: Dial in pool size
-            timeout = aiohttp.ClientTimeout(total=20) #TODO: Dial in timeout
+            # The pool size and timeout are upper bounds. Per-request concurrency and timeouts are set by the host limiter.
+            conn = aiohttp.TCPConnector(limit=HostLimiter.MAX_LIMIT)
+            timeout = aiohttp.ClientTimeout(total=self.host_limiters.get(key).max_timeout)
             self.clients[key] = aiohttp.ClientSession(connector=conn,timeout=timeout)
         return self.clients[key]
+
+    def get_host_limiter(self, url: str) -> HostLimiter:
+        return self.host_limiters.get(self.__host_key(url))
+
+    def __host_key(self, url: str) -> str:
+        u = urlparse(url)
+        return f'{u.scheme}{u.netloc}'
     
     async def close(self):
         print(f'Closing {len(self.clients)} client sessions...')        
@@ -55,37 +103,156 @@ class SmartClient:
             await self.clients[key].close()
         self.clients = {}
     
-    @alru_cache(maxsize=None)
+    @cached_response
     async def get_as_text(self, url: str, ignore_404 = True,  headers: Optional[dict] = None) -> str:
-        response = await self.get(url, ignore_404, headers)
-        if response:
-            async with response:      
-                return await response.text()        
+        if self.http_cache:
+            return await self.__get_revalidated_text(url, ignore_404, headers)
+        return await self.get(url, ignore_404, headers, read=lambda response: response.text())
     
-    @alru_cache(maxsize=None)    
+    @cached_response
     async def get_as_json(self, url: str, ignore_404 = True, headers: Optional[dict] = None) -> dict:
-        response = await self.get(url, ignore_404, headers)
-        if response:
-            async with response:      
-                return await response.json()            
+        if self.http_cache:
+            text = await self.__get_revalidated_text(url, ignore_404, headers)
+            return json.loads(text) if text else None
+        return await self.get(url, ignore_404, headers, read=lambda response: response.json())
+
+    @cached_response
+    async def get_as_registration_json(self, url: str, ignore_404 = True, headers: Optional[dict] = None) -> dict:
+        """
+        Same as :meth get_as_json for Nuget registration indexes and pages, except that only the fields in
+        :const REGISTRATION_KEYS are decoded and cached. See :func read_projected_json.
+        """
+        if self.http_cache:
+            text = await self.__get_revalidated_text(url, ignore_404, headers)
+            return loads_projected(text, REGISTRATION_KEYS) if text else None
+        return await self.get(url, ignore_404, headers,
+                              read=lambda response: read_projected_json(response.content, REGISTRATION_KEYS))
+
+    def invalidate(self, url: str) -> None:
+        """ Drops the responses cached for :param url, in memory and in the http cache, so the next GET goes to the server. """
+        self.response_cache.invalidate_url(url)
+        if self.http_cache:
+            self.http_cache.invalidate(url)
+
+    def get_validators(self, url: str) -> Optional[dict]:
+        """
+        Returns the validators (etag and last_modified) of the response stored in the http cache for :param url.
+        Returns None if there is no http cache or nothing has been stored for the url.
+        """
+        entry = self.http_cache.load(url) if self.http_cache else None
+        if entry:
+            return {'etag': entry.etag, 'last_modified': entry.last_modified}
+
+    def host_report(self) -> Dict[str, dict]:
+        """
+        Summarizes :attr metrics per host: how many requests were made, how many failed (5xx, 429 or no response), how
+        many were retried, and how long they took. Useful to tell which server made a scan slow.
+        """
+        report: Dict[str, dict] = {}
+        for labels, counter in self.__requests.items():
+            host = report.setdefault(labels['host'], {'requests': 0, 'errors': 0, 'statuses': {}})
+            host['requests'] += int(counter.value)
+            host['statuses'][labels['status']] = int(counter.value)
+            if not labels['status'].isdigit() or int(labels['status']) >= 500 or labels['status'] == '429':
+                host['errors'] += int(counter.value)
+        for host, values in report.items():
+            latency = self.__latency.labels(host)
+            values.update({
+                'retries': int(self.__retries.labels(host).value),
+                'bytes': int(self.__bytes.labels(host).value),
+                'seconds': latency.sum,
+                'p50_s': latency.quantile(0.5),
+                'p99_s': latency.quantile(0.99),
+                'limiter_wait_s': self.__limiter_wait.labels(host).sum,
+            })
+        return report
+
+    def __collect_cache_metrics(self) -> None:
+        counters = {field: self.metrics.counter(f'response_cache_{field}_total', f'Response cache {field} per resource type', ['namespace'])
+                    for field in ('hits', 'misses', 'evictions')}
+        size = self.metrics.gauge('response_cache_bytes', 'Estimated bytes held by the response cache per resource type', ['namespace'])
+        for namespace in CacheNamespace:
+            info = self.response_cache.info(namespace)
+            for field, family in counters.items():
+                family.labels(namespace.value).value = getattr(info, field)
+            size.labels(namespace.value).set(info.bytes)
+
+    async def __get_revalidated_text(self, url: str, ignore_404 = True, headers: Optional[dict] = None) -> str:
+        """
+        Makes a conditional GET using the validators stored in the http cache (if any). The body is served from disk
+        on a 304 and stored to disk on a 200 that includes validators.
+        """
+        entry = self.http_cache.load(url)
+        request_headers = dict(headers) if headers else {}
+        if entry:
+            request_headers.update(entry.conditional_headers())
+
+        async def read(response: aiohttp.ClientResponse) -> str:
+            if response.status == 304 and entry:
+                return entry.read_body()
+            body = await response.text()
+            self.http_cache.store(url, body, response.headers)
+            return body
+        return await self.get(url, ignore_404, request_headers, read=read)
 
-    # Retry a few times in the event that it's some kind of connection error or 5xx error
-    # This method should not retry in the event of any 4xx errors
+    # Retry a few times in the event that it's some kind of connection error, 5xx or 429 error
+    # This method should not retry in the event of any other 4xx errors
     @retry(stop=stop_after_attempt(3), retry=retry_if_exception_type(TryAgain), \
-        wait=wait_random(min=1, max=3), before=before_log(logging.getLogger(), logging.DEBUG))
-    async def get(self, url: str, ignore_404 = True, headers: Optional[dict] = None) -> aiohttp.ClientResponse:             
+        wait=wait_random(min=1, max=3), before=before_log(logging.getLogger(), logging.DEBUG), before_sleep=_count_retry)
+    async def get(self, url: str, ignore_404 = True, headers: Optional[dict] = None,
+                  retry_rate_limits: bool = True,
+                  read: Optional[Callable[[aiohttp.ClientResponse], Awaitable[Any]]] = None) -> Any:
+        """
+        :param retry_rate_limits If False, a 429 is raised to the caller (as an aiohttp.ClientResponseError) instead of
+        being retried here, for callers that schedule around the server's rate limits themselves (see :class GithubClient).
+        :param read If provided, the body is read with it (e.g. lambda response: response.text()) while the request
+        still holds its host limiter slot, and what it returns is returned instead of the response. Otherwise the slot
+        is released as soon as the headers are received and the caller reads (and releases) the response, so slow
+        bodies aren't accounted for by the limiter.
+        """
         assert isinstance(url, str) and url, "url must be a non-empty string"
         client = self.get_aiohttp_client(url)
+        limiter = self.get_host_limiter(url)
+        host = urlparse(url).netloc
+        queued = time.perf_counter()
         try:
-            response = await client.get(url,headers=headers)
-            if ignore_404 and response.status == 404:
-                logging.debug(f'404 GET {url}')
-                return            
-            if response.status != 200:             
-                raise response.raise_for_status()            
-            logging.debug(f'200 GET {url}')     
-            return response        
+            with span('GET', 'http', url=url) as s:
+                async with limiter.request() as outcome:
+                    start = time.perf_counter()
+                    self.__limiter_wait.labels(host).observe(start - queued)
+                    try:
+                        response = await client.get(url,headers=headers,timeout=aiohttp.ClientTimeout(total=limiter.timeout))
+                    except (aiohttp.ClientError, asyncio.TimeoutError):
+                        self.__requests.labels(host, 'error').inc()
+                        raise
+                    finally:
+                        self.__latency.labels(host).observe(time.perf_counter() - start)
+                    outcome.observe(response)
+                    s.set(status=response.status, limiter_wait_ms=round((start - queued) * 1000, 3))
+                    response = self.__check_response(url, host, response, ignore_404)
+                    if response is None or read is None:
+                        return response
+                    async with response:
+                        return await read(response)
         except aiohttp.ClientResponseError as e:            
             logging.exception(e)
-            raise e if e.status < 500 else TryAgain # Explicit call to retry for 5xx errors
+            # Explicit call to retry for 5xx and 429 errors. The host limiter will have backed off (and honored any Retry-After)
+            raise TryAgain if e.status >= 500 or (e.status == 429 and retry_rate_limits) else e
 
+    def __check_response(self, url: str, host: str, response: aiohttp.ClientResponse,
+                         ignore_404: bool) -> Optional[aiohttp.ClientResponse]:
+        self.__requests.labels(host, response.status).inc()
+        if isinstance(response.content_length, int): # None for chunked responses
+            self.__bytes.labels(host).inc(response.content_length)
+        if ignore_404 and response.status == 404:
+            logging.debug(f'404 GET {url}')
+            response.release()
+            return
+        if response.status == 304:
+            # Only returned for conditional requests. The caller is expected to serve the body from its own cache.
+            logging.debug(f'304 GET {url}')
+            return response
+        if response.status != 200:             
+            raise response.raise_for_status()            
+        logging.debug(f'200 GET {url}')     
+        return response
@@ -0,0 +1,136 @@
+import fnmatch
+import hashlib
+import logging
+import os
+import posixpath
+import tarfile
+import tempfile
+from typing import IO, AsyncGenerator, Iterator, Optional, Tuple, Type, Union
+
+from .nuget import NetCoreProject, NugetConfig, PackageConfig, PackageContainer
+
+# Patterns are matched case-insensitively against the file name of each archive member
+CONTAINER_PATTERNS = [
+    ('*.csproj', NetCoreProject),
+    ('directory.*.props', NetCoreProject),
+    ('packages.config', PackageConfig),
+]
+NUGET_CONFIG_PATTERN = 'nuget.config'
+ARCHIVE_EXTENSIONS = ('.tar.gz', '.tgz', '.tar')
+
+
+def container_type_for(path: str) -> Optional[Type[PackageContainer]]:
+    name = posixpath.basename(path).lower()
+    for pattern, container_type in CONTAINER_PATTERNS:
+        if fnmatch.fnmatchcase(name, pattern):
+            return container_type
+    return None
+
+
+def is_nuget_config(path: str) -> bool:
+    return posixpath.basename(path).lower() == NUGET_CONFIG_PATTERN
+
+
+def git_blob_sha(data: bytes) -> str:
+    """ Returns the sha git would assign to a blob with the contents :param data (the same sha code search returns). """
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+def _split_archive_root(name: str) -> Tuple[str, str]:
+    """ Splits the member :param name into its top-level component and the rest of the path. """
+    top, _, rest = name.strip('/').partition('/')
+    return top, rest
+
+
+def iter_tarball(fileobj: IO[bytes], repo: str) -> Iterator[Union[PackageContainer, NugetConfig]]:
+    """
+    Streams through a (optionally compressed) tar archive of :param repo and yields a :class PackageContainer for every
+    project file and a :class NugetConfig for every nuget.config. Only matching members are read; nothing is written
+    to disk. Members that fail to parse are logged and skipped.
+    Github archives put every file under a single {owner}-{repo}-{sha}/ directory, which is left out of the paths. It
+    is only stripped if every member shares it, so archives without a single top-level directory keep their paths.
+    """
+    matched = []
+    root = None
+    shared_root = True
+    with tarfile.open(fileobj=fileobj, mode='r|*') as tar:
+        for member in tar:
+            top, rest = _split_archive_root(member.name)
+            if root is None:
+                root = top
+            if top != root or not (rest or member.isdir()):
+                shared_root = False
+            if not member.isfile():
+                continue
+            # matching only looks at the file name, so the root can be decided once every member has been seen
+            if container_type_for(member.name) is None and not is_nuget_config(member.name):
+                continue
+            matched.append((member.name, tar.extractfile(member).read()))
+    for name, data in matched:
+        path = _split_archive_root(name)[1] if shared_root else name.strip('/')
+        container_type = container_type_for(path)
+        try:
+            # the raw bytes are parsed as they are (lxml handles the encoding and any byte order mark)
+            if container_type:
+                container = container_type(data, posixpath.basename(path), repo, path)
+                container.sha = git_blob_sha(data)
+                yield container
+            else:
+                yield NugetConfig(data)
+        except Exception:
+            logging.warning(f'Skipped: Failed to parse {path} in the {repo} archive.')
+
+
+class DirectoryArchiveSource:
+    """
+    Reads repository archives from a local directory. The repository name is the archive file name without its
+    extension (e.g. my-repo.tar.gz). Useful for offline scans and testing.
+    """
+    def __init__(self, directory: str):
+        assert os.path.isdir(directory), f':param directory {directory} must be an existing directory.'
+        self.directory = directory
+
+    async def iter_repos(self, org: str) -> AsyncGenerator[str, None]:
+        for file_name in sorted(os.listdir(self.directory)):
+            for ext in ARCHIVE_EXTENSIONS:
+                if file_name.endswith(ext):
+                    yield file_name[:-len(ext)]
+                    break
+
+    async def open_archive(self, repo: str, org: Optional[str] = None) -> Optional[IO[bytes]]:
+        for ext in ARCHIVE_EXTENSIONS:
+            path = os.path.join(self.directory, repo + ext)
+            if os.path.exists(path):
+                return open(path, 'rb')
+        return None
+
+
+class GithubArchiveSource:
+    """
+    Downloads the default branch archive of every repository in a Github org. The (compressed) archive is spooled in
+    memory, spilling over to a temporary file only if it is larger than :param max_memory_bytes. It isn't parsed while
+    it downloads, since the Github host limiter slot is held until the body has been read.
+    """
+    def __init__(self, github, max_memory_bytes: int = 32 * 1024 * 1024):
+        self.github = github
+        self.max_memory_bytes = max_memory_bytes
+        self.__full_names = {}
+
+    async def iter_repos(self, org: str) -> AsyncGenerator[str, None]:
+        async for repo_json in self.github.iter_org_repos(org):
+            if repo_json.get('size') == 0:
+                continue # empty repositories don't have an archive
+            self.__full_names[repo_json['name']] = repo_json['full_name']
+            yield repo_json['name']
+
+    async def open_archive(self, repo: str, org: Optional[str] = None) -> Optional[IO[bytes]]:
+        f = tempfile.SpooledTemporaryFile(max_size=self.max_memory_bytes)
+        try:
+            # repositories with the same name can exist in more than one org
+            full_name = f'{org}/{repo}' if org else self.__full_names.get(repo, repo)
+            await self.github.download_repo_tarball(full_name, f)
+        except BaseException:
+            f.close()
+            raise
+        f.seek(0)
+        return f
@@ -0,0 +1,185 @@
+import asyncio
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+import weakref
+from typing import Dict, Iterator, List, Optional, Tuple
+
+TRACE_FORMATS = ('chrome', 'otlp')
+
+
+class Span:
+    """ A named, timed unit of work. :attr args are shown next to the span in a trace viewer. """
+    __slots__ = ('name', 'category', 'args', 'span_id', 'parent_id', 'tid', 'start', 'end')
+
+    def __init__(self, name: str, category: str, args: dict, span_id: int, parent_id: Optional[int], tid: int, start: float):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.tid = tid
+        self.start = start
+        self.end: Optional[float] = None
+
+    def set(self, **args) -> None:
+        self.args.update(args)
+
+
+class _NullSpan:
+    """ Stands in for a :class Span when tracing is off, so instrumented code doesn't need to check. """
+    def set(self, **args) -> None:
+        pass
+
+
+_NULL_SPAN = contextlib.nullcontext(_NullSpan())
+
+# (tracer, current span id) for the running task. Tasks copy the context they are created in, so a task's spans are
+# children of the span that was open when it was created.
+_current: contextvars.ContextVar[Optional[Tuple['Tracer', Optional[int]]]] = contextvars.ContextVar('tracing', default=None)
+
+
+def span(name: str, category: str = 'scan', **args):
+    """
+    Returns a context manager that records a :class Span under the active :class Tracer (see :meth Tracer.activate),
+    as a child of the span that is open in the calling task. Does nothing (cheaply) if tracing isn't active.
+
+    >>> with span('feed probe', 'nuget', feed=index_url) as s:
+    >>>     found = await server.has_package(package_id)
+    >>>     s.set(found=found)
+    """
+    current = _current.get()
+    if current is None:
+        return _NULL_SPAN
+    return current[0].span(name, category, **args)
+
+
+class Tracer:
+    """
+    Records spans for every instrumented step of a scan (search pages, file fetches, parses, feed probes, registration
+    fetches, http requests...) with parent/child links, and exports them as a Chrome trace (open it in Perfetto or
+    chrome://tracing) or as OTLP json.
+
+    In the Chrome trace, each asyncio task gets its own row (named after the task), so spans that run one after another
+    in a task line up left to right and a long row of short, back to back spans is a serial await chain. Spans whose
+    parent is in another task are connected to it with an arrow.
+
+    >>> tracer = Tracer()
+    >>> with tracer.activate():
+    >>>     await scan()
+    >>> tracer.write('scan.trace.json')
+    """
+    def __init__(self, process_name: str = 'nuget-package-scanner'):
+        self.process_name = process_name
+        self.spans: List[Span] = []
+        self.__ids = itertools.count(1)
+        self.__tids = itertools.count(1)
+        self.__task_tids: 'weakref.WeakKeyDictionary[asyncio.Task, int]' = weakref.WeakKeyDictionary()
+        self.__thread_tids: Dict[int, int] = {}
+        self.__names: Dict[int, str] = {}
+        self.__origin = time.perf_counter()
+        self.__origin_ns = time.time_ns()
+        self.__trace_id = os.urandom(16).hex()
+
+    @contextlib.contextmanager
+    def activate(self) -> Iterator[None]:
+        """ Makes this the tracer that :func span records to, in this task and any task created from it. """
+        previous = _current.get()
+        _current.set((self, None))
+        try:
+            yield
+        finally:
+            # not reset(token): an async generator may be closed from another context
+            _current.set(previous)
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str = 'scan', **args) -> Iterator[Span]:
+        current = _current.get()
+        parent_id = current[1] if current and current[0] is self else None
+        s = Span(name, category, args, next(self.__ids), parent_id, self.__tid(), time.perf_counter() - self.__origin)
+        self.spans.append(s)
+        _current.set((self, s.span_id))
+        try:
+            yield s
+        except BaseException as e:
+            s.args['error'] = type(e).__name__
+            raise
+        finally:
+            s.end = time.perf_counter() - self.__origin
+            _current.set(current)
+
+    def __tid(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError: # no running loop (e.g. a worker thread)
+            task = None
+        if task is not None:
+            tid = self.__task_tids.get(task)
+            if tid is None:
+                tid = self.__task_tids[task] = next(self.__tids)
+                self.__names[tid] = task.get_name()
+            return tid
+        thread = threading.current_thread()
+        tid = self.__thread_tids.get(thread.ident)
+        if tid is None:
+            tid = self.__thread_tids[thread.ident] = next(self.__tids)
+            self.__names[tid] = thread.name
+        return tid
+
+    def to_chrome_trace(self) -> dict:
+        """ Returns the spans in the Chrome trace event format (https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU). """
+        pid = os.getpid()
+        events = [{'ph': 'M', 'name': 'process_name', 'pid': pid, 'tid': 0, 'args': {'name': self.process_name}}]
+        events.extend({'ph': 'M', 'name': 'thread_name', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                      for tid, name in self.__names.items())
+        tids = {s.span_id: s.tid for s in self.spans}
+        for s in self.spans:
+            end = s.end if s.end is not None else time.perf_counter() - self.__origin
+            events.append({'ph': 'X', 'name': s.name, 'cat': s.category, 'pid': pid, 'tid': s.tid,
+                           'ts': s.start * 1e6, 'dur': (end - s.start) * 1e6,
+                           'args': {**s.args, 'span_id': s.span_id, 'parent_id': s.parent_id}})
+            parent_tid = tids.get(s.parent_id)
+            if parent_tid is not None and parent_tid != s.tid:
+                # a flow arrow from the parent to a child that runs in another task
+                flow = {'name': 'spawn', 'cat': s.category, 'pid': pid, 'id': s.span_id, 'ts': s.start * 1e6}
+                events.append({**flow, 'ph': 's', 'tid': parent_tid})
+                events.append({**flow, 'ph': 'f', 'bp': 'e', 'tid': s.tid})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def to_otlp(self) -> dict:
+        """ Returns the spans as an OTLP/json ExportTraceServiceRequest (one trace per tracer), e.g. for Jaeger. """
+        def nanos(seconds: float) -> str:
+            return str(self.__origin_ns + int(seconds * 1e9))
+
+        spans = []
+        for s in self.spans:
+            end = s.end if s.end is not None else time.perf_counter() - self.__origin
+            spans.append({
+                'traceId': self.__trace_id,
+                'spanId': f'{s.span_id:016x}',
+                'parentSpanId': f'{s.parent_id:016x}' if s.parent_id else '',
+                'name': s.name,
+                'kind': 1, # SPAN_KIND_INTERNAL
+                'startTimeUnixNano': nanos(s.start),
+                'endTimeUnixNano': nanos(end),
+                'attributes': [{'key': k, 'value': {'stringValue': str(v)}} for k, v in {'category': s.category, **s.args}.items()],
+            })
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.process_name}}]},
+            'scopeSpans': [{'scope': {'name': 'nuget_package_scanner'}, 'spans': spans}],
+        }]}
+
+    def write(self, path: str, format: Optional[str] = None) -> None:
+        """
+        Writes the trace to :param path in one of :const TRACE_FORMATS. By default, the format is OTLP if the path ends
+        with .otlp.json and Chrome otherwise.
+        """
+        format = format or ('otlp' if path.lower().endswith('.otlp.json') else 'chrome')
+        assert format in TRACE_FORMATS, f'Unsupported trace format {format}. Use one of {", ".join(TRACE_FORMATS)}.'
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace() if format == 'chrome' else self.to_otlp(), f)
@@ -8,7 +8,6 @@ REQUIRES = [
     "aiohttp>=3,<4",
     "cchardet>=2.1.6",
     "aiodns>=2.0.0",
-    "async-lru>=1.0.2",
     "lxml>=4.5.1",
     "tenacity>=6.2.0",
 ]
@@ -24,6 +23,9 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/doneholmes/nuget-package-scanner",
     install_requires=REQUIRES,
+    extras_require={
+        "streaming": ["ijson>=3.1"], # incremental decoding of nuget registration json
+    },
     packages=setuptools.find_packages(),
     classifiers=[
         "Programming Language :: Python :: 3",
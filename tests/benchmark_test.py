@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from nuget_package_scanner.benchmark import HostProfile, StandIn, SyntheticOrg, compare, run_benchmark
+from nuget_package_scanner.pipeline import ScanSource
+
+
+class TestSyntheticOrg(unittest.TestCase):
+
+    def test_is_deterministic(self):
+        a = SyntheticOrg(repos=3, projects_per_repo=2, packages=20, references_per_project=5)
+        b = SyntheticOrg(**a.arguments())
+        self.assertEqual([f.contents for f in a.all_files()], [f.contents for f in b.all_files()])
+        self.assertEqual(len(a.all_files()), 6)
+        self.assertEqual(a.versions('SYNTHETIC.PACKAGE00003'), b.versions('synthetic.package00003'))
+
+
+class TestBenchmark(IsolatedAsyncioTestCase):
+
+    async def test_scans_the_synthetic_org(self):
+        org = SyntheticOrg(repos=4, projects_per_repo=2, packages=30, references_per_project=6, max_versions=200)
+        for source, flat_container in [(ScanSource.SEARCH, True), (ScanSource.TARBALL, False)]:
+            standin = StandIn(org, flat_container=flat_container, search_page_size=3)
+            results = await run_benchmark(standin, source, in_process=True)
+            self.assertEqual(results['containers'], results['expected_containers'])
+            self.assertEqual(results['packages_with_details'], results['package_references'])
+            self.assertGreater(results['hosts']['nuget']['requests'], 0)
+            self.assertEqual(results['hosts']['nuget']['errors'], 0)
+            self.assertEqual(sum(h['requests'] for h in results['client']['hosts'].values()), results['requests'])
+            self.assertEqual(set(results['client']['phases']), {'discover_configs', 'initialize_feeds', 'scan'})
+
+    async def test_injected_errors_are_retried(self):
+        org = SyntheticOrg(repos=2, projects_per_repo=1, packages=10, references_per_project=3)
+        standin = StandIn(org, raw=HostProfile(error_rate=0.1))
+        results = await run_benchmark(standin, in_process=True)
+        self.assertEqual(results['containers'], results['expected_containers'])
+
+    async def test_trace(self):
+        org = SyntheticOrg(repos=2, projects_per_repo=1, packages=10, references_per_project=3)
+        with tempfile.TemporaryDirectory() as d:
+            await run_benchmark(StandIn(org), in_process=True, trace_file=os.path.join(d, 'trace.json'))
+            with open(os.path.join(d, 'trace.json')) as f:
+                events = json.load(f)['traceEvents']
+        names = {e['name'] for e in events if e['ph'] == 'X'}
+        self.assertTrue({'scan', 'search page', 'file fetch', 'parse', 'feed probe', 'package details', 'GET'} <= names)
+
+    async def test_incremental_scan(self):
+        org = SyntheticOrg(repos=3, projects_per_repo=2, packages=10, references_per_project=3)
+        with tempfile.TemporaryDirectory() as d:
+            options = {'state_file': os.path.join(d, 'state.json'), 'delta_file': os.path.join(d, 'delta.json')}
+            first = await run_benchmark(StandIn(org), in_process=True, **options)
+            second = await run_benchmark(StandIn(org), in_process=True, **options)
+            with open(options['delta_file']) as f:
+                delta = json.load(f)
+        self.assertEqual(second['containers'], first['containers'])
+        self.assertEqual(delta['files']['unchanged'], first['expected_containers'])
+        self.assertEqual(first['hosts']['raw']['requests'], first['expected_containers'])
+        self.assertEqual(second['hosts']['raw']['requests'], 0)
+
+    def test_compare(self):
+        self.assertEqual(compare({'wall_time_s': 2.0, 'requests': 10}, {'wall_time_s': 1.0, 'requests': 10}),
+                         {'wall_time_s': -0.5, 'peak_rss_mb': None, 'requests': 0.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from nuget_package_scanner.metrics import Metrics
+from nuget_package_scanner.nuget import CatalogMirror, Nuget, NugetServer, Package
+from nuget_package_scanner.nuget.catalog_mirror import version_key
+from nuget_package_scanner.smart_client import SmartClient
+
+
+def item(base: str, timestamp: str, package_id: str, version: str, type: str = "nuget:PackageDetails") -> dict:
+    return {"@id": f"{base}/data/{package_id.lower()}.{version}.json", "@type": type, "commitTimeStamp": timestamp,
+            "nuget:id": package_id, "nuget:version": version}
+
+
+class StandInFeed:
+    """ Serves a catalog (index + pages) from memory. Pages are added with :meth add_page. """
+    def __init__(self):
+        self.pages = []
+        self.requests = []
+        app = web.Application()
+        app.router.add_get('/catalog/index.json', self.index)
+        app.router.add_get('/catalog/page{n}.json', self.page)
+        self.server = TestServer(app)
+
+    @property
+    def catalog_url(self) -> str:
+        return str(self.server.make_url('/catalog/index.json'))
+
+    def add_page(self, items):
+        self.pages.append(items(str(self.server.make_url('/catalog'))))
+
+    async def index(self, request):
+        self.requests.append(request.path)
+        base = self.server.make_url('/catalog')
+        return web.json_response({"items": [{"@id": f"{base}/page{n}.json", "commitTimeStamp": page[-1]["commitTimeStamp"]}
+                                            for n, page in enumerate(self.pages)]})
+
+    async def page(self, request):
+        self.requests.append(request.path)
+        return web.json_response({"items": self.pages[int(request.match_info['n'])]})
+
+
+class TestCatalogMirror(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.feed = StandInFeed()
+        await self.feed.server.start_server()
+        self.feed.add_page(lambda b: [item(b, "2020-01-01T00:00:00Z", "Contoso.Core", "1.0.0"),
+                                      item(b, "2020-02-03T00:00:00Z", "Contoso.Core", "1.1.0-beta")])
+        self.feed.add_page(lambda b: [item(b, "2020-03-04T00:00:00Z", "Contoso.Core", "1.1.0"),
+                                      item(b, "2020-03-05T00:00:00Z", "Contoso.Data", "2.0.0")])
+        self.server = MagicMock(NugetServer)
+        self.server.index_url = NugetServer.DEFAULT_SERVICE_INDEX_URL
+        self.server.catalog_url = self.feed.catalog_url
+        self.dir = tempfile.TemporaryDirectory()
+        self.client = SmartClient()
+        self.mirror = CatalogMirror(os.path.join(self.dir.name, 'catalog.db'), self.client)
+
+    async def asyncTearDown(self):
+        self.mirror.close()
+        await self.client.close()
+        await self.feed.server.close()
+        self.dir.cleanup()
+
+    async def test_versions_are_unknown_until_synced(self):
+        self.assertIsNone(self.mirror.get_versions(self.server.index_url, 'Contoso.Core'))
+        self.assertEqual(await self.mirror.sync(self.server), 4)
+        self.assertEqual(sorted(self.mirror.get_versions(self.server.index_url, 'contoso.core')),
+                         [("1.0.0", "2020-01-01"), ("1.1.0", "2020-03-04"), ("1.1.0-beta", "2020-02-03")])
+        self.assertEqual(self.mirror.get_versions(self.server.index_url, 'Missing'), [])
+
+    async def test_sync_resumes_from_cursor(self):
+        await self.mirror.sync(self.server)
+        self.assertEqual(self.mirror.cursor(self.server.index_url), "2020-03-05T00:00:00Z")
+        self.feed.add_page(lambda b: [item(b, "2020-04-01T00:00:00Z", "Contoso.Core", "1.1.0-beta", "nuget:PackageDelete")])
+        self.feed.requests.clear()
+        self.assertEqual(await self.mirror.sync(self.server), 1)
+        self.assertEqual(self.feed.requests, ['/catalog/index.json', '/catalog/page2.json'])
+        self.assertEqual(sorted(v for v, _ in self.mirror.get_versions(self.server.index_url, 'Contoso.Core')), ["1.0.0", "1.1.0"])
+
+    async def test_timestamps_are_compared_parsed(self):
+        await self.mirror.sync(self.server)
+        # later than the cursor (2020-03-05T00:00:00Z), but lower as a string
+        self.feed.add_page(lambda b: [item(b, "2020-03-05T01:00:00+01:00", "Contoso.Core", "0.9.0"),
+                                      item(b, "2020-03-05T00:00:00.5+00:00", "Contoso.Core", "1.2.0")])
+        self.assertEqual(await self.mirror.sync(self.server), 1)
+        self.assertEqual(self.mirror.cursor(self.server.index_url), "2020-03-05T00:00:00.5+00:00")
+        self.assertEqual(sorted(v for v, _ in self.mirror.get_versions(self.server.index_url, 'Contoso.Core')),
+                         ["1.0.0", "1.1.0", "1.1.0-beta", "1.2.0"])
+
+    async def test_versions_are_normalized(self):
+        self.assertEqual(version_key("1.01-Beta+abc"), "1.1.0-beta")
+        self.assertEqual(version_key("1.0.0.0"), "1.0.0")
+        self.assertEqual(version_key("1.0.0.1"), "1.0.0.1")
+        await self.mirror.sync(self.server)
+        self.feed.add_page(lambda b: [item(b, "2020-04-01T00:00:00Z", "Contoso.Core", "1.1.0-BETA", "nuget:PackageDelete"),
+                                      item(b, "2020-04-02T00:00:00Z", "Contoso.Data", "2.0.0.0")])
+        await self.mirror.sync(self.server)
+        self.assertEqual(sorted(v for v, _ in self.mirror.get_versions(self.server.index_url, 'Contoso.Core')), ["1.0.0", "1.1.0"])
+        self.assertEqual(self.mirror.get_versions(self.server.index_url, 'Contoso.Data'), [("2.0.0.0", "2020-04-02")])
+
+    async def test_package_details_from_mirror(self):
+        await self.mirror.sync(self.server)
+        self.feed.requests.clear()
+        service_index = json.load(open("./tests/sampledata/sample_nuget_service_index.json", "r"))
+        for resource in service_index["resources"]:
+            if resource["@type"] == "Catalog/3.0.0":
+                resource["@id"] = self.feed.catalog_url
+        client = MagicMock(SmartClient)
+        client.metrics = Metrics()
+        client.get_as_json = AsyncMock(return_value=service_index)
+        async with Nuget(client, catalog_mirror=self.mirror) as n:
+            package = Package('Contoso.Core', '1.0.0')
+            await n.get_fetch_package_details(package)
+        client.get_as_json.assert_awaited_once() # just the service index
+        self.assertEqual(self.feed.requests, ['/catalog/index.json']) # the sync finds nothing new
+        self.assertEqual(package.latest_version, "1.1.0")
+        self.assertEqual(package.latest_release_date, "2020-03-04")
+        self.assertEqual(package.version_date, "2020-01-01")
+        self.assertEqual(package.available_version_count, 3)
+        self.assertEqual(package.minor_releases_behind, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,6 +16,17 @@ class TestDateUtil(unittest.TestCase):
         self.assertEqual(d.month, 6)
         self.assertEqual(d.day, 24)
 
+    def test_get_datetime_from_iso_string(self):
+        utc = date_util.get_datetime_from_iso_string('2020-02-08T04:03:07.1786999Z')
+        self.assertEqual(utc, datetime.datetime(2020, 2, 8, 4, 3, 7, 178699, tzinfo=datetime.timezone.utc))
+        self.assertEqual(date_util.get_datetime_from_iso_string('2020-02-08T05:03:07.178699+01:00'), utc)
+        self.assertEqual(date_util.get_datetime_from_iso_string('2020-02-08T04:03:07.178699'), utc)
+        # as strings, the longer fraction would sort after the later timestamp
+        self.assertLess(date_util.get_datetime_from_iso_string('2020-02-08T04:03:07.1786999Z'),
+                        date_util.get_datetime_from_iso_string('2020-02-08T04:03:07.2Z'))
+        with self.assertRaises(AssertionError):
+            date_util.get_datetime_from_iso_string('2020-02-08')
+
     def test_get_date_from_iso_string_nothing(self):
         with self.assertRaises(AssertionError):            
            date_util.get_date_from_iso_string('')
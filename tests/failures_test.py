@@ -0,0 +1,55 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import MagicMock
+from xml.etree.ElementTree import ParseError
+
+import aiohttp
+from lxml import etree
+from tenacity import RetryError
+
+from nuget_package_scanner.failures import FailureKind, RetryPolicy, classify_failure
+from nuget_package_scanner.nuget import NetCoreProject, PackageConfig
+
+
+def _response_error(status: int) -> aiohttp.ClientResponseError:
+    return aiohttp.ClientResponseError(MagicMock(), (), status=status)
+
+
+class TestFailures(unittest.TestCase):
+
+    def test_classify_failure(self):
+        cases = [
+            (asyncio.TimeoutError(), FailureKind.TIMEOUT),
+            (aiohttp.ServerTimeoutError(), FailureKind.TIMEOUT),
+            (aiohttp.ServerDisconnectedError(), FailureKind.CONNECTION),
+            (aiohttp.ClientPayloadError('cut off'), FailureKind.PAYLOAD),
+            (UnicodeDecodeError('utf-8', b'\xff', 0, 1, 'invalid'), FailureKind.PAYLOAD),
+            (RetryError(MagicMock()), FailureKind.SERVER),
+            (_response_error(503), FailureKind.SERVER),
+            (_response_error(429), FailureKind.SERVER),
+            (_response_error(403), FailureKind.CLIENT),
+            (ParseError('not xml'), FailureKind.PARSE),
+            (json.JSONDecodeError('not json', '', 0), FailureKind.PARSE),
+            (RuntimeError('?'), FailureKind.OTHER),
+        ]
+        for e, kind in cases:
+            self.assertEqual(classify_failure(e), kind, repr(e))
+
+    def test_malformed_containers_are_parse_errors(self):
+        for container_type in (NetCoreProject, PackageConfig):
+            with self.assertRaises(Exception) as e:
+                container_type('<Project><ItemGroup>', 'a', 'repo', 'a')
+            self.assertIsInstance(e.exception, etree.XMLSyntaxError)
+            self.assertEqual(classify_failure(e.exception), FailureKind.PARSE)
+
+    def test_client_and_parse_errors_are_not_retryable(self):
+        self.assertEqual([k for k in FailureKind if not k.retryable], [FailureKind.CLIENT, FailureKind.PARSE])
+
+    def test_backoff_doubles(self):
+        retry = RetryPolicy(attempts=3, backoff=1.5)
+        self.assertEqual([retry.delay(a) for a in (1, 2, 3)], [1.5, 3, 6])
+
+
+if __name__ == '__main__':
+    unittest.main()
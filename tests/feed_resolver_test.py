@@ -0,0 +1,74 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock
+
+from nuget_package_scanner.nuget import FeedResolver, NugetServer
+
+
+def server(index_url: str, ids, delay: float = 0) -> NugetServer:
+    async def has_package(package_id):
+        await asyncio.sleep(delay)
+        return package_id.lower() in ids
+    s = MagicMock(NugetServer)
+    s.index_url = index_url
+    s.has_package = AsyncMock(side_effect=has_package)
+    return s
+
+
+class TestFeedResolver(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.nuget_org = server('https://nuget.org', {'newtonsoft.json', 'shared.package'}, delay=0.02)
+        self.internal = server('https://internal', {'contoso.core', 'shared.package'})
+        self.servers = [self.nuget_org, self.internal]
+
+    async def test_priority_order_wins_over_first_response(self):
+        resolver = FeedResolver()
+        self.assertIs(await resolver.resolve('Shared.Package', self.servers), self.nuget_org)
+        self.assertIs(await resolver.resolve('Contoso.Core', self.servers), self.internal)
+
+    async def test_misses_are_remembered(self):
+        resolver = FeedResolver()
+        self.assertIsNone(await resolver.resolve('Missing', self.servers))
+        self.assertIsNone(await resolver.resolve('missing', self.servers))
+        self.assertEqual(self.internal.has_package.await_count, 1)
+        resolver.forget_misses()
+        self.assertIsNone(await resolver.resolve('missing', self.servers))
+        self.assertEqual(self.internal.has_package.await_count, 2)
+
+    async def test_rules_are_tried_first(self):
+        resolver = FeedResolver({'Contoso.*': 'https://internal'})
+        self.assertIs(await resolver.resolve('Contoso.Core', self.servers), self.internal)
+        self.nuget_org.has_package.assert_not_awaited()
+
+    async def test_routes_are_persisted(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'routes.json')
+            resolver = FeedResolver(route_file=path)
+            await resolver.resolve('Contoso.Core', self.servers)
+            resolver.save()
+
+            self.internal.has_package.reset_mock()
+            self.nuget_org.has_package.reset_mock()
+            resolver = FeedResolver(route_file=path)
+            self.assertEqual(resolver.route_for('contoso.core'), 'https://internal')
+            self.assertIs(await resolver.resolve('Contoso.Core', self.servers), self.internal)
+            self.assertEqual(self.internal.has_package.await_count, 1)
+            self.nuget_org.has_package.assert_not_awaited()
+
+    async def test_stale_route_falls_back_to_probing(self):
+        resolver = FeedResolver({'Newtonsoft.*': 'https://internal'})
+        self.assertIs(await resolver.resolve('Newtonsoft.Json', self.servers), self.nuget_org)
+
+    async def test_concurrent_resolves_share_probes(self):
+        resolver = FeedResolver()
+        results = await asyncio.gather(*[resolver.resolve('Newtonsoft.Json', self.servers) for _ in range(5)])
+        self.assertTrue(all(r is self.nuget_org for r in results))
+        self.assertEqual(self.nuget_org.has_package.await_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
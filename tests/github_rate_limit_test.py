@@ -0,0 +1,180 @@
+import time
+import unittest
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from nuget_package_scanner.github_rate_limit import GithubRateLimiter, RateLimitBucket
+from nuget_package_scanner.github_search import GithubClient
+from nuget_package_scanner.metrics import Metrics
+from nuget_package_scanner.smart_client import SmartClient
+
+
+class TestRateLimitBucket(unittest.TestCase):
+
+    def test_unknown_budget_is_not_delayed(self):
+        bucket = RateLimitBucket('core')
+        self.assertEqual(bucket.reserve_delay(), 0)
+
+    def test_plentiful_budget_is_not_delayed(self):
+        now = 1000.0
+        bucket = RateLimitBucket('core')
+        bucket.update(5000, 4000, now + 3600)
+        self.assertEqual(bucket.reserve_delay(now), 0)
+        self.assertEqual(bucket.reserve_delay(now), 0)
+        self.assertEqual(bucket.remaining, 3998)
+
+    def test_low_budget_is_paced_until_reset(self):
+        now = 1000.0
+        bucket = RateLimitBucket('search', reserve=0)
+        bucket.update(30, 5, now + 10)
+        self.assertEqual(bucket.reserve_delay(now), 0)
+        # 10 seconds left for 5 requests
+        self.assertAlmostEqual(bucket.reserve_delay(now), 2)
+        self.assertAlmostEqual(bucket.reserve_delay(now), 2 + (10 - 2) / 4)
+
+    def test_exhausted_budget_waits_for_reset(self):
+        now = 1000.0
+        bucket = RateLimitBucket('search')
+        bucket.update(30, 1, now + 10)
+        self.assertEqual(bucket.reserve_delay(now), 11)
+
+    def test_every_reservation_waits_for_reset_of_exhausted_budget(self):
+        now = 1000.0
+        bucket = RateLimitBucket('core')
+        bucket.update(5000, 1, now + 600)
+        self.assertEqual([bucket.reserve_delay(now) for _ in range(4)], [601.0] * 4)
+        self.assertEqual(bucket.reserve_delay(now + 300), 301.0)
+        self.assertEqual(bucket.remaining, 1)
+        # the budget is refilled once the reset has passed
+        self.assertEqual(bucket.reserve_delay(now + 601), 0)
+        self.assertEqual(bucket.remaining, 5000)
+
+    def test_reset_in_past_is_not_delayed(self):
+        now = 1000.0
+        bucket = RateLimitBucket('search')
+        bucket.update(30, 0, now - 10)
+        self.assertEqual(bucket.reserve_delay(now), 0)
+
+    def test_pause(self):
+        now = 1000.0
+        bucket = RateLimitBucket('core')
+        bucket.pause(30, now)
+        self.assertEqual(bucket.reserve_delay(now), 30)
+
+
+class TestGithubRateLimiter(unittest.TestCase):
+
+    def test_bucket_for(self):
+        limiter = GithubRateLimiter()
+        self.assertEqual(limiter.bucket_for('https://api.github.com/search/code?q=stuff').name, 'search')
+        self.assertEqual(limiter.bucket_for('https://api.github.com/repos/org/repo/contents/a').name, 'core')
+        self.assertIsNone(limiter.bucket_for('https://api.github.com/rate_limit'))
+        self.assertIsNone(limiter.bucket_for('https://raw.githubusercontent.com/org/repo/sha/a.csproj'))
+
+    def test_update_from_rate_limit_json(self):
+        limiter = GithubRateLimiter()
+        limiter.update_from_rate_limit_json({'resources': {
+            'core': {'limit': 5000, 'remaining': 4999, 'reset': 1},
+            'search': {'limit': 30, 'remaining': 29, 'reset': 2}}})
+        self.assertEqual(limiter.buckets['core'].remaining, 4999)
+        self.assertEqual(limiter.buckets['search'].limit, 30)
+
+    def test_rate_limited_retry_after(self):
+        limiter = GithubRateLimiter()
+        url = 'https://api.github.com/search/code?q=stuff'
+        self.assertEqual(limiter.rate_limited(url, 403, {'Retry-After': '30'}), 30)
+        self.assertGreater(limiter.buckets['search'].paused_until, time.time() + 25)
+        self.assertEqual(limiter.buckets['core'].paused_until, 0)
+
+    def test_rate_limited_primary(self):
+        limiter = GithubRateLimiter()
+        reset = time.time() + 100
+        delay = limiter.rate_limited('https://api.github.com/repos/a', 403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(reset)})
+        self.assertAlmostEqual(delay, 101, delta=1)
+
+    def test_rate_limited_secondary_without_headers(self):
+        limiter = GithubRateLimiter()
+        self.assertEqual(limiter.rate_limited('https://api.github.com/repos/a', 429, None), GithubRateLimiter.SECONDARY_LIMIT_PAUSE)
+
+    def test_not_rate_limited(self):
+        limiter = GithubRateLimiter()
+        self.assertIsNone(limiter.rate_limited('https://api.github.com/repos/a', 403, {}))
+        self.assertIsNone(limiter.rate_limited('https://api.github.com/repos/a', 500, {'Retry-After': '1'}))
+
+
+class TestGithubClientRateLimit(IsolatedAsyncioTestCase):
+
+    async def test_make_request_retries_after_rate_limit(self):
+        client = MagicMock(SmartClient)
+        client.metrics = Metrics()
+        r = MagicMock(aiohttp.ClientResponse)
+        r.headers = {'X-RateLimit-Limit': '5000', 'X-RateLimit-Remaining': '4000', 'X-RateLimit-Reset': str(time.time() + 60)}
+        limited = aiohttp.ClientResponseError(None, None, status=403, headers={'Retry-After': '0'})
+        client.get = AsyncMock(side_effect=[limited, r])
+        g = GithubClient('token', client)
+        response = await g.makeRequest('https://api.github.com/repos/org/repo/contents/a')
+        self.assertEqual(response, r)
+        self.assertEqual(client.get.await_count, 2)
+        self.assertEqual(g.rate_limiter.buckets['core'].remaining, 4000)
+
+    async def test_make_request_raises_other_errors(self):
+        client = MagicMock(SmartClient)
+        client.metrics = Metrics()
+        client.get = AsyncMock(side_effect=aiohttp.ClientResponseError(None, None, status=403, headers={}))
+        g = GithubClient('token', client)
+        with self.assertRaises(aiohttp.ClientResponseError):
+            await g.makeRequest('https://api.github.com/repos/org/repo/contents/a')
+        client.get.assert_awaited_once()
+
+
+class TestGithubClientRateLimitOverHttp(IsolatedAsyncioTestCase):
+    """ Goes through a real :class SmartClient, whose own retries must not swallow Github's rate limit errors. """
+
+    async def asyncSetUp(self):
+        self.responses = [] # (status, headers) to serve before answering 200
+        self.requests = 0
+
+        async def handler(request):
+            self.requests += 1
+            status, headers = self.responses.pop(0) if self.responses else (200, {})
+            return web.json_response({}, status=status, headers=headers)
+        app = web.Application()
+        app.router.add_get('/{tail:.*}', handler)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.url = str(self.server.make_url('')).rstrip('/')
+        self.client = SmartClient()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.close()
+
+    async def test_secondary_rate_limit_pauses_the_bucket(self):
+        self.responses = [(429, {'Retry-After': '0'})]
+        g = GithubClient('token', self.client, api_url=self.url)
+        g.rate_limiter.rate_limited = MagicMock(wraps=g.rate_limiter.rate_limited)
+        async with await g.makeRequest(f'{self.url}/repos/org/repo') as response:
+            self.assertEqual(response.status, 200)
+        self.assertEqual(self.requests, 2)
+        g.rate_limiter.rate_limited.assert_called_once()
+        self.assertEqual(self.client.metrics.families['github_rate_limited_total'].labels('core').value, 1)
+
+    async def test_rate_limit_outside_of_a_bucket_is_waited_out(self):
+        reset = time.time() + 1
+        self.responses = [(403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(reset)})]
+        g = GithubClient('token', self.client, api_url='https://api.github.com', raw_url=self.url)
+        with patch('nuget_package_scanner.github_search.asyncio') as patched:
+            patched.sleep = AsyncMock()
+            async with await g.makeRequest(f'{self.url}/org/repo/main/a.csproj') as response:
+                self.assertEqual(response.status, 200)
+        self.assertEqual(self.requests, 2)
+        delay = patched.sleep.await_args.args[0]
+        self.assertGreater(delay, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
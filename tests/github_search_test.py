@@ -0,0 +1,89 @@
+import unittest
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock
+
+import aiohttp
+
+from nuget_package_scanner.github_search import GithubClient, raw_content_url
+from nuget_package_scanner.metrics import Metrics
+from nuget_package_scanner.parser_pool import ParserPool
+from nuget_package_scanner.smart_client import SmartClient
+
+
+def _item(name='a.csproj', path='src/a b/a.csproj', ref='6b7f0f3b', full_name='org/repo1'):
+    url = f'https://api.github.com/repositories/123/contents/{path}' + (f'?ref={ref}' if ref else '')
+    return {
+        'name': name,
+        'path': path,
+        'sha': 'blobsha',
+        'url': url,
+        'repository': {'name': full_name.split('/')[1], 'full_name': full_name}
+    }
+
+
+class TestRawContentUrl(unittest.TestCase):
+
+    def test_raw_content_url(self):
+        self.assertEqual(raw_content_url(_item()), 'https://raw.githubusercontent.com/org/repo1/6b7f0f3b/src/a%20b/a.csproj')
+
+    def test_raw_content_url_missing_ref(self):
+        self.assertIsNone(raw_content_url(_item(ref=None)))
+
+    def test_raw_content_url_missing_repository(self):
+        item = _item()
+        del item['repository']
+        self.assertIsNone(raw_content_url(item))
+
+
+class TestGithubClientSearch(IsolatedAsyncioTestCase):
+
+    def _client(self, page: dict, details: dict = None):
+        client = MagicMock(SmartClient)
+        client.metrics = Metrics()
+        client.get = AsyncMock(side_effect=aiohttp.ClientError()) # rate_limit refresh
+        g = GithubClient('token', client)
+        response = MagicMock(aiohttp.ClientResponse)
+        response.__aenter__.return_value = response
+        response.headers = {}
+        response.json = AsyncMock(return_value=page)
+
+        async def make_request(url, read=None):
+            return await read(response) if read else response
+        g.makeRequest = AsyncMock(side_effect=make_request)
+        g.get_request_as_json = AsyncMock(return_value=details)
+        return g
+
+    async def test_search_builds_urls_without_contents_requests(self):
+        g = self._client({'incomplete_results': False, 'items': [_item(), _item('b.csproj', 'b.csproj')]})
+        results = await g.search_github_code('query')
+        self.assertEqual([r.name for r in results], ['a.csproj', 'b.csproj'])
+        self.assertEqual(results[0].repo, 'repo1')
+        self.assertEqual(results[0].sha, 'blobsha')
+        g.makeRequest.assert_awaited_once()
+        g.get_request_as_json.assert_not_awaited()
+
+    async def test_search_falls_back_to_contents_api(self):
+        g = self._client({'incomplete_results': False, 'items': [_item(ref=None)]}, {'download_url': 'https://download'})
+        results = await g.search_github_code('query')
+        self.assertEqual(results[0].url, 'https://download')
+        g.get_request_as_json.assert_awaited_once()
+
+    async def test_search_limit(self):
+        g = self._client({'incomplete_results': False, 'items': [_item(), _item('b.csproj', 'b.csproj'), _item('c.csproj', 'c.csproj')]})
+        results = await g.search_github_code('query', 2)
+        self.assertEqual([r.name for r in results], ['a.csproj', 'b.csproj'])
+
+    async def test_nuget_configs_are_parsed_by_the_parser_pool(self):
+        g = self._client({'incomplete_results': False, 'items': [_item('nuget.config', 'nuget.config')]})
+        g.get_request_as_text = AsyncMock(return_value='<?xml version="1.0" encoding="utf-8"?><configuration>'
+            '<packageSources><add key="contoso" value="https://pkgs.contoso.com/index.json" /></packageSources>'
+            '</configuration>')
+        with ParserPool(inline_max_size=0) as parser:
+            parser.parse_nuget_config = AsyncMock(wraps=parser.parse_nuget_config)
+            configs = await g.get_unique_nuget_configs('org', parser=parser)
+        self.assertEqual(configs, {'https://pkgs.contoso.com/index.json': 'contoso'})
+        parser.parse_nuget_config.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import asyncio
+import email.utils
+import time
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+import aiohttp
+
+from nuget_package_scanner.host_limiter import HostLimiter, HostLimiters, parse_retry_after
+
+
+class TestParseRetryAfter(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after(''))
+
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after('120'), 120)
+
+    def test_http_date(self):
+        now = time.time()
+        value = email.utils.formatdate(now + 30, usegmt=True)
+        self.assertAlmostEqual(parse_retry_after(value, now), 30, delta=1)
+
+    def test_invalid(self):
+        self.assertIsNone(parse_retry_after('not a date'))
+
+
+class TestHostLimiter(IsolatedAsyncioTestCase):
+
+    async def test_ctor_invalid_limits(self):
+        with self.assertRaises(AssertionError):
+            HostLimiter('host', initial_limit=0)
+
+    async def test_slow_start_increase(self):
+        limiter = HostLimiter('host', initial_limit=2)
+        for _ in range(3):
+            await limiter.acquire()
+            await limiter.release(0.01, 200)
+        self.assertEqual(limiter.limit, 5)
+        self.assertEqual(limiter.in_flight, 0)
+
+    async def test_error_halves_limit_once_per_burst(self):
+        limiter = HostLimiter('host', initial_limit=8)
+        started = time.monotonic()
+        for _ in range(4):
+            await limiter.acquire()
+        for _ in range(4):
+            await limiter.release(0.01, 503, started=started)
+        self.assertEqual(limiter.limit, 4)
+
+    async def test_additive_increase_after_error(self):
+        limiter = HostLimiter('host', initial_limit=8)
+        await limiter.acquire()
+        await limiter.release(0.01, 500)
+        await limiter.acquire()
+        await limiter.release(0.01, 200)
+        self.assertAlmostEqual(limiter.limit, 4.25)
+
+    async def test_limit_bounds(self):
+        limiter = HostLimiter('host', initial_limit=2, min_limit=1, max_limit=3)
+        for _ in range(5):
+            await limiter.acquire()
+            await limiter.release(0.01, 200)
+        self.assertEqual(limiter.limit, 3)
+        for _ in range(5):
+            await limiter.acquire()
+            await limiter.release(0.01, None)
+        self.assertEqual(limiter.limit, 1)
+
+    async def test_acquire_waits_for_slot(self):
+        limiter = HostLimiter('host', initial_limit=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiter.done())
+        await limiter.release(0.01, 200)
+        await asyncio.wait_for(waiter, 1)
+        self.assertEqual(limiter.in_flight, 1)
+
+    async def test_retry_after_pauses(self):
+        limiter = HostLimiter('host')
+        await limiter.acquire()
+        await limiter.release(0.01, 429, retry_after=0.2)
+        start = time.monotonic()
+        await limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    async def test_request_records_errors(self):
+        limiter = HostLimiter('host', initial_limit=4)
+        with self.assertRaises(aiohttp.ClientResponseError):
+            async with limiter.request():
+                raise aiohttp.ClientResponseError(None, None, status=500)
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+    async def test_timeout_from_latency(self):
+        limiter = HostLimiter('host', default_timeout=20, min_timeout=1, max_timeout=60, slow_latency_factor=4)
+        self.assertEqual(limiter.timeout, 20)
+        for _ in range(HostLimiter.MIN_SAMPLES):
+            await limiter.acquire()
+            await limiter.release(0.5, 200)
+        self.assertEqual(limiter.timeout, 2)
+
+    async def test_limiters_per_host(self):
+        limiters = HostLimiters(initial_limit=3)
+        self.assertIs(limiters.get('a'), limiters.get('a'))
+        self.assertIsNot(limiters.get('a'), limiters.get('b'))
+        self.assertEqual(limiters.get('a').limit, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from nuget_package_scanner.http_cache import HttpCache
+
+
+class TestHttpCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = HttpCache(self.dir.name)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_ctor_empty_directory(self):
+        with self.assertRaises(AssertionError):
+            HttpCache('')
+
+    def test_load_missing(self):
+        self.assertIsNone(self.cache.load('https://a.url.here'))
+
+    def test_store_without_validators_is_skipped(self):
+        url = 'https://a.url.here'
+        self.assertFalse(self.cache.store(url, 'body', {}))
+        self.assertIsNone(self.cache.load(url))
+
+    def test_store_and_load(self):
+        url = 'https://a.url.here'
+        body = '{"some": "json"}'
+        self.assertTrue(self.cache.store(url, body, {'ETag': '"abc"', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'}))
+        entry = self.cache.load(url)
+        self.assertEqual(entry.etag, '"abc"')
+        self.assertEqual(entry.read_body(), body)
+        self.assertEqual(entry.conditional_headers(), {
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'
+        })
+
+    def test_conditional_headers_etag_only(self):
+        url = 'https://a.url.here'
+        self.cache.store(url, 'body', {'ETag': '"abc"'})
+        self.assertEqual(self.cache.load(url).conditional_headers(), {'If-None-Match': '"abc"'})
+
+    def test_invalidate(self):
+        url = 'https://a.url.here'
+        self.cache.store(url, 'body', {'ETag': '"abc"'})
+        self.cache.invalidate(url)
+        self.assertIsNone(self.cache.load(url))
+        self.cache.invalidate(url) # missing entries are ignored
+
+    def test_persists_across_instances(self):
+        url = 'https://a.url.here'
+        self.cache.store(url, 'body', {'ETag': '"abc"'})
+        self.assertEqual(HttpCache(self.dir.name).load(url).read_body(), 'body')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import unittest
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import nuget_package_scanner.json_projection as json_projection
+from nuget_package_scanner.json_projection import REGISTRATION_KEYS, JsonProjector, loads_projected, project, read_projected_json
+
+
+def events(obj, prefix: str = ''):
+    """ Yields the (prefix, event, value) stream ijson.parse produces for the decoded json :param obj. """
+    if isinstance(obj, dict):
+        yield prefix, 'start_map', None
+        for k, v in obj.items():
+            yield prefix, 'map_key', k
+            yield from events(v, f'{prefix}.{k}' if prefix else k)
+        yield prefix, 'end_map', None
+    elif isinstance(obj, list):
+        yield prefix, 'start_array', None
+        for v in obj:
+            yield from events(v, f'{prefix}.item' if prefix else 'item')
+        yield prefix, 'end_array', None
+    else:
+        kind = {type(None): 'null', bool: 'boolean', str: 'string'}.get(type(obj), 'number')
+        yield prefix, kind, obj
+
+
+def projected(obj, keys=REGISTRATION_KEYS):
+    projector = JsonProjector(keys)
+    projector.feed(events(obj))
+    return projector.result
+
+
+class ChunkedStream:
+    """ Minimal stand-in for aiohttp's StreamReader that returns the body a few bytes at a time. """
+    def __init__(self, body: bytes, chunk_size: int = 7):
+        self.body = body
+        self.chunk_size = chunk_size
+
+    async def read(self, n: int = -1) -> bytes:
+        size = self.chunk_size if n < 0 else min(n, self.chunk_size)
+        chunk, self.body = self.body[:size], self.body[size:]
+        return chunk
+
+
+class TestJsonProjection(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.text = open("./tests/sampledata/sample_package_registration_page.json", "r").read()
+        self.expected = project(json.loads(self.text), REGISTRATION_KEYS)
+
+    def test_project_drops_unused_fields(self):
+        leaf = self.expected["items"][0]
+        self.assertEqual(set(leaf["catalogEntry"].keys()), {"@id", "id", "version", "listed", "published"})
+        self.assertNotIn("packageContent", leaf)
+        self.assertEqual(leaf["catalogEntry"]["version"], "3.3.104.9")
+
+    def test_project_keeps_nested_arrays(self):
+        self.assertEqual(project({"items": [[1, {"count": 2, "tags": ["a"]}]], "tags": {"x": 1}}, REGISTRATION_KEYS),
+                         {"items": [[1, {"count": 2}]]})
+
+    def test_projector_matches_project(self):
+        self.assertEqual(projected(json.loads(self.text)), self.expected)
+
+    def test_projector_skips_dropped_members(self):
+        doc = {"tags": {"nested": [{"count": 1}, [2, {"items": []}]]}, "count": 3, "packageContent": "x",
+               "items": [{"catalogEntry": {"dependencyGroups": [{"id": "a"}], "id": "b", "listed": False}}],
+               "description": None}
+        self.assertEqual(projected(doc), {"count": 3, "items": [{"catalogEntry": {"id": "b", "listed": False}}]})
+
+    def test_projector_roots(self):
+        self.assertEqual(projected([{"count": 1, "x": 2}, [], 3.5, None]), [{"count": 1}, [], 3.5, None])
+        self.assertEqual(projected("text"), "text")
+        self.assertEqual(projected({}), {})
+        self.assertEqual(projected({"x": {"y": 1}}), {})
+
+    @unittest.skipIf(json_projection.ijson is None, "ijson is not installed")
+    def test_loads_projected(self):
+        self.assertEqual(loads_projected(self.text, REGISTRATION_KEYS), self.expected)
+
+    def test_loads_projected_without_ijson(self):
+        with patch.object(json_projection, "ijson", None):
+            self.assertEqual(loads_projected(self.text, REGISTRATION_KEYS), self.expected)
+
+    @unittest.skipIf(json_projection.ijson is None, "ijson is not installed")
+    async def test_read_projected_json_streams_chunks(self):
+        result = await read_projected_json(ChunkedStream(self.text.encode("utf-8")), REGISTRATION_KEYS)
+        self.assertEqual(result, self.expected)
+
+    async def test_read_projected_json_without_ijson(self):
+        with patch.object(json_projection, "ijson", None):
+            result = await read_projected_json(ChunkedStream(self.text.encode("utf-8"), 1 << 30), REGISTRATION_KEYS)
+        self.assertEqual(result, self.expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from nuget_package_scanner.metrics import Metrics
+from nuget_package_scanner.response_cache import CacheNamespace
+from nuget_package_scanner.smart_client import SmartClient
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_registering_again_returns_the_same_metric(self):
+        metrics = Metrics()
+        a = metrics.counter('requests_total', 'Requests', ['host'])
+        a.labels('a').inc()
+        self.assertIs(metrics.counter('requests_total', 'Requests', ['host']), a)
+        with self.assertRaises(AssertionError):
+            metrics.gauge('requests_total', 'Requests', ['host'])
+
+    def test_histogram_quantiles(self):
+        histogram = Metrics().histogram('latency_seconds', 'Latency', buckets=(1, 2, 4)).labels()
+        for value in (0.5, 1.5, 1.5, 3):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [(1, 1), (2, 3), (4, 4), (float('inf'), 4)])
+        self.assertEqual(histogram.quantile(0.5), 1.5)
+        self.assertEqual(histogram.quantile(1), 4)
+        self.assertEqual(histogram.summary()['mean'], 1.625)
+
+    def test_prometheus_text(self):
+        metrics = Metrics()
+        metrics.counter('requests_total', 'Http requests', ['host', 'status']).labels('api.github.com', 200).inc(3)
+        metrics.gauge('queue_depth_max', 'Depth', ['queue']).labels('se"arch').set_max(2)
+        metrics.histogram('latency_seconds', 'Latency', ['host'], buckets=(0.1, 1)).labels('nuget.org').observe(0.5)
+        text = metrics.to_prometheus()
+        self.assertIn('# TYPE nuget_scanner_requests_total counter\n', text)
+        self.assertIn('nuget_scanner_requests_total{host="api.github.com",status="200"} 3\n', text)
+        self.assertIn('nuget_scanner_queue_depth_max{queue="se\\"arch"} 2\n', text)
+        self.assertIn('nuget_scanner_latency_seconds_bucket{host="nuget.org",le="0.1"} 0\n', text)
+        self.assertIn('nuget_scanner_latency_seconds_bucket{host="nuget.org",le="+Inf"} 1\n', text)
+        self.assertIn('nuget_scanner_latency_seconds_sum{host="nuget.org"} 0.5\n', text)
+
+    def test_phases_collectors_and_sections(self):
+        metrics = Metrics()
+        collected = metrics.gauge('collected', 'Set by a collector')
+        metrics.add_collector(lambda: collected.labels().set(7))
+        metrics.add_section('hosts', lambda: {'nuget.org': {'requests': 1}})
+        with metrics.phase('scan'):
+            pass
+        with metrics.phase('scan'):
+            pass
+        summary = metrics.to_json()
+        self.assertEqual(list(summary['phases']), ['scan'])
+        self.assertEqual(summary['hosts'], {'nuget.org': {'requests': 1}})
+        self.assertEqual(summary['metrics']['collected']['values'], [{'labels': {}, 'value': 7}])
+
+    def test_write_picks_the_format_from_the_extension(self):
+        metrics = Metrics()
+        metrics.counter('requests_total', 'Requests').labels().inc()
+        with tempfile.TemporaryDirectory() as d:
+            metrics.write(os.path.join(d, 'metrics.prom'))
+            metrics.write(os.path.join(d, 'metrics.json'))
+            with open(os.path.join(d, 'metrics.prom')) as f:
+                self.assertIn('nuget_scanner_requests_total 1', f.read())
+            with open(os.path.join(d, 'metrics.json')) as f:
+                self.assertEqual(json.load(f)['metrics']['requests_total']['values'][0]['value'], 1)
+
+
+async def found(request):
+    return web.json_response({'some': 'json'})
+
+
+async def missing(request):
+    return web.Response(status=404)
+
+
+class TestSmartClientMetrics(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        app = web.Application()
+        app.router.add_get('/found.json', found)
+        app.router.add_get('/missing.json', missing)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_requests_and_cache_hits_are_recorded(self):
+        async with SmartClient() as client:
+            url = str(self.server.make_url('/found.json'))
+            await client.get_as_json(url, namespace=CacheNamespace.SERVICE_INDEX)
+            await client.get_as_json(url, namespace=CacheNamespace.SERVICE_INDEX)
+            await client.get_as_json(str(self.server.make_url('/missing.json')))
+            summary = client.metrics.to_json()
+
+        host = f'{self.server.host}:{self.server.port}'
+        report = summary['hosts'][host]
+        self.assertEqual((report['requests'], report['errors']), (2, 0))
+        self.assertEqual(report['statuses'], {'200': 1, '404': 1})
+        self.assertGreater(report['bytes'], 0)
+        hits = {v['labels']['namespace']: v['value'] for v in summary['metrics']['response_cache_hits_total']['values']}
+        misses = {v['labels']['namespace']: v['value'] for v in summary['metrics']['response_cache_misses_total']['values']}
+        self.assertEqual((hits['service_index'], misses['service_index']), (1, 1))
+        latency = summary['metrics']['http_request_duration_seconds']['values'][0]['value']
+        self.assertEqual(latency['count'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import json
+import unittest
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock
+
+from nuget_package_scanner.nuget import NugetServer
+from nuget_package_scanner.smart_client import SmartClient
+
+
+class TestNugetServer(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        service_index = json.load(open("./tests/sampledata/sample_nuget_service_index.json", "r"))
+        self.client = MagicMock(SmartClient)
+        self.client.get_as_json = AsyncMock(return_value=service_index)
+        self.server = await NugetServer.create(self.client)
+
+    async def test_flat_container_is_discovered(self):
+        self.assertEqual(self.server.versions_url("Newtonsoft.Json"),
+                         "https://api.nuget.org/v3-flatcontainer/newtonsoft.json/index.json")
+
+    async def test_versions(self):
+        self.client.get_as_json = AsyncMock(return_value={"versions": ["1.0.0", "2.0.0-beta"]})
+        self.assertEqual(await self.server.versions("Newtonsoft.Json"), ["1.0.0", "2.0.0-beta"])
+        self.assertTrue(await self.server.has_package("Newtonsoft.Json"))
+
+    async def test_missing_package(self):
+        self.client.get_as_json = AsyncMock(return_value=None)
+        self.assertIsNone(await self.server.versions("Missing"))
+        self.assertFalse(await self.server.has_package("Missing"))
+
+    async def test_flat_container_can_be_skipped(self):
+        server = await NugetServer.create(self.client, use_flat_container=False)
+        self.assertIsNone(server.versions_url("Newtonsoft.Json"))
+        self.client.get_as_registration_json = AsyncMock(return_value=None)
+        self.assertFalse(await server.has_package("Newtonsoft.Json"))
+        self.client.get_as_registration_json.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
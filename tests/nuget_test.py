@@ -0,0 +1,55 @@
+import json
+import unittest
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock
+
+from nuget_package_scanner.metrics import Metrics
+from nuget_package_scanner.nuget import Nuget, NugetServer, Package
+from nuget_package_scanner.smart_client import SmartClient
+
+FLAT_CONTAINER_URL = "https://api.nuget.org/v3-flatcontainer/aspnetcore.healthchecks.mysql/index.json"
+REGISTRATION_INDEX_URL = "https://api.nuget.org/v3/registration5-semver1/aspnetcore.healthchecks.mysql/index.json"
+
+
+class TestNugetIncludeDates(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        service_index = json.load(open("./tests/sampledata/sample_nuget_service_index.json", "r"))
+        registration_index = json.load(open("./tests/sampledata/sample_package_registration_index_inline.json", "r"))
+        responses = {NugetServer.DEFAULT_SERVICE_INDEX_URL: service_index,
+                     FLAT_CONTAINER_URL: {"versions": ["2.2.0", "3.0.0", "3.1.0", "3.1.1"]}}
+        self.client = MagicMock(SmartClient)
+        self.client.metrics = Metrics()
+        self.client.get_as_json = AsyncMock(side_effect=lambda url, **kwargs: responses.get(url))
+        self.client.get_as_registration_json = AsyncMock(return_value=registration_index)
+
+    def requested_urls(self):
+        return [c.args[0] for c in self.client.get_as_json.await_args_list + self.client.get_as_registration_json.await_args_list]
+
+    async def test_dates_only_need_the_registration_index(self):
+        async with Nuget(self.client, include_dates=True) as n:
+            package = Package('AspNetCore.HealthChecks.MySql', '3.0.0')
+            await n.get_fetch_package_details(package)
+        self.assertNotIn(FLAT_CONTAINER_URL, self.requested_urls())
+        # the probe and the timeline share the index (the response cache dedupes it in a real client)
+        self.assertEqual({c.args[0] for c in self.client.get_as_registration_json.await_args_list}, {REGISTRATION_INDEX_URL})
+        self.assertEqual(package.latest_version, '3.1.1')
+        self.assertEqual(package.latest_release_date, '2020-04-17')
+        self.assertEqual(package.version_date, '2020-02-08')
+        self.assertEqual(package.available_version_count, 4)
+
+    async def test_without_dates_only_the_flat_container_is_used(self):
+        async with Nuget(self.client, include_dates=False) as n:
+            package = Package('AspNetCore.HealthChecks.MySql', '3.0.0')
+            await n.get_fetch_package_details(package)
+        self.assertIn(FLAT_CONTAINER_URL, self.requested_urls())
+        self.client.get_as_registration_json.assert_not_awaited()
+        self.assertEqual(package.latest_version, '3.1.1')
+        self.assertEqual(package.minor_releases_behind, 1)
+        self.assertEqual(package.available_version_count, 4)
+        self.assertFalse(package.latest_release_date)
+        self.assertFalse(package.version_date)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from nuget_package_scanner.nuget import NuGetVersion
+
+
+class TestNuGetVersion(unittest.TestCase):
+
+    def test_parse(self):
+        v = NuGetVersion.parse('01.2.3.4-beta.2+build.7')
+        self.assertEqual((v.major, v.minor, v.patch, v.revision), (1, 2, 3, 4))
+        self.assertEqual(v.release_labels, ('beta', '2'))
+        self.assertEqual(v.metadata, 'build.7')
+        self.assertEqual(v.original, '01.2.3.4-beta.2+build.7')
+        self.assertTrue(v.is_prerelease)
+        self.assertFalse(v.is_full_release)
+
+    def test_parse_missing_parts_default_to_zero(self):
+        v = NuGetVersion.parse('1.2')
+        self.assertEqual((v.major, v.minor, v.patch, v.revision), (1, 2, 0, 0))
+        self.assertTrue(v.is_full_release)
+
+    def test_parse_invalid_version(self):
+        with self.assertRaises(AssertionError):
+            NuGetVersion.parse('not.a.version.nope')
+
+    def test_parse_is_cached(self):
+        self.assertIs(NuGetVersion.parse('3.3.105.24'), NuGetVersion.parse('3.3.105.24'))
+
+    def test_build_metadata_is_ignored_for_equality(self):
+        self.assertEqual(NuGetVersion.parse('1.2.3+abc'), NuGetVersion.parse('1.2.3'))
+        self.assertEqual(NuGetVersion.parse('1.2'), NuGetVersion.parse('1.2.0.0'))
+        self.assertEqual(hash(NuGetVersion.parse('1.2')), hash(NuGetVersion.parse('1.2.0')))
+        self.assertFalse(NuGetVersion.parse('1.2.3+abc').is_full_release)
+
+    def test_ordering(self):
+        ordered = [
+            '1.0.0-alpha', '1.0.0-alpha.1', '1.0.0-alpha.beta', '1.0.0-BETA', '1.0.0-beta.2', '1.0.0-beta.11',
+            '1.0.0-rc.1', '1.0.0', '1.0.0.1', '1.0.1', '1.2', '2.0.0-1', '2.0.0-a', '2.0.0', '10.0.0'
+        ]
+        versions = [NuGetVersion.parse(v) for v in ordered]
+        for lower, higher in zip(versions, versions[1:]):
+            self.assertLess(lower, higher)
+        self.assertEqual(sorted(reversed(versions)), versions)
+
+    def test_prerelease_labels_compare_case_insensitively(self):
+        self.assertEqual(NuGetVersion.parse('1.0.0-Beta'), NuGetVersion.parse('1.0.0-beta'))
+
+    def test_str(self):
+        self.assertEqual(str(NuGetVersion.parse('01.2')), '1.2.0')
+        self.assertEqual(str(NuGetVersion.parse('1.2.3.4-rc.1+sha')), '1.2.3.4-rc.1+sha')
+
+
+if __name__ == '__main__':
+    unittest.main()
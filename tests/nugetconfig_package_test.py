@@ -53,6 +53,24 @@ class TestPackage(unittest.TestCase):
         p.set_details_url(uri)
         self.assertFalse(p.details_url)
 
+    def test_lookup_key_ignores_case_and_framework(self):
+        a = Package("Newtonsoft.Json", "12.0.3", "net472")
+        b = Package("newtonsoft.json", "12.0.3")
+        self.assertEqual(a.lookup_key, b.lookup_key)
+        self.assertNotEqual(a.lookup_key, Package("Newtonsoft.Json", "12.0.2").lookup_key)
+
+    def test_copy_details(self):
+        a = Package("thingy", "1.1.1")
+        a.latest_release = "2.0.0"
+        a.major_releases_behind = 1
+        a.available_version_count = 12
+        a.source = "https://a.url.here/index.json"
+        b = Package("thingy", "1.1.1")
+        b.copy_details(a)
+        self.assertEqual(b.latest_release, "2.0.0")
+        self.assertEqual(b.major_releases_behind, 1)
+        self.assertEqual(b.available_version_count, 12)
+        self.assertEqual(b.source, a.source)
 
             
 if __name__ == '__main__':
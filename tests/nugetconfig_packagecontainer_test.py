@@ -49,6 +49,13 @@ class TestPackageContainer(unittest.TestCase):
         self.assertEqual(name, package_config.name)
         self.assertEqual(repo, package_config.repo)
         self.assertEqual(path, package_config.path)             
+
+    def test_str_and_bytes_with_leading_whitespace(self):
+        csproj = '\r\n  <?xml version="1.0" encoding="utf-8"?><Project><ItemGroup>' \
+                 '<PackageReference Include="Contoso.Café" Version="1.0.0" /></ItemGroup></Project>'
+        for contents in (csproj, csproj.encode('utf-8')):
+            project = NetCoreProject(contents)
+            self.assertEqual([(p.name, p.version) for p in project.packages], [("Contoso.Café", "1.0.0")])
                     
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
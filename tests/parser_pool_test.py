@@ -0,0 +1,81 @@
+import asyncio
+import io
+import os
+import tarfile
+import threading
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from nuget_package_scanner.nuget import NetCoreProject, NugetConfig, PackageConfig
+from nuget_package_scanner.parser_pool import ParserPool
+
+SAMPLEDATA = os.path.join(os.path.dirname(__file__), 'sampledata')
+NUGET_CONFIG = '''<?xml version="1.0" encoding="utf-8"?>
+<configuration>
+  <packageSources>
+    <add key="internal" value="https://nuget.contoso.com/v3/index.json" />
+  </packageSources>
+  <disabledPackageSources>
+    <add key="disabled" value="true" />
+  </disabledPackageSources>
+</configuration>'''
+
+
+class TestParserPool(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.csproj = open(os.path.join(SAMPLEDATA, 'sample.csproj')).read()
+        self.config = open(os.path.join(SAMPLEDATA, 'sample_packages.config')).read()
+
+    async def test_parse_matches_inline_parsing(self):
+        for processes in (False, True):
+            with ParserPool(workers=2, processes=processes, inline_max_size=0) as parser:
+                project = await parser.parse(NetCoreProject, self.csproj, 'a.csproj', 'repo', 'src/a.csproj')
+                config = await parser.parse(PackageConfig, self.config.encode('utf-8'), 'packages.config', 'repo')
+            self.assertEqual(project.packages, NetCoreProject(self.csproj).packages)
+            self.assertEqual((project.name, project.repo, project.path), ('a.csproj', 'repo', 'src/a.csproj'))
+            self.assertEqual(config.packages, PackageConfig(self.config).packages)
+            self.assertTrue(config.packages)
+
+    async def test_parse_nuget_config_only_reads_package_sources(self):
+        with ParserPool() as parser:
+            config = await parser.parse_nuget_config('\n' + NUGET_CONFIG)
+        self.assertEqual(config.indexes, {'internal': 'https://nuget.contoso.com/v3/index.json'})
+
+    async def test_parse_archive(self):
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w:gz') as tar:
+            for name, contents in (('src/A/A.csproj', self.csproj), ('nuget.config', NUGET_CONFIG)):
+                data = contents.encode('utf-8')
+                info = tarfile.TarInfo(f'org-repo-abc123/{name}')
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        for processes in (False, True):
+            archive.seek(0)
+            with ParserPool(workers=1, processes=processes) as parser:
+                parsed = await parser.parse_archive(archive, 'repo')
+            core = next(p for p in parsed if isinstance(p, NetCoreProject))
+            self.assertEqual((core.repo, core.path), ('repo', 'src/A/A.csproj'))
+            self.assertTrue(core.packages)
+            self.assertTrue(any(isinstance(p, NugetConfig) for p in parsed))
+
+    async def test_parse_raises_for_invalid_documents(self):
+        with ParserPool(inline_max_size=0) as parser:
+            with self.assertRaises(Exception):
+                await parser.parse(NetCoreProject, 'not xml')
+
+
+    async def test_close_cancels_queued_documents(self):
+        parser = ParserPool(workers=1, inline_max_size=0)
+        busy = threading.Event()
+        parser.executor.submit(busy.wait) # keeps the only worker busy
+        queued = asyncio.ensure_future(parser.parse(NetCoreProject, self.csproj))
+        await asyncio.sleep(0)
+        parser.close()
+        busy.set()
+        with self.assertRaises(asyncio.CancelledError):
+            await queued
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock
+
+import aiohttp
+
+from nuget_package_scanner.failures import RetryPolicy
+
+from nuget_package_scanner.github_search import GithubClient, GithubSearchResult
+from nuget_package_scanner.nuget import NetCoreProject, Nuget, Package, PackageConfig, PackageContainer
+from nuget_package_scanner.pipeline import OrgScanner
+from nuget_package_scanner.scan_state import ScanState
+
+
+async def _iter(items):
+    for i in items:
+        await asyncio.sleep(0)
+        yield i
+
+
+class TestOrgScanner(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.csproj = open(os.path.join(os.path.dirname(__file__), 'sampledata/sample.csproj')).read()
+        self.config = open(os.path.join(os.path.dirname(__file__), 'sampledata/sample_packages.config')).read()
+        self.github = MagicMock(GithubClient)
+        self.github.iter_netcore_csproj = MagicMock(return_value=_iter([
+            GithubSearchResult('a.csproj', 'repo1', 'src/a.csproj', 'https://raw/a.csproj'),
+            GithubSearchResult('b.csproj', 'repo2', 'src/b.csproj', 'https://raw/b.csproj')]))
+        self.github.iter_package_configs = MagicMock(return_value=_iter([
+            GithubSearchResult('packages.config', 'repo3', 'packages.config', 'https://raw/packages.config')]))
+        self.github.get_request_as_text = AsyncMock(side_effect=lambda url: self.config if url.endswith('.config') else self.csproj)
+
+        async def fetch_details(package: Package):
+            package.latest_version = 'latest'
+        self.nuget = MagicMock(Nuget)
+        self.nuget.get_fetch_package_details = AsyncMock(side_effect=fetch_details)
+
+    async def test_scan_yields_every_container_with_details(self):
+        scanner = OrgScanner(self.github, self.nuget, fetch_workers=2, detail_workers=2, queue_size=1)
+        containers = [c async for c in scanner.scan('org')]
+
+        self.assertEqual(sorted(c.repo for c in containers), ['repo1', 'repo2', 'repo3'])
+        self.assertIsInstance(next(c for c in containers if c.repo == 'repo3'), PackageConfig)
+        self.assertIsInstance(next(c for c in containers if c.repo == 'repo1'), NetCoreProject)
+        for c in containers:
+            for p in c.packages:
+                self.assertEqual(p.latest_version, 'latest')
+
+    async def test_scan_fetches_details_once_per_unique_package(self):
+        scanner = OrgScanner(self.github, self.nuget)
+        containers = [c async for c in scanner.scan('org')]
+        unique = set(p.lookup_key for c in containers for p in c.packages)
+        self.assertEqual(self.nuget.get_fetch_package_details.await_count, len(unique))
+        self.assertEqual(scanner.unique_package_count, len(unique))
+
+    async def test_scan_records_failures(self):
+        self.github.get_request_as_text = AsyncMock(side_effect=lambda url: self.csproj if url.endswith('a.csproj') else 'not xml')
+        self.nuget.get_fetch_package_details = AsyncMock(side_effect=ValueError('nope'))
+        scanner = OrgScanner(self.github, self.nuget)
+        containers = [c async for c in scanner.scan('org')]
+        self.assertEqual([c.repo for c in containers], ['repo1'])
+        self.assertEqual(len(scanner.failed_results), 2)
+        self.assertEqual(len(scanner.failed_packages), len(containers[0].packages))
+
+    async def test_scan_state_skips_unchanged_files_and_details(self):
+        results = lambda: _iter([GithubSearchResult('a.csproj', 'repo1', 'src/a.csproj', 'https://raw/a.csproj', 'sha1')])
+        self.github.iter_package_configs = MagicMock(side_effect=lambda org: _iter([]))
+        self.github.iter_netcore_csproj = MagicMock(side_effect=lambda org: results())
+        self.nuget.get_registration_validators = AsyncMock(return_value={'etag': '"1"', 'last_modified': None})
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'state.json')
+            state = ScanState(path)
+            first = [c async for c in OrgScanner(self.github, self.nuget, scan_state=state).scan('org')]
+            state.finish()
+            fetches = self.nuget.get_fetch_package_details.await_count
+
+            state = ScanState(path)
+            second = [c async for c in OrgScanner(self.github, self.nuget, scan_state=state).scan('org')]
+            self.assertEqual(state.finish().unchanged_files, 1)
+
+        self.assertEqual(self.github.get_request_as_text.await_count, 1)
+        self.assertEqual(self.nuget.get_fetch_package_details.await_count, fetches)
+        self.assertEqual([p.name for p in second[0].packages], [p.name for p in first[0].packages])
+        self.assertTrue(all(p.latest_version == 'latest' for p in second[0].packages))
+
+    async def test_scan_raises_search_errors(self):
+        async def failing_search():
+            raise RuntimeError('search failed')
+            yield # pragma: no cover
+        self.github.iter_netcore_csproj = MagicMock(return_value=failing_search())
+        scanner = OrgScanner(self.github, self.nuget)
+        with self.assertRaises(RuntimeError):
+            [c async for c in scanner.scan('org')]
+
+    async def test_scan_orgs_shares_package_lookups(self):
+        self.github.iter_netcore_csproj = MagicMock(side_effect=lambda org: _iter([
+            GithubSearchResult('a.csproj', 'repo1', 'src/a.csproj', f'https://raw/{org}/a.csproj')]))
+        self.github.iter_package_configs = MagicMock(side_effect=lambda org: _iter([]))
+        scanner = OrgScanner(self.github, self.nuget)
+        results = [r async for r in scanner.scan_orgs(['org1', 'org2'])]
+        self.assertEqual(sorted(org for org, _ in results), ['org1', 'org2'])
+        unique = set(p.lookup_key for _, c in results for p in c.packages)
+        self.assertEqual(self.nuget.get_fetch_package_details.await_count, len(unique))
+        self.assertTrue(all(p.latest_version == 'latest' for _, c in results for p in c.packages))
+
+
+class TestOrgScannerRetry(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.csproj = open(os.path.join(os.path.dirname(__file__), 'sampledata/sample.csproj')).read()
+        self.github = MagicMock(GithubClient)
+        self.github.iter_netcore_csproj = MagicMock(side_effect=lambda org: _iter([
+            GithubSearchResult('a.csproj', 'repo1', 'src/a.csproj', 'https://raw/a.csproj'),
+            GithubSearchResult('b.csproj', 'repo2', 'src/b.csproj', 'https://raw/b.csproj')]))
+        self.github.iter_package_configs = MagicMock(side_effect=lambda org: _iter([]))
+        self.fetches = []
+        self.lookups = []
+        self.nuget = MagicMock(Nuget)
+
+    def fail(self, fetch_errors: dict, lookup_errors: dict):
+        """ Fetches of a url and lookups of a package id fail with the errors listed for them, one call at a time. """
+        async def get_request_as_text(url):
+            self.fetches.append(url)
+            errors = fetch_errors.get(url)
+            if errors:
+                raise errors.pop(0)
+            return self.csproj
+
+        async def fetch_details(package: Package):
+            self.lookups.append(package.name)
+            errors = lookup_errors.get(package.name)
+            if errors:
+                raise errors.pop(0)
+            package.latest_version = 'latest'
+            package.source = 'https://feed'
+        self.github.get_request_as_text = AsyncMock(side_effect=get_request_as_text)
+        self.nuget.get_fetch_package_details = AsyncMock(side_effect=fetch_details)
+
+    async def test_failures_are_retried_after_evicting_their_cache_entries(self):
+        self.fail({'https://raw/b.csproj': [asyncio.TimeoutError()]}, {})
+        packages = [p.name for p in (await self.scan_once()).packages]
+        self.fetches.clear()
+        self.lookups.clear()
+        self.fail({'https://raw/b.csproj': [asyncio.TimeoutError()]}, {packages[0]: [aiohttp.ServerDisconnectedError()]})
+
+        scanner = OrgScanner(self.github, self.nuget, retry=RetryPolicy(backoff=0))
+        containers = [c async for c in scanner.scan('org')]
+
+        self.assertEqual(sorted(c.repo for c in containers), ['repo1', 'repo2'])
+        self.assertEqual((scanner.failed_results, scanner.failed_packages), ([], []))
+        self.assertEqual(self.fetches.count('https://raw/b.csproj'), 2)
+        self.assertEqual(self.fetches.count('https://raw/a.csproj'), 1)
+        self.assertEqual(self.lookups.count(packages[0]), 2)
+        self.assertEqual(self.lookups.count(packages[1]), 1) # only the failed lookup is redone
+        self.nuget.invalidate_package.assert_awaited_once_with(packages[0].lower())
+        for c in containers:
+            self.assertEqual({p.name: p.status for p in c.packages},
+                             {p: 'retried' if p == packages[0] else 'ok' for p in packages})
+        retries = scanner.metrics.families['scan_retries_total']
+        self.assertEqual(retries.labels('container', 'timeout').value, 1)
+        self.assertEqual(retries.labels('package', 'connection_error').value, 1)
+        self.assertEqual(scanner.metrics.families['scan_recovered_total'].labels('package').value, 1)
+
+    async def test_retries_run_out(self):
+        self.fail({'https://raw/b.csproj': [aiohttp.ServerDisconnectedError()] * 3}, {})
+        scanner = OrgScanner(self.github, self.nuget, retry=RetryPolicy(attempts=2, backoff=0))
+        containers = [c async for c in scanner.scan('org')]
+        self.assertEqual([c.repo for c in containers], ['repo1'])
+        self.assertEqual([r.repo for r in scanner.failed_results], ['repo2'])
+        self.assertEqual(self.fetches.count('https://raw/b.csproj'), 3)
+
+    async def test_parse_errors_are_not_retried(self):
+        self.fail({}, {})
+        self.github.get_request_as_text.side_effect = None
+        self.github.get_request_as_text.return_value = '<Project><ItemGroup>'
+        scanner = OrgScanner(self.github, self.nuget, retry=RetryPolicy(backoff=0))
+        containers = [c async for c in scanner.scan('org')]
+        self.assertEqual(containers, [])
+        self.assertEqual(sorted(r.repo for r in scanner.failed_results), ['repo1', 'repo2'])
+        self.assertEqual(self.github.get_request_as_text.await_count, 2)
+
+    async def test_client_errors_are_not_retried(self):
+        packages = [p.name for p in (await self.scan_once()).packages]
+        denied = aiohttp.ClientResponseError(MagicMock(), (), status=403)
+        self.fail({}, {packages[0]: [denied] * 3})
+        scanner = OrgScanner(self.github, self.nuget, retry=RetryPolicy(backoff=0))
+        containers = [c async for c in scanner.scan('org')]
+        self.assertEqual(len(containers), 2)
+        self.assertEqual(self.lookups.count(packages[0]), 1)
+        self.assertEqual(len(scanner.failed_packages), 2)
+        self.assertTrue(all(p.status == 'client_error' for p in scanner.failed_packages))
+
+    async def test_retry_budget(self):
+        self.fail({url: [asyncio.TimeoutError()] * 3 for url in ('https://raw/a.csproj', 'https://raw/b.csproj')}, {})
+        scanner = OrgScanner(self.github, self.nuget, retry=RetryPolicy(attempts=3, backoff=0, budget=1))
+        containers = [c async for c in scanner.scan('org')]
+        self.assertEqual(containers, [])
+        self.assertEqual(len(self.fetches), 3)
+        self.assertEqual(len(scanner.failed_results), 2)
+
+    async def scan_once(self) -> PackageContainer:
+        self.fail({}, {})
+        containers = [c async for c in OrgScanner(self.github, self.nuget).scan('org')]
+        self.fetches.clear()
+        self.lookups.clear()
+        return containers[0]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import unittest
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock
+
+from nuget_package_scanner.nuget.registration_timeline import RegistrationTimeline
+from nuget_package_scanner.nuget.registrations import RegistrationsIndex
+from nuget_package_scanner.smart_client import SmartClient
+
+
+def load(name: str) -> dict:
+    return json.load(open(f"./tests/sampledata/{name}", "r"))
+
+
+class TestRegistrationTimeline(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.client = MagicMock(SmartClient)
+        self.client.get_as_registration_json = AsyncMock(return_value=load("sample_package_registration_page.json"))
+
+    async def test_inline_index(self):
+        index = RegistrationsIndex(load("sample_package_registration_index_inline.json"), "https://index.json", self.client)
+        timeline = await RegistrationTimeline.create(index)
+        self.assertEqual(timeline.latest_version, "3.1.1")
+        self.assertEqual(timeline.latest_version_date, "2020-04-17")
+        self.assertEqual(timeline.latest_release, "3.1.1")
+        self.assertEqual(timeline.count, 4)
+        self.assertEqual(await timeline.get_version_date("3.1.0"), "2020-04-09")
+        self.assertEqual(await timeline.get_version_date("3.1"), "2020-04-09")
+        self.assertIsNone(await timeline.get_version_date("3.0.1"))
+        self.client.get_as_registration_json.assert_not_awaited()
+
+    async def test_latest_release_is_older_than_latest_version(self):
+        index = RegistrationsIndex(load("sample_package_registration_index_no_releases.json"), "https://index.json", self.client)
+        timeline = await RegistrationTimeline.create(index)
+        self.assertEqual(timeline.latest_version, "3.0.0-preview3-19153-02")
+        self.assertEqual(timeline.latest_release, "2.2.8")
+
+    async def test_paged_index_fetches_each_page_once(self):
+        index = RegistrationsIndex(load("sample_package_registration_index.json"), "https://index.json", self.client)
+        timeline = await RegistrationTimeline.create(index)
+        self.assertEqual(timeline.latest_version, "3.5.0-beta")
+        self.assertEqual(timeline.latest_release, "3.3.105.28")
+        self.assertEqual(timeline.latest_release_date, "2020-04-17")
+        self.assertEqual(timeline.count, 305)
+        self.assertEqual(await timeline.get_version_date("3.3.104.10"), "2020-02-08")
+        self.assertEqual(self.client.get_as_registration_json.await_count, 1)
+
+
+    async def test_from_versions_only_fetches_registrations_for_dates(self):
+        index = RegistrationsIndex(load("sample_package_registration_index.json"), "https://index.json", self.client)
+        loader = AsyncMock(return_value=index)
+        timeline = RegistrationTimeline.from_versions("https://index.json", ["3.3.105.27", "3.5.0-beta", "3.3.105.28", "3.0.0-preview"], loader)
+        self.assertEqual(timeline.latest_version, "3.5.0-beta")
+        self.assertEqual(timeline.latest_release, "3.3.105.28")
+        self.assertEqual(timeline.count, 4)
+        self.assertIsNone(timeline.latest_release_date)
+        loader.assert_not_awaited()
+
+        await timeline.load_latest_dates()
+        self.assertEqual(timeline.latest_release_date, "2020-04-17")
+        self.assertEqual(timeline.latest_version_date, "2020-02-08")
+        loader.assert_awaited_once()
+        self.assertEqual(self.client.get_as_registration_json.await_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
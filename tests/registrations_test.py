@@ -1,7 +1,8 @@
 import unittest
 import json
-from nuget_package_scanner.nuget.registrations import Registrations
+from nuget_package_scanner.nuget.registrations import Registrations, RegistrationsIndex
 import nuget_package_scanner.smart_client as smart_client
+from nuget_package_scanner.json_projection import REGISTRATION_KEYS, project
 
 class TestRegistrations(unittest.TestCase):
 
@@ -9,6 +10,36 @@ class TestRegistrations(unittest.TestCase):
         response = json.load(open("./tests/sampledata/sample_nuget_service_index.json", "r"))   
         registration = Registrations(response, smart_client.SmartClient())
         self.assertIsNotNone(registration)
+
+class TestRegistrationsIndex(unittest.TestCase):
+
+    def setUp(self):
+        response = json.load(open("./tests/sampledata/sample_package_registration_index.json", "r"))
+        self.index = RegistrationsIndex(response, "https://index.json", smart_client.SmartClient())
+
+    def test_find_page(self):
+        self.assertEqual(self.index.find_page("3.0.0-preview"), self.index.items[0])
+        self.assertEqual(self.index.find_page("3.3.4.16"), self.index.items[0])
+        self.assertEqual(self.index.find_page("3.3.4.17"), self.index.items[1])
+        self.assertEqual(self.index.find_page("3.3.102"), self.index.items[3])
+        self.assertEqual(self.index.find_page("3.5.0-alpha"), self.index.items[4])
+
+    def test_leaf_keeps_the_projected_catalog_entry(self):
+        response = json.load(open("./tests/sampledata/sample_package_registration_index_inline.json", "r"))
+        response = project(response, REGISTRATION_KEYS)
+        index = RegistrationsIndex(response, "https://index.json", smart_client.SmartClient())
+        leaf = index.items[0]._RegistrationPage__items[0]
+        self.assertEqual(leaf.version, "2.2.0")
+        entry = leaf.catalogEntry
+        self.assertEqual((entry.id, entry.version, entry.listed), ("AspNetCore.HealthChecks.MySql", "2.2.0", True))
+        self.assertTrue(entry.published)
+        self.assertFalse(hasattr(leaf, "__dict__"))
+        self.assertFalse(hasattr(entry, "__dict__"))
+
+    def test_find_page_out_of_range(self):
+        self.assertIsNone(self.index.find_page("2.0.0"))
+        self.assertIsNone(self.index.find_page("3.5.0"))
         
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
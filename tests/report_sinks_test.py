@@ -0,0 +1,87 @@
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from nuget_package_scanner.nuget import NetCoreProject, PackageConfig
+from nuget_package_scanner.app import write_to_csv
+from nuget_package_scanner.report_sinks import CsvSink, JsonLinesSink, REPORT_COLUMNS, ReportSink, SqliteSink, sink_for_path, sort_csv
+
+SAMPLEDATA = os.path.join(os.path.dirname(__file__), 'sampledata')
+
+
+class TestReportSinks(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        csproj = open(os.path.join(SAMPLEDATA, 'sample.csproj')).read()
+        config = open(os.path.join(SAMPLEDATA, 'sample_packages.config')).read()
+        self.containers = [NetCoreProject(csproj, 'b.csproj', 'repo2', 'src/b.csproj'),
+                           PackageConfig(config, 'packages.config', 'repo1', 'packages.config')]
+        self.rows = sum(len(c.packages) for c in self.containers)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir.name, 'reports', name)
+
+    def test_sink_for_path(self):
+        for name, sink_type in [('r.csv', CsvSink), ('r.jsonl', JsonLinesSink), ('r.db', SqliteSink)]:
+            with sink_for_path(self.path(name)) as sink:
+                self.assertIsInstance(sink, sink_type)
+        with self.assertRaises(AssertionError):
+            sink_for_path(self.path('r.txt'))
+
+    def test_csv_is_sorted_externally(self):
+        with CsvSink(self.path('r.csv')) as sink:
+            for c in self.containers:
+                sink.write(c)
+        sort_csv(sink.path, chunk_rows=2)
+        with open(sink.path, newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], [column for column, _ in REPORT_COLUMNS])
+        self.assertEqual(len(rows) - 1, self.rows)
+        self.assertEqual([r[:2] for r in rows[1:]], sorted(r[:2] for r in rows[1:]))
+        self.assertEqual(rows[1][0], 'repo1')
+
+    def test_write_to_csv_sorts_by_repo_and_path(self):
+        for sort_output, first_repo in [(True, 'repo1'), (False, 'repo2')]:
+            write_to_csv(self.containers, self.path('r.csv'), sort_output)
+            with open(self.path('r.csv'), newline='') as f:
+                rows = list(csv.reader(f))
+            self.assertEqual(len(rows) - 1, self.rows)
+            self.assertEqual(rows[1][0], first_repo)
+
+    def test_sinks_must_write_rows(self):
+        with self.assertRaises(TypeError):
+            ReportSink(self.path('r.csv'))
+
+    def test_json_lines_include_org(self):
+        self.containers[0].packages[0].status = 'retried'
+        with JsonLinesSink(self.path('r.jsonl'), include_org=True) as sink:
+            sink.write(self.containers[0], 'org1')
+        with open(sink.path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), len(self.containers[0].packages))
+        self.assertEqual(lines[0]['org'], 'org1')
+        self.assertEqual(lines[0]['name'], self.containers[0].packages[0].name)
+        self.assertEqual(lines[0]['status'], 'retried')
+
+    def test_sqlite_is_queryable(self):
+        with SqliteSink(self.path('r.db'), commit_rows=1) as sink:
+            for c in self.containers:
+                sink.write(c)
+        self.assertEqual(sink.rows, self.rows)
+        db = sqlite3.connect(sink.path)
+        self.assertEqual(db.execute("SELECT count(*) FROM packages WHERE repo = 'repo1'").fetchone()[0],
+                         len(self.containers[1].packages))
+        indexes = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertEqual(indexes, {'packages_repo', 'packages_name', 'packages_behind'})
+        db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
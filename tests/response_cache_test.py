@@ -0,0 +1,148 @@
+import asyncio
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from nuget_package_scanner.response_cache import CacheNamespace, ResponseCache, cached_response, estimate_size
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_get_miss_and_hit(self):
+        cache = ResponseCache()
+        self.assertEqual(cache.get('a'), (False, None))
+        cache.put('a', {'some': 'json'})
+        self.assertEqual(cache.get('a'), (True, {'some': 'json'}))
+        info = cache.info()
+        self.assertEqual((info.hits, info.misses, info.entries), (1, 1, 1))
+        self.assertEqual(info.bytes, estimate_size({'some': 'json'}))
+
+    def test_none_is_cached(self):
+        cache = ResponseCache()
+        cache.put('a', None)
+        self.assertEqual(cache.get('a'), (True, None))
+
+    def test_lru_eviction_overall_budget(self):
+        value = 'x' * 100
+        size = estimate_size(value)
+        cache = ResponseCache(max_bytes=size * 2)
+        cache.put('a', value)
+        cache.put('b', value, CacheNamespace.REGISTRATION_PAGE)
+        cache.get('a') # 'b' is now the least recently used
+        cache.put('c', value)
+        self.assertTrue(cache.get('a')[0])
+        self.assertFalse(cache.get('b', CacheNamespace.REGISTRATION_PAGE)[0])
+        self.assertTrue(cache.get('c')[0])
+        self.assertEqual(cache.info(CacheNamespace.REGISTRATION_PAGE).evictions, 1)
+        self.assertEqual(cache.bytes, size * 2)
+
+    def test_namespace_budget_only_evicts_namespace(self):
+        value = 'x' * 100
+        size = estimate_size(value)
+        cache = ResponseCache(namespace_max_bytes={CacheNamespace.REGISTRATION_PAGE: size})
+        cache.put('index', value, CacheNamespace.REGISTRATION_INDEX)
+        cache.put('page1', value, CacheNamespace.REGISTRATION_PAGE)
+        cache.put('page2', value, CacheNamespace.REGISTRATION_PAGE)
+        self.assertTrue(cache.get('index', CacheNamespace.REGISTRATION_INDEX)[0])
+        self.assertFalse(cache.get('page1', CacheNamespace.REGISTRATION_PAGE)[0])
+        self.assertTrue(cache.get('page2', CacheNamespace.REGISTRATION_PAGE)[0])
+
+    def test_value_larger_than_budget_is_not_cached(self):
+        cache = ResponseCache(max_bytes=10)
+        self.assertFalse(cache.put('a', 'x' * 100))
+        self.assertEqual(cache.info().entries, 0)
+
+    def test_invalidate_and_clear(self):
+        cache = ResponseCache()
+        cache.put('a', 'value')
+        cache.put('b', 'value')
+        self.assertTrue(cache.invalidate('a'))
+        self.assertFalse(cache.invalidate('a'))
+        cache.clear()
+        self.assertEqual(cache.info().entries, 0)
+        self.assertEqual(cache.bytes, 0)
+
+    def test_estimate_size_nested(self):
+        self.assertGreater(estimate_size({'items': [{'a': 'b'}]}), estimate_size({}))
+
+
+class _Fetcher:
+    def __init__(self):
+        self.response_cache = ResponseCache()
+        self.calls = 0
+
+    @cached_response
+    async def fetch(self, url, ignore_404=True, headers=None):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if url == 'bad':
+            raise ValueError(url)
+        return url.upper()
+
+    @cached_response
+    async def fetch_lower(self, url, ignore_404=True, headers=None):
+        self.calls += 1
+        return url.lower()
+
+
+class TestCachedResponse(IsolatedAsyncioTestCase):
+
+    async def test_memoized(self):
+        f = _Fetcher()
+        self.assertEqual(await f.fetch('a'), 'A')
+        self.assertEqual(await f.fetch('a', namespace=CacheNamespace.REGISTRATION_PAGE), 'A')
+        self.assertEqual(f.calls, 1)
+
+    async def test_concurrent_calls_share_request(self):
+        f = _Fetcher()
+        results = await asyncio.gather(*[f.fetch('a') for _ in range(5)])
+        self.assertEqual(results, ['A'] * 5)
+        self.assertEqual(f.calls, 1)
+
+    async def test_exceptions_not_cached(self):
+        f = _Fetcher()
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                await f.fetch('bad')
+        self.assertEqual(f.calls, 2)
+
+    async def test_invalidate(self):
+        f = _Fetcher()
+        await f.fetch('a')
+        self.assertTrue(f.fetch.invalidate('a'))
+        await f.fetch('a')
+        self.assertEqual(f.calls, 2)
+
+    async def test_invalidate_url(self):
+        f = _Fetcher()
+        await f.fetch('a')
+        await f.fetch('a', ignore_404=False)
+        await f.fetch('b')
+        self.assertEqual(f.response_cache.invalidate_url('a'), 2)
+        await f.fetch('a')
+        await f.fetch('b')
+        self.assertEqual(f.calls, 4)
+
+    async def test_cache_info_and_clear_are_per_method(self):
+        f = _Fetcher()
+        await f.fetch('a')
+        await f.fetch('a')
+        await f.fetch_lower('B')
+        info = f.fetch.cache_info()
+        self.assertEqual((info.hits, info.misses, info.entries), (1, 1, 1))
+        self.assertEqual(f.response_cache.info().entries, 2)
+        f.fetch.cache_clear()
+        self.assertEqual(f.fetch.cache_info().entries, 0)
+        self.assertEqual(f.fetch_lower.cache_info().entries, 1)
+        self.assertEqual(await f.fetch_lower('B'), 'b')
+        self.assertEqual(f.calls, 2)
+
+    async def test_per_instance(self):
+        f1 = _Fetcher()
+        f2 = _Fetcher()
+        await f1.fetch('a')
+        await f2.fetch('a')
+        self.assertEqual((f1.calls, f2.calls), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock
+
+from nuget_package_scanner.github_search import GithubClient, GithubSearchResult
+from nuget_package_scanner.nuget import NetCoreProject, Nuget, Package, PackageConfig
+from nuget_package_scanner.pipeline import OrgScanner
+from nuget_package_scanner.scan_journal import ScanJournal
+
+
+async def _iter(items):
+    for i in items:
+        await asyncio.sleep(0)
+        yield i
+
+
+def _container(repo: str = 'repo1', path: str = 'src/a.csproj') -> NetCoreProject:
+    return NetCoreProject.from_packages([Package('Newtonsoft.Json', '12.0.1', 'net6.0')], 'a.csproj', repo, path, 'sha1')
+
+
+class TestScanJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'scan.journal')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_resume_replays_every_record(self):
+        journal = ScanJournal(self.path, ['org'])
+        journal.put_configs('org', {'https://feed/index.json': 'feed'})
+        result = GithubSearchResult('a.csproj', 'repo1', 'src/a.csproj', 'https://raw/a.csproj', 'sha1')
+        journal.put_search_page('org', 'NetCoreProject', [result], 'https://api/search?page=2')
+        journal.put_container('org', _container())
+        package = Package('Newtonsoft.Json', '12.0.1')
+        package.latest_version = '13.0.1'
+        journal.put_details(package, {'etag': '"1"', 'last_modified': None})
+        journal.close()
+
+        journal = ScanJournal(self.path, ['org'], resume=True)
+        self.assertEqual(journal.replayed, 4)
+        self.assertEqual(journal.get_configs('org'), {'https://feed/index.json': 'feed'})
+        pages = journal.search_pages('org', 'NetCoreProject')
+        self.assertEqual([r.url for r in pages[0].results], ['https://raw/a.csproj'])
+        self.assertEqual(pages[0].next_url, 'https://api/search?page=2')
+        container = journal.get_container('org', 'repo1', 'src/a.csproj', 'sha1')
+        self.assertIsInstance(container, NetCoreProject)
+        self.assertEqual([(p.name, p.version) for p in container.packages], [('Newtonsoft.Json', '12.0.1')])
+        details, validators = journal.get_details(('newtonsoft.json', '12.0.1'))
+        self.assertEqual(details['latest_version'], '13.0.1')
+        self.assertEqual(validators, {'etag': '"1"', 'last_modified': None})
+        journal.close()
+
+    def test_container_from_a_different_blob_is_not_replayed(self):
+        journal = ScanJournal(self.path, ['org'])
+        journal.put_container('org', _container())
+        self.assertIsNone(journal.get_container('org', 'repo1', 'src/a.csproj', 'sha2'))
+        self.assertIsNone(journal.get_container('other-org', 'repo1', 'src/a.csproj', 'sha1'))
+        journal.close()
+
+    def test_partial_last_record_is_dropped(self):
+        journal = ScanJournal(self.path, ['org'])
+        journal.put_configs('org', {})
+        journal.close()
+        with open(self.path, 'a') as f:
+            f.write('{"type": "container", "org": "or')
+
+        journal = ScanJournal(self.path, ['org'], resume=True)
+        self.assertEqual(journal.replayed, 1)
+        journal.put_container('org', _container())
+        journal.close()
+
+        journal = ScanJournal(self.path, ['org'], resume=True)
+        self.assertEqual(journal.replayed, 2)
+        self.assertIsNotNone(journal.get_container('org', 'repo1', 'src/a.csproj', 'sha1'))
+        journal.close()
+
+    def test_journal_for_other_orgs_is_discarded(self):
+        journal = ScanJournal(self.path, ['org'])
+        journal.put_configs('org', {})
+        journal.close()
+
+        journal = ScanJournal(self.path, ['other-org'], resume=True)
+        self.assertEqual(journal.replayed, 0)
+        self.assertIsNone(journal.get_configs('org'))
+        journal.close()
+
+    def test_without_resume_the_journal_starts_over(self):
+        journal = ScanJournal(self.path, ['org'])
+        journal.put_configs('org', {})
+        journal.close()
+
+        journal = ScanJournal(self.path, ['org'])
+        self.assertIsNone(journal.get_configs('org'))
+        journal.close()
+
+    def test_finish_removes_the_journal(self):
+        journal = ScanJournal(self.path, ['org'])
+        journal.finish()
+        self.assertFalse(os.path.exists(self.path))
+
+
+class TestOrgScannerResume(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'scan.journal')
+        self.csproj = open(os.path.join(os.path.dirname(__file__), 'sampledata/sample.csproj')).read()
+        self.config = open(os.path.join(os.path.dirname(__file__), 'sampledata/sample_packages.config')).read()
+        self.a = GithubSearchResult('a.csproj', 'repo1', 'src/a.csproj', 'https://raw/a.csproj', 'sha1')
+        self.b = GithubSearchResult('b.csproj', 'repo2', 'src/b.csproj', 'https://raw/b.csproj', 'sha2')
+        self.c = GithubSearchResult('packages.config', 'repo3', 'packages.config', 'https://raw/packages.config', 'sha3')
+
+        def search(pages):
+            """ Serves :param pages of results like :meth GithubClient.iter_github_code, from start_url if given. """
+            def iter_results(org, start_url=None, on_page=None):
+                async def results():
+                    urls = [f'page{i}' for i in range(len(pages))]
+                    for i in range(urls.index(start_url) if start_url else 0, len(pages)):
+                        next_url = urls[i + 1] if i + 1 < len(pages) else ''
+                        if on_page:
+                            on_page(pages[i], next_url)
+                        for r in pages[i]:
+                            yield r
+                return results()
+            return MagicMock(side_effect=iter_results)
+
+        self.github = MagicMock(GithubClient)
+        self.github.iter_netcore_csproj = search([[self.a], [self.b]])
+        self.github.iter_package_configs = search([[self.c]])
+        self.github.get_request_as_text = AsyncMock(side_effect=lambda url: self.config if url.endswith('.config') else self.csproj)
+
+        async def fetch_details(package: Package):
+            package.latest_version = 'latest'
+        self.nuget = MagicMock(Nuget)
+        self.nuget.get_fetch_package_details = AsyncMock(side_effect=fetch_details)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    async def scan(self, journal: ScanJournal):
+        return [c async for c in OrgScanner(self.github, self.nuget, journal=journal).scan('org')]
+
+    async def test_resume_only_does_outstanding_work(self):
+        # a scan that stopped after the first page of csproj results, with a.csproj parsed and one package resolved
+        journal = ScanJournal(self.path, ['org'])
+        journal.put_search_page('org', 'NetCoreProject', [self.a], 'page1')
+        container = NetCoreProject(self.csproj, 'a.csproj', 'repo1', 'src/a.csproj')
+        container.sha = 'sha1'
+        journal.put_container('org', container)
+        resolved = Package(container.packages[0].name, container.packages[0].version)
+        resolved.latest_version = 'from journal'
+        journal.put_details(resolved)
+        journal.close()
+
+        journal = ScanJournal(self.path, ['org'], resume=True)
+        containers = await self.scan(journal)
+
+        self.assertEqual(sorted(c.repo for c in containers), ['repo1', 'repo2', 'repo3'])
+        self.github.iter_netcore_csproj.assert_called_once()
+        self.assertEqual(self.github.iter_netcore_csproj.call_args.kwargs['start_url'], 'page1')
+        fetched = [c.args[0] for c in self.github.get_request_as_text.await_args_list]
+        self.assertEqual(sorted(fetched), ['https://raw/b.csproj', 'https://raw/packages.config'])
+        a = next(c for c in containers if c.repo == 'repo1')
+        self.assertEqual(a.packages[0].latest_version, 'from journal')
+        looked_up = [c.args[0].lookup_key for c in self.nuget.get_fetch_package_details.await_args_list]
+        self.assertNotIn(resolved.lookup_key, looked_up)
+        journal.close()
+
+    async def test_resuming_a_completed_scan_makes_no_requests(self):
+        journal = ScanJournal(self.path, ['org'])
+        first = await self.scan(journal)
+        journal.close()
+        self.github.reset_mock()
+        self.nuget.get_fetch_package_details.reset_mock()
+
+        journal = ScanJournal(self.path, ['org'], resume=True)
+        second = await self.scan(journal)
+
+        self.assertEqual(sorted((c.repo, len(c.packages)) for c in second), sorted((c.repo, len(c.packages)) for c in first))
+        self.assertIsInstance(next(c for c in second if c.repo == 'repo3'), PackageConfig)
+        self.github.iter_netcore_csproj.assert_not_called()
+        self.github.iter_package_configs.assert_not_called()
+        self.github.get_request_as_text.assert_not_awaited()
+        self.nuget.get_fetch_package_details.assert_not_awaited()
+        for c in second:
+            for p in c.packages:
+                self.assertEqual(p.latest_version, 'latest')
+        journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import unittest
+
+from nuget_package_scanner.nuget import NetCoreProject, Package, PackageConfig
+from nuget_package_scanner.scan_state import ScanState
+from nuget_package_scanner.tarball import git_blob_sha
+
+
+class TestScanState(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'state.json')
+        self.config = open(os.path.join(os.path.dirname(__file__), 'sampledata/sample_packages.config')).read()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def __container(self, sha='sha1'):
+        c = PackageConfig(self.config, 'packages.config', 'repo', 'src/packages.config')
+        c.sha = sha
+        return c
+
+    def test_unchanged_container_is_reused(self):
+        state = ScanState(self.path)
+        self.assertIsNone(state.get_container('repo', 'src/packages.config', 'sha1'))
+        original = self.__container()
+        state.put_container(original)
+        state.finish()
+
+        state = ScanState(self.path)
+        container = state.get_container('repo', 'src/packages.config', 'sha1')
+        self.assertIsInstance(container, PackageConfig)
+        self.assertEqual(container.sha, 'sha1')
+        self.assertEqual([(p.name, p.version) for p in container.packages], [(p.name, p.version) for p in original.packages])
+        delta = state.finish()
+        self.assertEqual(delta.unchanged_files, 1)
+        self.assertEqual(delta.added_files, [])
+
+    def test_delta_tracks_added_changed_and_removed_files(self):
+        state = ScanState(self.path)
+        state.put_container(self.__container())
+        other = NetCoreProject('<Project></Project>', 'a.csproj', 'repo', 'a.csproj')
+        other.sha = 'sha2'
+        state.put_container(other)
+        self.assertEqual(state.finish().added_files, [['repo', 'src/packages.config'], ['repo', 'a.csproj']])
+
+        state = ScanState(self.path)
+        self.assertIsNone(state.get_container('repo', 'src/packages.config', 'sha3'))
+        state.put_container(self.__container('sha3'))
+        delta = state.finish()
+        self.assertEqual(delta.changed_files, [['repo', 'src/packages.config']])
+        self.assertEqual(delta.removed_files, [['repo', 'a.csproj']])
+
+    def test_containers_without_a_sha_are_compared_on_their_packages(self):
+        state = ScanState(self.path)
+        state.put_container(self.__container(None))
+        self.assertEqual(state.finish().added_files, [['repo', 'src/packages.config']])
+
+        state = ScanState(self.path)
+        self.assertIsNone(state.get_container('repo', 'src/packages.config', None))
+        state.put_container(self.__container(None))
+        delta = state.finish()
+        self.assertEqual((delta.added_files, delta.changed_files, delta.removed_files), ([], [], []))
+        self.assertEqual(delta.unchanged_files, 1)
+
+        state = ScanState(self.path)
+        container = self.__container(None)
+        container.packages.pop()
+        state.put_container(container)
+        self.assertEqual(state.finish().changed_files, [['repo', 'src/packages.config']])
+
+    def test_details_require_matching_validators(self):
+        state = ScanState(self.path)
+        package = Package('Newtonsoft.Json', '12.0.1')
+        package.latest_version = '12.0.3'
+        state.put_details(package, {'etag': '"1"', 'last_modified': None})
+        state.finish()
+
+        state = ScanState(self.path)
+        key = package.lookup_key
+        self.assertEqual(state.get_details(key, {'etag': '"1"', 'last_modified': None})['latest_version'], '12.0.3')
+        self.assertIsNone(state.get_details(key, {'etag': '"2"', 'last_modified': None}))
+        self.assertIsNone(state.get_details(key, None))
+
+        package.latest_version = '13.0.1'
+        state.put_details(package, {'etag': '"2"', 'last_modified': None})
+        self.assertEqual(state.delta.changed_packages,
+                         [{'name': 'Newtonsoft.Json', 'version': '12.0.1', 'changes': {'latest_version': ['12.0.3', '13.0.1']}}])
+
+    def test_unreadable_state_starts_over(self):
+        with open(self.path, 'w') as f:
+            f.write('not json')
+        state = ScanState(self.path)
+        self.assertIsNone(state.get_container('repo', 'src/packages.config', 'sha1'))
+        state.finish()
+        with open(self.path) as f:
+            self.assertEqual(json.load(f)['version'], ScanState.VERSION)
+
+    def test_git_blob_sha(self):
+        # matches `echo 'hello world' | git hash-object --stdin`
+        self.assertEqual(git_blob_sha(b'hello world\n'), '3b18e512dba79e4c8300dd08aeb37f8e728b8dad')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,14 @@
 import aiohttp
 import asyncio
+import tempfile
 import tenacity
 import unittest
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import AsyncMock, MagicMock
 
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
 from nuget_package_scanner.smart_client import SmartClient
 
 
@@ -111,6 +115,92 @@ class TestSmartClient(IsolatedAsyncioTestCase):
             await self.sc.get('https://a.url.here')
         c.get.assert_awaited_once()
 
-        
+
+    async def test_get_as_json_revalidates_from_disk_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            url = "https://a.url.here/index.json"
+            first = SmartClient(cache_dir)
+            c = MagicMock(aiohttp.ClientSession)
+            r = MagicMock(aiohttp.ClientResponse)
+            r.status = 200
+            r.headers = {'ETag': '"v1"'}
+            r.text = AsyncMock(return_value='{"count": 1}')
+            c.get = AsyncMock(return_value=r)
+            first.get_aiohttp_client = MagicMock(return_value=c)
+            self.assertEqual(await first.get_as_json(url), {"count": 1})
+
+            # a new session (i.e. the next run) should send the validator and serve the 304 from disk
+            second = SmartClient(cache_dir)
+            c2 = MagicMock(aiohttp.ClientSession)
+            r2 = MagicMock(aiohttp.ClientResponse)
+            r2.status = 304
+            c2.get = AsyncMock(return_value=r2)
+            second.get_aiohttp_client = MagicMock(return_value=c2)
+            second.get_as_json.cache_clear() # pylint: disable=no-member
+            self.assertEqual(await second.get_as_json(url), {"count": 1})
+            self.assertEqual(c2.get.await_args.kwargs['headers'], {'If-None-Match': '"v1"'})
+            r2.text.assert_not_called()
+
+    async def test_get_304_is_returned(self):
+        c = MagicMock(aiohttp.ClientSession)
+        r = MagicMock(aiohttp.ClientResponse)
+        r.status = 304
+        c.get = AsyncMock(return_value=r)
+        self.sc.get_aiohttp_client = MagicMock(return_value=c)
+        response = await self.sc.get('some url here', headers={'If-None-Match': '"v1"'})
+        r.raise_for_status.assert_not_called()
+        self.assertEqual(response, r)
+
+
+class TestSmartClientLimiterSlot(IsolatedAsyncioTestCase):
+    """ Goes through a real server whose body only completes once :attr finish is set. """
+
+    async def asyncSetUp(self):
+        self.headers_sent = asyncio.Event()
+        self.finish = asyncio.Event()
+
+        async def handler(request):
+            response = web.StreamResponse(headers={'Content-Type': 'application/json'})
+            await response.prepare(request)
+            await response.write(b'{"count": ')
+            self.headers_sent.set()
+            await self.finish.wait()
+            await response.write(b'1}')
+            return response
+        app = web.Application()
+        app.router.add_get('/{tail:.*}', handler)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.client = SmartClient()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.close()
+
+    async def assert_slot_is_held_until_the_body_is_read(self, get, url):
+        limiter = self.client.get_host_limiter(url)
+        task = asyncio.ensure_future(get(url))
+        await self.headers_sent.wait()
+        await asyncio.sleep(0.05) # the client has the headers, but not the whole body
+        self.assertEqual(limiter.in_flight, 1)
+        self.finish.set()
+        self.assertEqual(await task, {"count": 1})
+        self.assertEqual(limiter.in_flight, 0)
+
+    async def test_get_as_json_holds_the_slot_until_the_body_is_read(self):
+        await self.assert_slot_is_held_until_the_body_is_read(self.client.get_as_json, str(self.server.make_url('/a.json')))
+
+    async def test_get_as_registration_json_holds_the_slot_until_the_body_is_read(self):
+        await self.assert_slot_is_held_until_the_body_is_read(self.client.get_as_registration_json,
+                                                              str(self.server.make_url('/index.json')))
+
+    async def test_read_errors_release_the_slot(self):
+        url = str(self.server.make_url('/a.json'))
+        self.finish.set()
+        with self.assertRaises(ValueError):
+            await self.client.get(url, read=AsyncMock(side_effect=ValueError()))
+        self.assertEqual(self.client.get_host_limiter(url).in_flight, 0)
+
+
 if __name__ == '__main__':
     unittest.main()
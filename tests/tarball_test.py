@@ -0,0 +1,102 @@
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+from typing import Optional
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock
+
+from nuget_package_scanner.nuget import NetCoreProject, Nuget, NugetConfig, PackageConfig
+from nuget_package_scanner.pipeline import OrgScanner, ScanSource
+from nuget_package_scanner.tarball import DirectoryArchiveSource, container_type_for, iter_tarball
+
+SAMPLEDATA = os.path.join(os.path.dirname(__file__), 'sampledata')
+NUGET_CONFIG = '''<?xml version="1.0" encoding="utf-8"?>
+<configuration>
+  <packageSources>
+    <add key="internal" value="https://nuget.contoso.com/v3/index.json" />
+  </packageSources>
+</configuration>'''
+
+
+def _build_tarball(path: str, files: dict, root: Optional[str] = 'org-repo-abc123') -> None:
+    with tarfile.open(path, 'w:gz') as tar:
+        for name, contents in files.items():
+            data = contents.encode('utf-8')
+            info = tarfile.TarInfo(f'{root}/{name}' if root else name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+class TestTarball(unittest.TestCase):
+
+    def setUp(self):
+        self.csproj = open(os.path.join(SAMPLEDATA, 'sample.csproj')).read()
+        self.config = open(os.path.join(SAMPLEDATA, 'sample_packages.config')).read()
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_container_type_for(self):
+        self.assertEqual(container_type_for('src/A/A.csproj'), NetCoreProject)
+        self.assertEqual(container_type_for('Directory.Packages.props'), NetCoreProject)
+        self.assertEqual(container_type_for('src/Legacy/packages.config'), PackageConfig)
+        self.assertIsNone(container_type_for('src/A/Program.cs'))
+        self.assertIsNone(container_type_for('NuGet.Config'))
+
+    def test_iter_tarball(self):
+        path = os.path.join(self.dir.name, 'repo.tar.gz')
+        _build_tarball(path, {
+            'src/A/A.csproj': self.csproj,
+            'src/A/Program.cs': 'class Program {}',
+            'src/Legacy/packages.config': self.config,
+            'NuGet.Config': NUGET_CONFIG,
+            'src/Broken/Broken.csproj': '<not xml',
+        })
+        with open(path, 'rb') as f:
+            parsed = list(iter_tarball(f, 'repo'))
+        self.assertEqual(len(parsed), 3)
+        core = next(p for p in parsed if isinstance(p, NetCoreProject))
+        self.assertEqual((core.repo, core.path, core.name), ('repo', 'src/A/A.csproj', 'A.csproj'))
+        self.assertTrue(core.packages)
+        self.assertTrue(any(isinstance(p, PackageConfig) for p in parsed))
+        nuget_config = next(p for p in parsed if isinstance(p, NugetConfig))
+        self.assertEqual(nuget_config.indexes, {'internal': 'https://nuget.contoso.com/v3/index.json'})
+
+    def test_root_is_only_stripped_if_every_member_shares_it(self):
+        path = os.path.join(self.dir.name, 'repo.tar.gz')
+        _build_tarball(path, {'src/A/A.csproj': self.csproj, 'B/B.csproj': self.csproj}, root=None)
+        with open(path, 'rb') as f:
+            parsed = list(iter_tarball(f, 'repo'))
+        self.assertEqual(sorted(p.path for p in parsed), ['B/B.csproj', 'src/A/A.csproj'])
+
+        _build_tarball(path, {'src/A/A.csproj': self.csproj, 'README.md': 'readme'}, root=None)
+        with open(path, 'rb') as f:
+            parsed = list(iter_tarball(f, 'repo'))
+        self.assertEqual([p.path for p in parsed], ['src/A/A.csproj'])
+
+
+class TestTarballScan(IsolatedAsyncioTestCase):
+
+    async def test_scan_directory_of_tarballs(self):
+        csproj = open(os.path.join(SAMPLEDATA, 'sample.csproj')).read()
+        with tempfile.TemporaryDirectory() as d:
+            _build_tarball(os.path.join(d, 'repo1.tar.gz'), {'A.csproj': csproj, 'nuget.config': NUGET_CONFIG})
+            _build_tarball(os.path.join(d, 'repo2.tgz'), {'src/B/B.csproj': csproj})
+            open(os.path.join(d, 'notes.txt'), 'w').close()
+
+            nuget = MagicMock(Nuget)
+            nuget.get_fetch_package_details = AsyncMock()
+            nuget.add_config = AsyncMock()
+            scanner = OrgScanner(None, nuget, source=ScanSource.TARBALL, archive_source=DirectoryArchiveSource(d))
+            containers = [c async for c in scanner.scan('org')]
+
+        self.assertEqual(sorted(c.repo for c in containers), ['repo1', 'repo2'])
+        nuget.add_config.assert_awaited_once_with('https://nuget.contoso.com/v3/index.json', 'internal')
+        self.assertFalse(scanner.failed_results)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from nuget_package_scanner.tracing import Tracer, span
+
+
+class TestTracer(IsolatedAsyncioTestCase):
+
+    async def test_span_does_nothing_without_a_tracer(self):
+        with span('GET', 'http', url='u') as s:
+            s.set(status=200)
+
+    async def test_spans_are_linked_to_their_parent(self):
+        tracer = Tracer()
+
+        async def probe(feed):
+            with span('feed probe', 'nuget', feed=feed) as s:
+                await asyncio.sleep(0)
+                s.set(found=feed == 'b')
+
+        with tracer.activate():
+            with span('package details', 'nuget', package='Contoso.Core'):
+                await asyncio.gather(probe('a'), probe('b'))
+        with span('ignored'):
+            pass
+
+        details, *probes = tracer.spans
+        self.assertEqual(details.name, 'package details')
+        self.assertIsNone(details.parent_id)
+        self.assertEqual([p.parent_id for p in probes], [details.span_id] * 2)
+        self.assertEqual([p.args for p in probes], [{'feed': 'a', 'found': False}, {'feed': 'b', 'found': True}])
+        self.assertNotEqual(probes[0].tid, details.tid) # gather runs each probe in its own task
+        self.assertTrue(all(p.start >= details.start and p.end <= details.end for p in probes))
+
+    async def test_errors_are_recorded(self):
+        tracer = Tracer()
+        with tracer.activate(), self.assertRaises(ValueError):
+            with span('parse', 'parse'):
+                raise ValueError()
+        self.assertEqual(tracer.spans[0].args['error'], 'ValueError')
+
+    async def test_chrome_trace(self):
+        tracer = Tracer()
+        with tracer.activate(), span('scan', 'phase'):
+            await asyncio.create_task(self.__fetch(), name='fetch worker')
+        events = tracer.to_chrome_trace()['traceEvents']
+        complete = [e for e in events if e['ph'] == 'X']
+        self.assertEqual([e['name'] for e in complete], ['scan', 'file fetch'])
+        self.assertEqual(complete[1]['args']['parent_id'], complete[0]['args']['span_id'])
+        self.assertIn({'ph': 'M', 'name': 'thread_name', 'pid': os.getpid(), 'tid': complete[1]['tid'],
+                       'args': {'name': 'fetch worker'}}, events)
+        flows = [e for e in events if e['ph'] in ('s', 'f')]
+        self.assertEqual([(e['ph'], e['tid']) for e in flows], [('s', complete[0]['tid']), ('f', complete[1]['tid'])])
+
+    async def test_write_picks_the_format_from_the_file_name(self):
+        tracer = Tracer()
+        with tracer.activate(), span('scan', 'phase'), span('GET', 'http', url='u'):
+            pass
+        with tempfile.TemporaryDirectory() as d:
+            tracer.write(os.path.join(d, 'scan.json'))
+            tracer.write(os.path.join(d, 'scan.otlp.json'))
+            with open(os.path.join(d, 'scan.json')) as f:
+                self.assertIn('traceEvents', json.load(f))
+            with open(os.path.join(d, 'scan.otlp.json')) as f:
+                spans = json.load(f)['resourceSpans'][0]['scopeSpans'][0]['spans']
+        self.assertEqual([s['name'] for s in spans], ['scan', 'GET'])
+        self.assertEqual(spans[1]['parentSpanId'], spans[0]['spanId'])
+        self.assertEqual(spans[0]['parentSpanId'], '')
+        self.assertEqual(spans[0]['traceId'], spans[1]['traceId'])
+        self.assertIn({'key': 'url', 'value': {'stringValue': 'u'}}, spans[1]['attributes'])
+
+    @staticmethod
+    async def __fetch():
+        with span('file fetch', 'github'):
+            await asyncio.sleep(0)
+
+
+if __name__ == '__main__':
+    unittest.main()